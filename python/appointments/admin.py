@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import AvailabilitySlot, Appointment
+from .models import AvailabilitySlot, Appointment, DoctorDailyStats
 
 
 @admin.register(AvailabilitySlot)
 class AvailabilitySlotAdmin(admin.ModelAdmin):
-    list_display = ('doctor', 'date', 'start_time', 'end_time', 'is_booked', 'created_at')
-    list_filter = ('is_booked', 'date', 'doctor')
+    list_display = ('doctor', 'date', 'start_time', 'end_time', 'is_booked', 'is_blocked', 'created_at')
+    list_filter = ('is_booked', 'is_blocked', 'date', 'doctor')
     search_fields = ('doctor__username', 'doctor__email')
     date_hierarchy = 'date'
 
@@ -17,3 +17,11 @@ class AppointmentAdmin(admin.ModelAdmin):
     search_fields = ('patient__username', 'doctor__username')
     date_hierarchy = 'slot__date'
 
+
+
+@admin.register(DoctorDailyStats)
+class DoctorDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'total_slots', 'booked_slots', 'bookings', 'cancellations', 'updated_at')
+    list_filter = ('date', 'doctor')
+    date_hierarchy = 'date'
+    readonly_fields = ('doctor', 'date', 'total_slots', 'booked_slots', 'bookings', 'cancellations', 'updated_at')
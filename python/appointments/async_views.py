@@ -0,0 +1,114 @@
+"""
+Async views, served by the ASGI application (``hms_project.asgi``).
+
+Run under an ASGI server such as ``uvicorn hms_project.asgi:application``;
+under WSGI each open stream would hold a whole worker thread. The read
+views mirror their DRF counterparts in ``views`` but use the async ORM, so
+a request waiting on the database does not occupy a thread.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+from users.async_auth import aget_user, authentication_required
+from users.models import User
+from .events import hub, format_sse
+from .models import AvailabilitySlot, Appointment
+from .serializers import AvailabilitySlotSerializer, AppointmentSerializer
+
+
+async def available_slots(request):
+    """Async variant of views.available_slots"""
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return authentication_required()
+    
+    if not user.is_patient:
+        return JsonResponse({
+            'error': 'Permission denied',
+            'message': 'Only patients can view available slots',
+            'your_role': user.role
+        }, status=403)
+    
+    doctor_id = request.GET.get('doctor_id')
+    date = request.GET.get('date')
+    
+    if not doctor_id:
+        return JsonResponse({'error': 'doctor_id parameter is required'}, status=400)
+    
+    try:
+        doctor = await User.objects.aget(id=doctor_id, role='doctor', is_active=True)
+    except (User.DoesNotExist, ValueError):
+        return JsonResponse({'error': 'Doctor not found'}, status=404)
+    
+    slots = AvailabilitySlot.objects.filter(doctor=doctor).available().select_related('doctor')
+    if date:
+        slots = slots.filter(date=date)
+    
+    slots = [slot async for slot in slots]
+    return JsonResponse(AvailabilitySlotSerializer(slots, many=True).data, safe=False)
+
+
+async def appointment_list(request):
+    """Async variant of views.appointment_list"""
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return authentication_required()
+    
+    if user.is_doctor:
+        appointments = Appointment.objects.filter(doctor=user)
+    elif user.is_patient:
+        appointments = Appointment.objects.filter(patient=user)
+    else:
+        return JsonResponse({'error': 'Invalid user role'}, status=403)
+    
+    status_filter = request.GET.get('status')
+    if status_filter:
+        appointments = appointments.filter(status=status_filter)
+    
+    appointments = appointments.select_related('patient', 'doctor', 'slot', 'slot__doctor')
+    appointments = [appointment async for appointment in appointments]
+    return JsonResponse(AppointmentSerializer(appointments, many=True).data, safe=False)
+
+
+async def availability_stream(request, doctor_id):
+    """Server-Sent Events stream of slot and booking changes for one doctor"""
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return authentication_required()
+    
+    doctor_exists = await User.objects.filter(id=doctor_id, role='doctor', is_active=True).aexists()
+    if not doctor_exists:
+        return JsonResponse({'error': 'Doctor not found'}, status=404)
+    
+    response = StreamingHttpResponse(
+        _event_stream(doctor_id, user.id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _event_stream(doctor_id, user_id):
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+    # Streams are recycled periodically; EventSource reconnects on its own
+    deadline = time.monotonic() + getattr(settings, 'SSE_MAX_STREAM_SECONDS', 300)
+    subscription = hub.subscribe(doctor_id, user_id)
+    try:
+        yield f"retry: 3000\nevent: ready\ndata: {{\"doctor_id\": {doctor_id}}}\n\n"
+        while time.monotonic() < deadline:
+            try:
+                event = await subscription.get(timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield 'event: resync\ndata: {}\n\n'
+            yield format_sse(event)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,60 @@
+"""
+Doctors' daily schedule digests.
+
+Every doctor's day is read in a single query: the day's confirmed
+appointments joined to slot and patient, ordered by doctor and start time
+over the (slot_date, doctor) index, and grouped in Python. Only the columns
+the email needs are fetched. Digests are then posted to the email
+service's batch endpoint, several batches at a time.
+"""
+from itertools import groupby
+
+from django.conf import settings
+
+from hms_project import email_client
+from .models import Appointment
+
+DIGEST_COLUMNS = (
+    'doctor_id', 'doctor__email', 'doctor__username', 'doctor__first_name', 'doctor__last_name',
+    'slot__start_time', 'patient__username', 'patient__first_name', 'patient__last_name', 'status',
+)
+
+
+def _full_name(first_name, last_name, username):
+    return f"{first_name} {last_name}".strip() or username
+
+
+def build_digests(day, doctor_ids=None):
+    """Yield one DOCTOR_DAILY_DIGEST message per doctor with appointments on ``day``"""
+    rows = Appointment.objects.filter(slot_date=day, status='confirmed')
+    if doctor_ids:
+        rows = rows.filter(doctor_id__in=doctor_ids)
+    rows = rows.order_by('doctor_id', 'slot__start_time').values_list(*DIGEST_COLUMNS)
+    
+    for _, appointments in groupby(rows.iterator(chunk_size=5000), key=lambda row: row[0]):
+        appointments = list(appointments)
+        _, email, username, first_name, last_name = appointments[0][:5]
+        yield {
+            'action': 'DOCTOR_DAILY_DIGEST',
+            'to_email': email,
+            'to_name': _full_name(first_name, last_name, username),
+            'digest_date': str(day),
+            'appointments': [
+                {
+                    'time': start_time.strftime('%H:%M'),
+                    'patient_name': _full_name(patient_first, patient_last, patient_username),
+                    'status': status,
+                }
+                for _, _, _, _, _, start_time, patient_username, patient_first, patient_last, status in appointments
+            ],
+        }
+
+
+def send_digests(day, doctor_ids=None, dry_run=False):
+    """Build and send every digest for ``day``; returns (digests, appointments, sent)"""
+    messages = list(build_digests(day, doctor_ids))
+    appointments = sum(len(message['appointments']) for message in messages)
+    if dry_run or not messages:
+        return len(messages), appointments, 0
+    sent = email_client.send_batch(messages, concurrency=getattr(settings, 'EMAIL_BATCH_CONCURRENCY', 4))
+    return len(messages), appointments, sent
@@ -0,0 +1,187 @@
+"""
+Pub/sub hub for live availability events.
+
+Events are published per doctor from the model signal handlers (after the
+transaction commits) and fanned out to Server-Sent Events subscribers. Each
+idle subscriber costs one small asyncio.Queue and one suspended coroutine.
+
+With REALTIME_BACKEND_URL set to a redis:// URL, events go through Redis
+pub/sub so subscribers connected to any worker process receive them.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+CHANNEL_PREFIX = 'hms:availability:'
+
+
+class Subscription:
+    """One SSE client listening to one doctor's events"""
+
+    def __init__(self, doctor_id, user_id, queue_size):
+        self.doctor_id = doctor_id
+        # Only the doctor receives events that name a patient
+        self.private = user_id == doctor_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def deliver(self, event):
+        """Runs on the subscriber's event loop"""
+        if event.get('private') and not self.private:
+            return
+        if self.queue.full():
+            # Slow client: drop the oldest event and tell it to refetch
+            self.queue.get_nowait()
+            self.overflowed = True
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventHub:
+    """In-process registry of subscribers keyed by doctor id"""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.backend = None
+
+    def subscribe(self, doctor_id, user_id):
+        subscription = Subscription(doctor_id, user_id, self.queue_size)
+        with self._lock:
+            self._subscribers[doctor_id].add(subscription)
+        if self.backend is not None:
+            self.backend.ensure_listening()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.doctor_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.doctor_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, doctor_id, event):
+        """Publish an event for a doctor; safe to call from any thread"""
+        if self.backend is not None:
+            try:
+                self.backend.publish(doctor_id, event)
+            except Exception as e:
+                # Live updates are best effort; never fail the write that triggered them
+                print(f"Realtime backend error: {e}")
+        else:
+            self.dispatch(doctor_id, event)
+
+    def dispatch(self, doctor_id, event):
+        """Hand an event to the local subscribers of a doctor"""
+        event = dict(event, id=next(self._ids))
+        with self._lock:
+            subscribers = list(self._subscribers.get(doctor_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+
+
+class RedisBackend:
+    """Cross-process fan-out through Redis pub/sub"""
+
+    def __init__(self, url, hub):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('REALTIME_BACKEND_URL requires the "redis" package')
+        self.url = url
+        self.hub = hub
+        self.client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def publish(self, doctor_id, event):
+        self.client.publish(f'{CHANNEL_PREFIX}{doctor_id}', json.dumps(event, cls=DjangoJSONEncoder))
+
+    def ensure_listening(self):
+        """Start one listener task per process, on the first subscriber's loop"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+        try:
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                doctor_id = int(channel[len(CHANNEL_PREFIX):])
+                self.hub.dispatch(doctor_id, json.loads(message['data']))
+        finally:
+            await pubsub.close()
+            await client.close()
+
+
+def _build_hub():
+    hub = EventHub(queue_size=getattr(settings, 'REALTIME_QUEUE_SIZE', 100))
+    url = getattr(settings, 'REALTIME_BACKEND_URL', '')
+    if url:
+        hub.backend = RedisBackend(url, hub)
+    return hub
+
+
+hub = _build_hub()
+
+
+def slot_event(kind, slot):
+    return {
+        'type': kind,
+        'doctor_id': slot.doctor_id,
+        'slot_id': slot.pk,
+        'date': str(slot.date),
+        'start_time': str(slot.start_time),
+        'end_time': str(slot.end_time),
+        'is_booked': slot.is_booked,
+        'is_blocked': slot.is_blocked,
+    }
+
+
+def booking_event(kind, appointment):
+    return {
+        'type': kind,
+        'doctor_id': appointment.doctor_id,
+        'appointment_id': appointment.pk,
+        'slot_id': appointment.slot_id,
+        'patient_id': appointment.patient_id,
+        'status': appointment.status,
+        'private': True,
+    }
+
+
+def format_sse(event):
+    """Encode an event in text/event-stream framing"""
+    payload = {key: value for key, value in event.items() if key not in ('id', 'private')}
+    return (
+        f"id: {event.get('id', '')}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
+    )
@@ -0,0 +1,122 @@
+"""
+Streaming export of bookings.
+
+Rows are read with ``.values_list().iterator()`` so only one chunk of
+appointments is held in memory at a time, and encoded straight into CSV or
+NDJSON (optionally gzipped) for a StreamingHttpResponse or a file.
+"""
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Appointment
+
+# Output column -> ORM lookup
+EXPORT_COLUMNS = (
+    ('appointment_id', 'id'),
+    ('status', 'status'),
+    ('date', 'slot__date'),
+    ('start_time', 'slot__start_time'),
+    ('end_time', 'slot__end_time'),
+    ('doctor_id', 'doctor_id'),
+    ('doctor_username', 'doctor__username'),
+    ('doctor_email', 'doctor__email'),
+    ('patient_id', 'patient_id'),
+    ('patient_username', 'patient__username'),
+    ('patient_first_name', 'patient__first_name'),
+    ('patient_last_name', 'patient__last_name'),
+    ('patient_email', 'patient__email'),
+    ('notes', 'notes'),
+    ('created_at', 'created_at'),
+)
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Encoded output is flushed in blocks of roughly this many bytes
+BUFFER_SIZE = 64 * 1024
+
+
+def bookings_queryset(doctor_id=None, status=None, start=None, end=None):
+    """Appointments to export, ordered for stable output"""
+    appointments = Appointment.objects.all()
+    if doctor_id:
+        appointments = appointments.filter(doctor_id=doctor_id)
+    if status:
+        appointments = appointments.filter(status=status)
+    if start:
+        appointments = appointments.filter(slot_date__gte=start)
+    if end:
+        appointments = appointments.filter(slot_date__lte=end)
+    return appointments.order_by('slot_date', 'id')
+
+
+def iter_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield plain tuples in EXPORT_COLUMNS order without building model instances"""
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    return queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+def _buffered(pieces):
+    """Join small string pieces into BUFFER_SIZE byte blocks"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _csv_lines(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        writer.writerow(row)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    # Header only, when there were no rows
+    if out.tell():
+        yield out.getvalue()
+
+
+def _ndjson_lines(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def gzip_stream(chunks):
+    """Compress a stream of byte blocks into a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_bookings(queryset, export_format='csv', compress=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encoded byte blocks for the given queryset"""
+    rows = iter_rows(queryset, chunk_size=chunk_size)
+    if export_format == 'ndjson':
+        chunks = _buffered(_ndjson_lines(rows))
+    else:
+        chunks = _buffered(_csv_lines(rows))
+    if compress:
+        chunks = gzip_stream(chunks)
+    return chunks
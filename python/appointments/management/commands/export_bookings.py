@@ -0,0 +1,63 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from appointments.exports import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, bookings_queryset, stream_bookings
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings to a CSV or NDJSON file with flat memory use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', '-o', help='Output file (defaults to stdout)')
+        parser.add_argument('--doctor', type=int, help='Only export bookings for this doctor id')
+        parser.add_argument('--status', help='Only export bookings with this status')
+        parser.add_argument('--start', help='First appointment date (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last appointment date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start'], '--start')
+        end = self._parse(options['end'], '--end')
+
+        queryset = bookings_queryset(
+            doctor_id=options['doctor'],
+            status=options['status'],
+            start=start,
+            end=end,
+        )
+        chunks = stream_bookings(
+            queryset,
+            export_format=options['export_format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+
+        started = time.monotonic()
+        written = 0
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+                    written += len(chunk)
+        else:
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+            output.flush()
+
+        # Keep stdout clean for piping; report on stderr
+        self.stderr.write(f'Wrote {written} bytes in {time.monotonic() - started:.2f}s')
+
+    def _parse(self, value, flag):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'{flag} must be a date in YYYY-MM-DD format')
+        return parsed
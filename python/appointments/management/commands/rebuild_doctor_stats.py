@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
+
+from appointments.models import AvailabilitySlot, Appointment, DoctorDailyStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DoctorDailyStats rollup from AvailabilitySlot and Appointment rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, help='Only rebuild rows for this doctor id')
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start'], '--start')
+        end = self._parse(options['end'], '--end')
+
+        slot_filter = Q()
+        appointment_filter = Q()
+        stats_filter = Q()
+        if options['doctor']:
+            slot_filter &= Q(doctor_id=options['doctor'])
+            appointment_filter &= Q(doctor_id=options['doctor'])
+            stats_filter &= Q(doctor_id=options['doctor'])
+        if start:
+            slot_filter &= Q(date__gte=start)
+            appointment_filter &= Q(slot__date__gte=start)
+            stats_filter &= Q(date__gte=start)
+        if end:
+            slot_filter &= Q(date__lte=end)
+            appointment_filter &= Q(slot__date__lte=end)
+            stats_filter &= Q(date__lte=end)
+
+        rows = defaultdict(lambda: dict.fromkeys(DoctorDailyStats.COUNTERS, 0))
+
+        slot_counts = AvailabilitySlot.objects.filter(slot_filter).order_by().values(
+            'doctor_id', 'date'
+        ).annotate(
+            total=Count('id'),
+            booked=Count('id', filter=Q(is_booked=True)),
+        )
+        for row in slot_counts.iterator():
+            counters = rows[(row['doctor_id'], row['date'])]
+            counters['total_slots'] = row['total']
+            counters['booked_slots'] = row['booked']
+
+        appointment_counts = Appointment.objects.filter(appointment_filter).order_by().values(
+            'doctor_id', 'slot__date'
+        ).annotate(
+            total=Count('id'),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+        )
+        for row in appointment_counts.iterator():
+            counters = rows[(row['doctor_id'], row['slot__date'])]
+            counters['bookings'] = row['total']
+            counters['cancellations'] = row['cancelled']
+
+        with transaction.atomic():
+            deleted, _ = DoctorDailyStats.objects.filter(stats_filter).delete()
+            DoctorDailyStats.objects.bulk_create(
+                [
+                    DoctorDailyStats(doctor_id=doctor_id, date=date, **counters)
+                    for (doctor_id, date), counters in rows.items()
+                ],
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(rows)} daily stats rows (replaced {deleted})'
+        ))
+
+    def _parse(self, value, flag):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'{flag} must be a date in YYYY-MM-DD format')
+        return parsed
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from appointments.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = "Email every doctor a digest of their day's appointments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to send (YYYY-MM-DD, defaults to today)')
+        parser.add_argument('--doctor', type=int, action='append', help='Only this doctor id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Build the digests without sending')
+
+    def handle(self, *args, **options):
+        day = timezone.localdate()
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError('--date must be a date in YYYY-MM-DD format')
+
+        started = time.monotonic()
+        digests, appointments, sent = send_digests(day, options['doctor'], options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{digests} digests ({appointments} appointments) for {day}, '
+            f'{sent} sent in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.reminders import REMINDERS, send_due_reminders
+
+
+class Command(BaseCommand):
+    help = 'Email reminders for confirmed appointments starting within the next 24h and 2h'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(REMINDERS), action='append',
+                            help='Reminder kind to send (repeatable; defaults to all)')
+        parser.add_argument('--batch-size', type=int, help='Appointments per claim and email batch')
+        parser.add_argument('--loop', action='store_true', help='Keep running, once every --interval seconds')
+        parser.add_argument('--interval', type=int, default=300)
+        parser.add_argument('--dry-run', action='store_true', help='Only count due reminders')
+
+    def handle(self, *args, **options):
+        kinds = options['kind'] or list(REMINDERS)
+        while True:
+            for kind in kinds:
+                started = time.monotonic()
+                claimed, sent = send_due_reminders(
+                    kind, batch_size=options['batch_size'], dry_run=options['dry_run']
+                )
+                verb = 'due' if options['dry_run'] else f'claimed, {sent} sent'
+                self.stdout.write(f'{kind}: {claimed} {verb} in {time.monotonic() - started:.2f}s')
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_slot_date(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AvailabilitySlot = apps.get_model('appointments', 'AvailabilitySlot')
+    Appointment.objects.filter(slot_date__isnull=True).update(
+        slot_date=Subquery(AvailabilitySlot.objects.filter(pk=OuterRef('slot_id')).values('date')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_doctor_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='slot_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_slot_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'status', 'slot_date'], name='appointment_patient_c78443_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_patient_44acdc_idx',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_appointment_reminders'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['slot_date', 'doctor'], name='appointment_slot_da_1a82a8_idx'),
+        ),
+    ]
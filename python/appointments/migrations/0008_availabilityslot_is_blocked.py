@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_appointment_digest_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='availabilityslot',
+            name='is_blocked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_slot_times(apps, schema_editor):
+    # Short batches, each committed on its own (atomic = False), so no long row locks
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AvailabilitySlot = apps.get_model('appointments', 'AvailabilitySlot')
+    slot = AvailabilitySlot.objects.filter(pk=OuterRef('slot_id'))
+    pending = Appointment.objects.filter(slot_start_time__isnull=True).order_by('pk')
+    while True:
+        ids = list(pending.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        Appointment.objects.filter(pk__in=ids).update(
+            slot_date=Subquery(slot.values('date')[:1]),
+            slot_start_time=Subquery(slot.values('start_time')[:1]),
+            slot_end_time=Subquery(slot.values('end_time')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0008_availabilityslot_is_blocked'),
+    ]
+
+    operations = [
+        # Nullable without a default: no table rewrite
+        migrations.AddField(
+            model_name='appointment',
+            name='slot_start_time',
+            field=models.TimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='slot_end_time',
+            field=models.TimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_slot_times, migrations.RunPython.noop),
+    ]
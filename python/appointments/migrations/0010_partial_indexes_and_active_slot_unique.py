@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from hms_project.migration_operations import (
+    AddIndexConcurrently,
+    AddUniqueConstraintConcurrently,
+    OneToOneToForeignKey,
+)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0009_appointment_slot_times'),
+    ]
+
+    operations = [
+        # Before the one-to-one's unique constraint goes, so a slot is never left unguarded
+        AddUniqueConstraintConcurrently(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('slot',), name='appointment_active_slot_uniq'),
+        ),
+        OneToOneToForeignKey(
+            model_name='appointment',
+            name='slot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='appointments.availabilityslot'),
+        ),
+        AddIndexConcurrently(
+            model_name='availabilityslot',
+            index=models.Index(condition=models.Q(('is_blocked', False), ('is_booked', False)), fields=['doctor', 'date', 'start_time'], name='slot_free_doctor_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'confirmed')), fields=['patient', 'slot_date'], name='appt_confirmed_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'confirmed')), fields=['doctor', 'slot_date'], name='appt_confirmed_doctor_idx'),
+        ),
+    ]
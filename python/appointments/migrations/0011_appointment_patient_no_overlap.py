@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:40
+
+from django.db import migrations
+
+CONSTRAINT = 'appointment_patient_no_overlap'
+
+
+def add_overlap_constraint(apps, schema_editor):
+    """PostgreSQL only: a patient's active appointments may not overlap
+
+    Other backends rely on the check in book_appointment. The constraint is
+    not part of the model state because Django cannot express it portably.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('appointments', 'Appointment')._meta.db_table)
+    # An exclusion constraint cannot be built concurrently and holds an exclusive lock
+    # while it scans the table; fail fast instead of queueing behind long transactions
+    schema_editor.execute("SET LOCAL lock_timeout = '5s'")
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT {CONSTRAINT} EXCLUDE USING gist ('
+        f'patient_id WITH =, '
+        f'tsrange(slot_date + slot_start_time, slot_date + slot_end_time) WITH &&'
+        f") WHERE (status <> 'cancelled' AND slot_start_time IS NOT NULL AND slot_end_time IS NOT NULL)"
+    )
+
+
+def remove_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('appointments', 'Appointment')._meta.db_table)
+    schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {CONSTRAINT}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0010_partial_indexes_and_active_slot_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
@@ -1,9 +1,19 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from users.models import User
 
 
+class AvailabilitySlotQuerySet(models.QuerySet):
+    def available(self):
+        """Unbooked, unblocked slots that start in the future, filtered in the database"""
+        now = timezone.localtime()
+        return self.filter(is_booked=False, is_blocked=False).filter(
+            models.Q(date__gt=now.date()) | models.Q(date=now.date(), start_time__gt=now.time())
+        )
+
+
 class AvailabilitySlot(models.Model):
     """Doctor availability time slots"""
     doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availability_slots', limit_choices_to={'role': 'doctor'})
@@ -11,14 +21,27 @@ class AvailabilitySlot(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     is_booked = models.BooleanField(default=False)
+    # Overlaps a busy event in the doctor's Google Calendar (calendar_integration.busy)
+    is_blocked = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AvailabilitySlotQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['doctor', 'date', 'start_time', 'end_time']
         ordering = ['date', 'start_time']
         indexes = [
             models.Index(fields=['doctor', 'date', 'is_booked']),
+            models.Index(fields=['doctor', 'updated_at']),
+            # Time-window scans across all doctors (reminders)
+            models.Index(fields=['date', 'start_time']),
+            # Free slots only: the booking lookup and free-slot lists never touch booked rows
+            models.Index(
+                fields=['doctor', 'date', 'start_time'],
+                condition=models.Q(is_booked=False, is_blocked=False),
+                name='slot_free_doctor_date_idx',
+            ),
         ]
     
     def clean(self):
@@ -31,6 +54,19 @@ class AvailabilitySlot(models.Model):
         if timezone.make_aware(slot_datetime) < timezone.now():
             raise ValidationError('Cannot create availability slots in the past')
     
+    # Fields whose previous values the signal handlers compare against
+    TRACKED_FIELDS = ('date', 'start_time', 'end_time', 'is_booked')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot()
+        return instance
+    
+    def snapshot(self):
+        """Remember the persisted values of the tracked fields"""
+        self._original = {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+    
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
@@ -40,10 +76,10 @@ class AvailabilitySlot(models.Model):
     
     @property
     def is_available(self):
-        """Check if slot is available (future and not booked)"""
+        """Check if slot is available (future, not booked and not blocked)"""
         slot_datetime = timezone.datetime.combine(self.date, self.start_time)
         slot_aware = timezone.make_aware(slot_datetime)
-        return not self.is_booked and slot_aware > timezone.now()
+        return not self.is_booked and not self.is_blocked and slot_aware > timezone.now()
 
 
 class Appointment(models.Model):
@@ -56,9 +92,16 @@ class Appointment(models.Model):
     
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='appointments', limit_choices_to={'role': 'patient'})
     doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='doctor_appointments', limit_choices_to={'role': 'doctor'})
-    slot = models.OneToOneField(AvailabilitySlot, on_delete=models.CASCADE, related_name='appointment')
+    # At most one appointment per slot that is not cancelled (appointment_active_slot_uniq);
+    # cancelled ones stay on the slot, which can then be booked again
+    slot = models.ForeignKey(AvailabilitySlot, on_delete=models.CASCADE, related_name='appointments')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='confirmed')
     notes = models.TextField(blank=True)
+    # Copy of slot.date so per-patient/per-doctor date queries stay on one index
+    slot_date = models.DateField(null=True, blank=True, editable=False)
+    # ... and of its times, for the patient overlap constraint (PostgreSQL)
+    slot_start_time = models.TimeField(null=True, blank=True, editable=False)
+    slot_end_time = models.TimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -66,20 +109,146 @@ class Appointment(models.Model):
     doctor_calendar_event_id = models.CharField(max_length=255, blank=True, null=True)
     patient_calendar_event_id = models.CharField(max_length=255, blank=True, null=True)
     
+    # Set when the reminder is claimed for sending (appointments.reminders)
+    reminder_24h_sent_at = models.DateTimeField(null=True, blank=True)
+    reminder_2h_sent_at = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         ordering = ['slot__date', 'slot__start_time']
         indexes = [
-            models.Index(fields=['patient', 'status']),
+            models.Index(fields=['patient', 'status', 'slot_date']),
+            # One day across all doctors (daily digests)
+            models.Index(fields=['slot_date', 'doctor']),
             models.Index(fields=['doctor', 'status']),
+            models.Index(fields=['patient', 'updated_at']),
+            models.Index(fields=['doctor', 'updated_at']),
+            # Upcoming confirmed visits (dashboards, reminders, digests)
+            models.Index(fields=['patient', 'slot_date'], condition=models.Q(status='confirmed'), name='appt_confirmed_patient_idx'),
+            models.Index(fields=['doctor', 'slot_date'], condition=models.Q(status='confirmed'), name='appt_confirmed_doctor_idx'),
+        ]
+        # PostgreSQL also rejects overlapping active appointments of one patient
+        # (appointment_patient_no_overlap, migration 0011)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['slot'], condition=~models.Q(status='cancelled'), name='appointment_active_slot_uniq'
+            ),
         ]
     
+    TRACKED_FIELDS = ('status', 'notes')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot()
+        return instance
+    
+    def snapshot(self):
+        """Remember the persisted values of the tracked fields"""
+        self._original = {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+    
+    def save(self, *args, **kwargs):
+        if self.slot_id and (self.slot_date is None or Appointment.slot.is_cached(self)):
+            self.slot_date = self.slot.date
+            self.slot_start_time = self.slot.start_time
+            self.slot_end_time = self.slot.end_time
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"Appointment: {self.patient.username} with Dr. {self.doctor.username} on {self.slot.date} at {self.slot.start_time}"
     
     def cancel(self):
-        """Cancel appointment and free up the slot"""
-        self.status = 'cancelled'
-        self.slot.is_booked = False
-        self.slot.save()
-        self.save()
+        """Cancel appointment and free up the slot; returns False if it was cancelled already"""
+        if self.status == 'cancelled':
+            return False
+        with transaction.atomic():
+            # Re-read under a lock so two concurrent cancels don't both free the slot
+            current = Appointment.objects.select_for_update().filter(pk=self.pk).values_list(
+                'status', flat=True
+            ).first()
+            if current == 'cancelled':
+                self.status = current
+                return False
+            self.status = 'cancelled'
+            # A slot freed by an earlier cancellation may have been booked again since
+            if not self.slot.appointments.exclude(status='cancelled').exclude(pk=self.pk).exists():
+                self.slot.is_booked = False
+                self.slot.save()
+            self.save()
+        return True
+
+
+class SyncTombstone(models.Model):
+    """Record of a deleted slot or appointment, served to delta-sync clients"""
+    TYPE_CHOICES = [
+        ('slot', 'Availability slot'),
+        ('appointment', 'Appointment'),
+    ]
+    
+    object_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    # Plain ids rather than foreign keys so tombstones outlive the rows they describe
+    doctor_id = models.BigIntegerField(null=True, blank=True)
+    patient_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['doctor_id', 'deleted_at']),
+            models.Index(fields=['patient_id', 'deleted_at']),
+        ]
+    
+    def __str__(self):
+        return f"Deleted {self.object_type} {self.object_id}"
+
+
+class DoctorDailyStats(models.Model):
+    """Per-doctor, per-day rollup of slot and booking counters.
+
+    Maintained incrementally by the handlers in ``appointments.signals`` and
+    rebuilt from scratch with ``manage.py rebuild_doctor_stats``.
+    """
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats', limit_choices_to={'role': 'doctor'})
+    date = models.DateField()
+    total_slots = models.IntegerField(default=0)
+    booked_slots = models.IntegerField(default=0)
+    bookings = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNTERS = ('total_slots', 'booked_slots', 'bookings', 'cancellations')
+    
+    class Meta:
+        unique_together = ['doctor', 'date']
+        ordering = ['date']
+        verbose_name_plural = 'Doctor daily stats'
+    
+    def __str__(self):
+        return f"{self.doctor.username} - {self.date}"
+    
+    @property
+    def utilization(self):
+        """Share of the day's slots that are booked"""
+        if not self.total_slots:
+            return 0.0
+        return round(self.booked_slots / self.total_slots, 4)
+    
+    @classmethod
+    def record(cls, doctor_id, date, **deltas):
+        """Apply counter deltas to the (doctor, date) row, creating it if needed"""
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+        changes = {name: F(name) + value for name, value in deltas.items()}
+        changes['updated_at'] = timezone.now()
+        
+        with transaction.atomic():
+            if cls.objects.filter(doctor_id=doctor_id, date=date).update(**changes):
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(doctor_id=doctor_id, date=date, **deltas)
+            except IntegrityError:
+                # Another transaction created the row first
+                cls.objects.filter(doctor_id=doctor_id, date=date).update(**changes)
 
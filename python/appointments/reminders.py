@@ -0,0 +1,102 @@
+"""
+Appointment reminders.
+
+Each reminder kind covers a window of slot start times relative to now:
+the 2h reminder goes out for appointments starting within two hours, the
+24h reminder for those starting between two and twenty-four hours out.
+Due appointments are found with a range scan on the slot (date,
+start_time) index, so a run costs in proportion to the appointments in
+the window, not to the size of the table.
+
+Sending is claim-then-send: a chunk is claimed by stamping its
+``reminder_*_sent_at`` column with this run's timestamp, and only rows
+carrying that exact timestamp are emailed. Overlapping runs therefore
+never remind the same appointment twice. A chunk the email service
+rejects outright is released again for the next run.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from hms_project import email_client
+from .models import Appointment
+
+# kind: (sent-at field, lead time, lead time of the next shorter reminder)
+REMINDERS = {
+    '24h': ('reminder_24h_sent_at', timedelta(hours=24), timedelta(hours=2)),
+    '2h': ('reminder_2h_sent_at', timedelta(hours=2), timedelta(0)),
+}
+
+
+def starts_between(start, end, prefix='slot__'):
+    """Q for slots starting in [start, end); both are local datetimes"""
+    after = Q(**{f'{prefix}date__gt': start.date()}) | Q(**{f'{prefix}date': start.date(), f'{prefix}start_time__gte': start.time()})
+    before = Q(**{f'{prefix}date__lt': end.date()}) | Q(**{f'{prefix}date': end.date(), f'{prefix}start_time__lt': end.time()})
+    # The bare date range lets the database narrow the index scan first
+    return Q(**{f'{prefix}date__gte': start.date(), f'{prefix}date__lte': end.date()}) & after & before
+
+
+def due_reminders(kind, now=None):
+    """Confirmed appointments still owed a ``kind`` reminder"""
+    field, lead, shorter_lead = REMINDERS[kind]
+    now = timezone.localtime(now)
+    return Appointment.objects.filter(
+        starts_between(now + shorter_lead, now + lead),
+        status='confirmed',
+        **{f'{field}__isnull': True}
+    )
+
+
+def reminder_message(appointment):
+    patient = appointment.patient
+    doctor = appointment.doctor
+    return {
+        'action': 'APPOINTMENT_REMINDER',
+        'to_email': patient.email,
+        'to_name': patient.get_full_name() or patient.username,
+        'doctor_name': doctor.get_full_name() or doctor.username,
+        'appointment_date': str(appointment.slot.date),
+        'appointment_time': str(appointment.slot.start_time),
+        'appointment_id': appointment.id
+    }
+
+
+def send_due_reminders(kind, now=None, batch_size=None, dry_run=False):
+    """Claim and send every due ``kind`` reminder; returns (claimed, sent)"""
+    field = REMINDERS[kind][0]
+    batch_size = batch_size or getattr(settings, 'EMAIL_BATCH_SIZE', 100)
+    due = due_reminders(kind, now).order_by('slot__date', 'slot__start_time', 'id')
+    
+    if dry_run:
+        return due.count(), 0
+    
+    claimed_total = 0
+    sent_total = 0
+    released = set()
+    while True:
+        ids = list(due.exclude(pk__in=released).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        
+        # Microsecond timestamp doubles as this run's claim token
+        claimed_at = timezone.now()
+        Appointment.objects.filter(pk__in=ids, **{f'{field}__isnull': True}).update(**{field: claimed_at})
+        claimed = list(
+            Appointment.objects.filter(pk__in=ids, **{field: claimed_at})
+            .select_related('patient', 'doctor', 'slot')
+        )
+        if not claimed:
+            # Another run took this chunk
+            continue
+        
+        claimed_total += len(claimed)
+        sent = email_client.send_batch([reminder_message(appointment) for appointment in claimed])
+        sent_total += sent
+        if not sent:
+            # Nothing was accepted; let the next run retry these
+            Appointment.objects.filter(pk__in=[a.pk for a in claimed], **{field: claimed_at}).update(**{field: None})
+            released.update(a.pk for a in claimed)
+    
+    return claimed_total, sent_total
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import AvailabilitySlot, Appointment
+from .models import AvailabilitySlot, Appointment, DoctorDailyStats
 from users.serializers import UserSerializer
 from django.utils import timezone
 
@@ -11,8 +11,8 @@ class AvailabilitySlotSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = AvailabilitySlot
-        fields = ('id', 'doctor', 'doctor_id', 'date', 'start_time', 'end_time', 'is_booked', 'is_available', 'created_at')
-        read_only_fields = ('is_booked',)
+        fields = ('id', 'doctor', 'doctor_id', 'date', 'start_time', 'end_time', 'is_booked', 'is_blocked', 'is_available', 'created_at')
+        read_only_fields = ('is_booked', 'is_blocked')
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -36,3 +36,11 @@ class AppointmentCreateSerializer(serializers.Serializer):
     end_time = serializers.TimeField()
     notes = serializers.CharField(required=False, allow_blank=True)
 
+
+
+class DoctorDailyStatsSerializer(serializers.ModelSerializer):
+    utilization = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = DoctorDailyStats
+        fields = ('doctor_id', 'date', 'total_slots', 'booked_slots', 'bookings', 'cancellations', 'utilization')
@@ -0,0 +1,145 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .events import hub, slot_event, booking_event
+from calendar_integration.feeds import bump_feed_versions
+from calendar_integration.models import BusyInterval
+from calendar_integration.reconciler import schedule_sync
+from .models import AvailabilitySlot, Appointment, DoctorDailyStats, SyncTombstone
+
+
+def publish_on_commit(doctor_id, event):
+    """Push a live event once the surrounding transaction has committed"""
+    transaction.on_commit(lambda: hub.publish(doctor_id, event))
+
+
+@receiver(pre_save, sender=AvailabilitySlot)
+def slot_saving(sender, instance, raw=False, **kwargs):
+    """Block a new or moved slot right away if imported busy time overlaps it"""
+    if raw:
+        return
+
+    original = getattr(instance, '_original', None)
+    if original is None or any(
+        original[name] != instance.__dict__.get(name) for name in ('date', 'start_time', 'end_time')
+    ):
+        instance.is_blocked = BusyInterval.overlaps(instance)
+
+
+@receiver(post_save, sender=AvailabilitySlot)
+def slot_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the daily slot counters in step with slot changes"""
+    if raw:
+        return
+
+    original = getattr(instance, '_original', None)
+    if created or original is None:
+        DoctorDailyStats.record(
+            instance.doctor_id, instance.date,
+            total_slots=1, booked_slots=int(instance.is_booked)
+        )
+        publish_on_commit(instance.doctor_id, slot_event('slot.created', instance))
+    elif original['date'] != instance.date:
+        DoctorDailyStats.record(
+            instance.doctor_id, original['date'],
+            total_slots=-1, booked_slots=-int(original['is_booked'])
+        )
+        DoctorDailyStats.record(
+            instance.doctor_id, instance.date,
+            total_slots=1, booked_slots=int(instance.is_booked)
+        )
+        # The slot's appointments are counted against its day as well
+        moved = Appointment.objects.filter(slot=instance).aggregate(
+            bookings=Count('id'), cancellations=Count('id', filter=Q(status='cancelled'))
+        )
+        DoctorDailyStats.record(
+            instance.doctor_id, original['date'],
+            bookings=-moved['bookings'], cancellations=-moved['cancellations']
+        )
+        DoctorDailyStats.record(instance.doctor_id, instance.date, **moved)
+        publish_on_commit(instance.doctor_id, slot_event('slot.updated', instance))
+    elif original['is_booked'] != instance.is_booked:
+        DoctorDailyStats.record(
+            instance.doctor_id, instance.date,
+            booked_slots=1 if instance.is_booked else -1
+        )
+        kind = 'slot.booked' if instance.is_booked else 'slot.freed'
+        publish_on_commit(instance.doctor_id, slot_event(kind, instance))
+
+    if original is not None and not created and any(
+        original[name] != instance.__dict__.get(name) for name in ('date', 'start_time', 'end_time')
+    ):
+        # Keep the appointments' copies of the slot time, then move their calendar events
+        Appointment.objects.filter(slot=instance).update(
+            slot_date=instance.date, slot_start_time=instance.start_time, slot_end_time=instance.end_time,
+            updated_at=timezone.now(),
+        )
+        for appointment in Appointment.objects.filter(slot=instance):
+            schedule_sync(appointment)
+            bump_feed_versions(appointment.doctor_id, appointment.patient_id)
+
+    instance.snapshot()
+
+
+@receiver(post_delete, sender=AvailabilitySlot)
+def slot_deleted(sender, instance, **kwargs):
+    SyncTombstone.objects.create(object_type='slot', object_id=instance.pk, doctor_id=instance.doctor_id)
+    DoctorDailyStats.record(
+        instance.doctor_id, instance.date,
+        total_slots=-1, booked_slots=-int(instance.is_booked)
+    )
+    publish_on_commit(instance.doctor_id, slot_event('slot.deleted', instance))
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    """Count new bookings and cancellations against the slot's day"""
+    if raw:
+        return
+
+    original = getattr(instance, '_original', None)
+    if created:
+        DoctorDailyStats.record(
+            instance.doctor_id, instance.slot.date,
+            bookings=1, cancellations=int(instance.status == 'cancelled')
+        )
+        publish_on_commit(instance.doctor_id, booking_event('booking.created', instance))
+        bump_feed_versions(instance.doctor_id, instance.patient_id)
+    elif original is not None and original['status'] != instance.status:
+        if instance.status == 'cancelled':
+            DoctorDailyStats.record(instance.doctor_id, instance.slot.date, cancellations=1)
+            publish_on_commit(instance.doctor_id, booking_event('booking.cancelled', instance))
+        elif original['status'] == 'cancelled':
+            DoctorDailyStats.record(instance.doctor_id, instance.slot.date, cancellations=-1)
+
+    if original is not None and not created and any(
+        original[name] != instance.__dict__.get(name) for name in ('status', 'notes')
+    ):
+        # Calendar events are updated or deleted in the background
+        schedule_sync(instance)
+        bump_feed_versions(instance.doctor_id, instance.patient_id)
+
+    instance.snapshot()
+
+
+@receiver(pre_delete, sender=Appointment)
+def appointment_deleting(sender, instance, **kwargs):
+    """Queue removal of the calendar events while the event ids are still at hand"""
+    schedule_sync(instance, deleted=True)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    SyncTombstone.objects.create(
+        object_type='appointment',
+        object_id=instance.pk,
+        doctor_id=instance.doctor_id,
+        patient_id=instance.patient_id
+    )
+    DoctorDailyStats.record(
+        instance.doctor_id, instance.slot_date,
+        bookings=-1, cancellations=-int(instance.status == 'cancelled')
+    )
+    bump_feed_versions(instance.doctor_id, instance.patient_id)
@@ -0,0 +1,133 @@
+"""
+Delta sync for mobile clients.
+
+Each stream (appointments, slots, tombstones) is read with a keyset on
+``(updated_at, id)`` over an index that starts with the owning user, so a
+sync costs one short index range scan per stream no matter how large the
+tables are. The position of every stream is packed into a signed, opaque
+cursor that the client hands back on its next call.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AvailabilitySlot, Appointment, SyncTombstone
+
+CURSOR_SALT = 'appointments.sync'
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(Exception):
+    """The cursor was tampered with, belongs to another scope, or is too old"""
+
+
+def settle_window():
+    """Rows newer than this may still belong to uncommitted transactions"""
+    return timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 2))
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def encode_cursor(scope, positions):
+    return signing.dumps({
+        'scope': scope,
+        'issued': timezone.now().isoformat(),
+        'pos': {
+            name: [ts.isoformat(), pk] if ts else None
+            for name, (ts, pk) in positions.items()
+        },
+    }, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, scope):
+    """Return {stream: (timestamp, id)} for a cursor issued to this scope"""
+    empty = {'appointments': (None, 0), 'slots': (None, 0), 'deleted': (None, 0)}
+    if not cursor:
+        return empty
+
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Cursor is not valid')
+    if data.get('scope') != scope:
+        raise InvalidCursor('Cursor was issued for a different sync scope')
+
+    issued = parse_datetime(data.get('issued') or '')
+    if issued is None or issued < timezone.now() - tombstone_retention():
+        # Deletions older than the retention window may have been pruned
+        raise InvalidCursor('Cursor has expired; a full resync is required')
+
+    positions = dict(empty)
+    for name, value in (data.get('pos') or {}).items():
+        if name in positions and value:
+            positions[name] = (parse_datetime(value[0]), int(value[1]))
+    return positions
+
+
+def _after(queryset, field, position, high_water, limit):
+    """Rows strictly after ``position`` in (field, id) order, up to high_water"""
+    ts, pk = position
+    queryset = queryset.filter(**{f'{field}__lte': high_water})
+    if ts is not None:
+        queryset = queryset.filter(Q(**{f'{field}__gt': ts}) | Q(**{field: ts, 'id__gt': pk}))
+    rows = list(queryset.order_by(field, 'id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        last = rows[-1]
+        position = (getattr(last, field), last.id)
+    return rows, position, has_more
+
+
+def collect_changes(user, cursor=None, doctor_id=None, limit=DEFAULT_PAGE_SIZE):
+    """Appointments, slots and deletions changed since ``cursor``.
+
+    Doctors sync their own slots and appointments. Patients sync their own
+    appointments plus the slots of ``doctor_id`` when one is given.
+    """
+    if user.is_doctor:
+        scope = f'doctor:{user.id}'
+        appointments = Appointment.objects.filter(doctor=user)
+        slots = AvailabilitySlot.objects.filter(doctor=user)
+        deleted = SyncTombstone.objects.filter(doctor_id=user.id)
+    else:
+        scope = f'patient:{user.id}:{doctor_id or ""}'
+        appointments = Appointment.objects.filter(patient=user)
+        tombstone_scope = Q(patient_id=user.id, object_type='appointment')
+        if doctor_id:
+            slots = AvailabilitySlot.objects.filter(doctor_id=doctor_id, date__gte=timezone.now().date())
+            tombstone_scope |= Q(doctor_id=doctor_id, object_type='slot')
+        else:
+            slots = AvailabilitySlot.objects.none()
+        deleted = SyncTombstone.objects.filter(tombstone_scope)
+
+    positions = decode_cursor(cursor, scope)
+    high_water = timezone.now() - settle_window()
+
+    appointment_rows, positions['appointments'], more_appointments = _after(
+        appointments.select_related('patient', 'doctor', 'slot', 'slot__doctor'),
+        'updated_at', positions['appointments'], high_water, limit
+    )
+    slot_rows, positions['slots'], more_slots = _after(
+        slots.select_related('doctor'),
+        'updated_at', positions['slots'], high_water, limit
+    )
+    deleted_rows, positions['deleted'], more_deleted = _after(
+        deleted, 'deleted_at', positions['deleted'], high_water, limit
+    )
+
+    return {
+        'appointments': appointment_rows,
+        'slots': slot_rows,
+        'deleted': deleted_rows,
+        'cursor': encode_cursor(scope, positions),
+        'has_more': more_appointments or more_slots or more_deleted,
+    }
@@ -1,11 +1,13 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('availability/', views.availability_list_create, name='availability_list_create'),
     path('availability/<int:pk>/', views.availability_detail, name='availability_detail'),
     path('available-slots/', views.available_slots, name='available_slots'),
     path('book/', views.book_appointment, name='book_appointment'),
+    path('sync/', views.sync_changes, name='sync_changes'),
+    path('stream/<int:doctor_id>/', async_views.availability_stream, name='availability_stream'),
     path('', views.appointment_list, name='appointment_list'),
     path('<int:pk>/', views.appointment_detail, name='appointment_detail'),
 ]
@@ -1,15 +1,15 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from .models import AvailabilitySlot, Appointment
 from .serializers import AvailabilitySlotSerializer, AppointmentSerializer, AppointmentCreateSerializer
+from .sync import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, collect_changes
 from users.models import User
 from calendar_integration.services import GoogleCalendarService
-from django.conf import settings
-import requests
+from hms_project import email_client
 
 
 @api_view(['GET', 'POST'])
@@ -40,13 +40,10 @@ def availability_list_create(request):
         if date_filter:
             slots = slots.filter(date=date_filter)
         
-        # Filter by availability status
+        # Filter by availability status (unbooked and in the future)
         available_only = request.query_params.get('available_only', 'false').lower() == 'true'
         if available_only:
-            slots = slots.filter(is_booked=False)
-            # Also filter out past slots
-            now = timezone.now()
-            slots = [slot for slot in slots if slot.is_available]
+            slots = slots.available()
         
         serializer = AvailabilitySlotSerializer(slots, many=True)
         return Response(serializer.data)
@@ -119,19 +116,13 @@ def available_slots(request):
     except User.DoesNotExist:
         return Response({'error': 'Doctor not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    slots = AvailabilitySlot.objects.filter(
-        doctor=doctor,
-        is_booked=False
-    )
+    # Past and booked slots are filtered out in the database
+    slots = AvailabilitySlot.objects.filter(doctor=doctor).available().select_related('doctor')
     
     if date:
         slots = slots.filter(date=date)
     
-    # Filter out past slots
-    now = timezone.now()
-    available_slots_list = [slot for slot in slots if slot.is_available]
-    
-    serializer = AvailabilitySlotSerializer(available_slots_list, many=True)
+    serializer = AvailabilitySlotSerializer(slots, many=True)
     return Response(serializer.data)
 
 
@@ -169,53 +160,59 @@ def book_appointment(request):
         return Response({'error': 'Doctor not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Use database transaction to prevent race conditions
-    with transaction.atomic():
-        # Select for update to lock the row
-        slot = AvailabilitySlot.objects.select_for_update().filter(
-            doctor=doctor,
-            date=date,
-            start_time=start_time,
-            end_time=end_time,
-            is_booked=False
-        ).first()
-        
-        if not slot:
-            return Response({'error': 'Slot not found or already booked'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Double-check availability
-        if not slot.is_available:
-            return Response({'error': 'Slot is no longer available'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Mark slot as booked
-        slot.is_booked = True
-        slot.save()
-        
-        # Create appointment
-        appointment = Appointment.objects.create(
-            patient=request.user,
-            doctor=doctor,
-            slot=slot,
-            notes=notes
-        )
+    try:
+        with transaction.atomic():
+            # Locks the row on PostgreSQL (SQLite serializes writers instead); either way
+            # appointment_active_slot_uniq is what guarantees one booking per slot
+            slot = AvailabilitySlot.objects.select_for_update().filter(
+                doctor=doctor,
+                date=date,
+                start_time=start_time,
+                end_time=end_time,
+                is_booked=False,
+                is_blocked=False
+            ).first()
+            
+            if not slot:
+                return Response({'error': 'Slot not found or already booked'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Double-check availability
+            if not slot.is_available:
+                return Response({'error': 'Slot is no longer available'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # A patient cannot be in two appointments at once (also a constraint on PostgreSQL)
+            overlapping = Appointment.objects.filter(
+                patient=request.user,
+                slot_date=date,
+                slot_start_time__lt=end_time,
+                slot_end_time__gt=start_time
+            ).exclude(status='cancelled')
+            if overlapping.exists():
+                return Response({'error': 'You already have an appointment at this time'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Mark slot as booked
+            slot.is_booked = True
+            slot.save()
+            
+            # Create appointment
+            appointment = Appointment.objects.create(
+                patient=request.user,
+                doctor=doctor,
+                slot=slot,
+                notes=notes
+            )
+    except IntegrityError:
+        # A concurrent booking got the slot, or an overlapping time, first
+        return Response({'error': 'Slot not found or already booked'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Create Google Calendar events
+    # Create Google Calendar events (doctor and patient in one batch request)
     calendar_service = GoogleCalendarService()
     try:
-        # Create event in doctor's calendar
-        if doctor.google_calendar_token:
-            doctor_event = calendar_service.create_appointment_event(
-                doctor, appointment, is_doctor=True
-            )
-            if doctor_event:
-                appointment.doctor_calendar_event_id = doctor_event.get('id')
-        
-        # Create event in patient's calendar
-        if request.user.google_calendar_token:
-            patient_event = calendar_service.create_appointment_event(
-                request.user, appointment, is_doctor=False
-            )
-            if patient_event:
-                appointment.patient_calendar_event_id = patient_event.get('id')
+        events = calendar_service.create_appointment_events(appointment)
+        if events['doctor']:
+            appointment.doctor_calendar_event_id = events['doctor'].get('id')
+        if events['patient']:
+            appointment.patient_calendar_event_id = events['patient'].get('id')
         
         appointment.save()
     except Exception as e:
@@ -233,7 +230,7 @@ def book_appointment(request):
             'appointment_time': str(appointment.slot.start_time),
             'appointment_id': appointment.id
         }
-        requests.post(settings.EMAIL_SERVICE_URL, json=email_data, timeout=5)
+        email_client.send(email_data)
     except Exception as e:
         print(f"Email service error: {e}")
     
@@ -251,6 +248,7 @@ def appointment_list(request):
         appointments = Appointment.objects.filter(patient=request.user)
     else:
         return Response({'error': 'Invalid user role'}, status=status.HTTP_403_FORBIDDEN)
+    appointments = appointments.select_related('patient', 'doctor', 'slot', 'slot__doctor')
     
     # Filter by status if provided
     status_filter = request.query_params.get('status')
@@ -281,9 +279,52 @@ def appointment_detail(request, pk):
         if serializer.is_valid():
             # If status is being changed to cancelled
             if 'status' in request.data and request.data['status'] == 'cancelled':
-                appointment.cancel()
+                if not appointment.cancel():
+                    return Response({'error': 'Appointment is already cancelled'}, status=status.HTTP_400_BAD_REQUEST)
             else:
                 serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sync_changes(request):
+    """Appointments and slots created, updated or deleted since the given cursor"""
+    if not request.user.is_doctor and not request.user.is_patient:
+        return Response({'error': 'Invalid user role'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        limit = min(max(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    doctor_id = request.query_params.get('doctor_id')
+    if doctor_id and not doctor_id.isdigit():
+        return Response({'error': 'doctor_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        changes = collect_changes(
+            request.user,
+            cursor=request.query_params.get('cursor'),
+            doctor_id=int(doctor_id) if doctor_id else None,
+            limit=limit
+        )
+    except InvalidCursor as e:
+        return Response({
+            'error': 'Invalid cursor',
+            'message': str(e),
+            'resync_required': True
+        }, status=status.HTTP_410_GONE)
+    
+    return Response({
+        'appointments': AppointmentSerializer(changes['appointments'], many=True).data,
+        'slots': AvailabilitySlotSerializer(changes['slots'], many=True).data,
+        'deleted': [
+            {'type': tombstone.object_type, 'id': tombstone.object_id, 'deleted_at': tombstone.deleted_at}
+            for tombstone in changes['deleted']
+        ],
+        'cursor': changes['cursor'],
+        'has_more': changes['has_more']
+    })
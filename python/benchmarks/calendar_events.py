@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Per-event overhead of creating Google Calendar events, before and after
+caching the API client.
+
+"build per event" reproduces the old code path: ``build('calendar', 'v3')``
+for every event, which loads and parses the discovery document and opens
+a fresh HTTP connection. "cached client" goes through
+``calendar_service_for``: the discovery document is parsed once and each
+thread keeps its clients and a keep-alive transport.
+
+The last two runs time a booking's pair of events (doctor and patient):
+two sequential inserts against one batch request carrying both.
+
+Both run against a local fake Calendar server (benchmarks/fake_calendar.py);
+--latency adds a per-request delay to stand in for the network.
+
+Usage (from the project root):
+    python benchmarks/calendar_events.py --events 200 --users 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hms_project.settings')
+
+from fake_calendar import FakeCalendarServer  # noqa: E402
+
+EVENT = {
+    'summary': 'Benchmark appointment',
+    'start': {'dateTime': '2024-01-15T10:00:00Z', 'timeZone': 'UTC'},
+    'end': {'dateTime': '2024-01-15T11:00:00Z', 'timeZone': 'UTC'},
+}
+
+
+def credentials(index):
+    from google.oauth2.credentials import Credentials
+    return Credentials(token=f'token-{index}', refresh_token=f'refresh-{index}')
+
+
+def run(name, insert, events, users, server):
+    requests_before, connections_before = server.requests, server.connections
+    latencies = []
+    for index in range(events):
+        started = time.perf_counter()
+        insert(index % users)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(
+        f'{name:<18} mean {statistics.fmean(latencies):7.2f} ms  '
+        f'p50 {latencies[len(latencies) // 2]:7.2f} ms  p99 {latencies[int(len(latencies) * 0.99) - 1]:7.2f} ms  '
+        f'{server.requests - requests_before} requests over {server.connections - connections_before} connections'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--users', type=int, default=20, help='Distinct calendar users')
+    parser.add_argument('--latency', type=float, default=0, help='Fake server delay per request (ms)')
+    args = parser.parse_args()
+
+    server = FakeCalendarServer(latency=args.latency / 1000).start()
+    os.environ['GOOGLE_CALENDAR_API_ENDPOINT'] = server.endpoint
+
+    import django
+    django.setup()
+    from googleapiclient.discovery import build
+    from calendar_integration.services import calendar_service_for, execute_batch
+
+    creds = [credentials(index) for index in range(args.users)]
+
+    def build_per_event(user):
+        service = build('calendar', 'v3', credentials=creds[user], client_options={'api_endpoint': server.endpoint})
+        service.events().insert(calendarId='primary', body=EVENT).execute()
+
+    def cached_client(user):
+        service = calendar_service_for(creds[user], user)
+        service.events().insert(calendarId='primary', body=EVENT).execute()
+
+    def insert_request(user):
+        return calendar_service_for(creds[user], user).events().insert(calendarId='primary', body=EVENT)
+
+    def pair_sequential(user):
+        insert_request(user).execute()
+        insert_request((user + 1) % args.users).execute()
+
+    def pair_batched(user):
+        execute_batch([('doctor', insert_request(user)), ('patient', insert_request((user + 1) % args.users))])
+
+    print(f'{args.events} events for {args.users} users, fake server latency {args.latency} ms')
+    run('build per event', build_per_event, args.events, args.users, server)
+    run('cached client', cached_client, args.events, args.users, server)
+    run('pair, sequential', pair_sequential, args.events // 2, args.users, server)
+    run('pair, batched', pair_batched, args.events // 2, args.users, server)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Minimal local stand-in for the Google Calendar API, for benchmarks.
+
+Serves event list, insert, patch and delete under
+``/calendar/v3/calendars/<id>/events`` (events are kept in ``server.events``;
+listing supports paging and incremental ``syncToken``\s), events.watch,
+channels.stop, the multipart ``POST /batch/calendar/v3`` endpoint and an
+OAuth ``POST /token`` endpoint with keep-alive, optionally waiting ``latency`` seconds per HTTP request to
+stand in for the round trip to Google. It counts HTTP requests, API calls
+(a batch counts once per part) and TCP connections. With ``rate_limit``
+set, API calls beyond that many per second are refused with Google's 403
+rateLimitExceeded. Point the app at it with
+GOOGLE_CALENDAR_API_ENDPOINT=<server.endpoint>.
+
+It doubles as a push notifier: every change to an event is POSTed, with
+Google's X-Goog-* headers, to the address of each watch channel, from a
+background thread in the order the changes happened.
+"""
+import collections
+import email.parser
+import itertools
+import json
+import queue
+import socket
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+REASONS = {200: 'OK', 204: 'No Content', 403: 'Forbidden', 404: 'Not Found'}
+
+RATE_LIMITED = {
+    'error': {
+        'code': 403,
+        'message': 'Rate Limit Exceeded',
+        'errors': [{'domain': 'usageLimits', 'reason': 'rateLimitExceeded', 'message': 'Rate Limit Exceeded'}],
+    }
+}
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle hold the body
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+
+    def _send(self, status, payload, content_type='application/json'):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        path = self.path.split('?')[0]
+        self.server.requests += 1
+        time.sleep(self.server.latency)
+        if path == '/token':
+            self._token(dict(parse_qsl(raw.decode())))
+        elif path.startswith('/batch/'):
+            self._batch(raw)
+        else:
+            self._send(*self.server.api_call('POST', path, raw))
+
+    def _other(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        self.server.requests += 1
+        time.sleep(self.server.latency)
+        target = urlsplit(self.path)
+        status, payload = self.server.api_call(self.command, target.path, raw, dict(parse_qsl(target.query)))
+        if status == 204:
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self._send(status, payload)
+
+    do_GET = do_PATCH = do_DELETE = _other
+
+    def _token(self, form):
+        """OAuth token endpoint: refresh_token=revoked answers invalid_grant"""
+        if form.get('refresh_token') == 'revoked':
+            self._send(400, {'error': 'invalid_grant', 'error_description': 'Token has been expired or revoked.'})
+            return
+        self._send(200, {
+            'access_token': f'access-{next(self.server.ids)}',
+            'expires_in': 3600,
+            'token_type': 'Bearer',
+        })
+
+    def _batch(self, raw):
+        """multipart/mixed in, one application/http part per call out"""
+        envelope = email.parser.BytesParser().parsebytes(
+            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode() + raw
+        )
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in envelope.get_payload():
+            request_line, _, rest = part.get_payload().partition('\n')
+            method, target = request_line.split()[:2]
+            inner = email.parser.Parser().parsestr(rest)
+            target = urlsplit(target)
+            status, payload = self.server.api_call(
+                method, target.path, inner.get_payload().encode(), dict(parse_qsl(target.query))
+            )
+            body = json.dumps(payload) if payload is not None else ''
+            content_id = part['Content-ID'].strip('<>')
+            parts.append(
+                f'--{boundary}\r\n'
+                f'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} {REASONS.get(status, "Error")}\r\n'
+                f'Content-Type: application/json; charset=UTF-8\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n'
+                f'{body}\r\n'
+            )
+        parts.append(f'--{boundary}--\r\n')
+        self._send(200, ''.join(parts).encode(), f'multipart/mixed; boundary={boundary}')
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeCalendarServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, port=0, handler=FakeCalendarHandler, rate_limit=0):
+        super().__init__(('127.0.0.1', port), handler)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.calls = 0
+        self.rejected = 0
+        self.connections = 0
+        self.ids = itertools.count(1)
+        self.events = {}
+        # Change sequence number per event id, deleted ones included
+        self.versions = {}
+        self.sequence = itertools.count(1)
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+        self.channels = {}
+        self.notifications = 0
+        self.failed_notifications = 0
+        self._outbox = queue.Queue()
+
+    @property
+    def endpoint(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/calendar/v3/'
+
+    @property
+    def token_uri(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/token'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        threading.Thread(target=self._deliver, daemon=True).start()
+        return self
+
+    def _notify(self, channel, state):
+        channel['messages'] += 1
+        self._outbox.put((channel['address'], {
+            'X-Goog-Channel-ID': channel['id'],
+            'X-Goog-Channel-Token': channel.get('token', ''),
+            'X-Goog-Channel-Expiration': channel['expiration'],
+            'X-Goog-Resource-ID': channel['resourceId'],
+            'X-Goog-Resource-URI': channel['resourceUri'],
+            'X-Goog-Resource-State': state,
+            'X-Goog-Message-Number': str(channel['messages']),
+        }))
+
+    def _deliver(self):
+        while True:
+            address, headers = self._outbox.get()
+            try:
+                urllib.request.urlopen(urllib.request.Request(address, data=b'', headers=headers), timeout=5).close()
+                self.notifications += 1
+            except Exception:
+                self.failed_notifications += 1
+            self._outbox.task_done()
+
+    def drain(self):
+        """Wait until every queued notification has been delivered"""
+        self._outbox.join()
+
+    def _watch(self, calendar_id, raw):
+        body = json.loads(raw or b'{}')
+        ttl = int(body.get('params', {}).get('ttl') or 604800)
+        channel = {
+            'kind': 'api#channel',
+            'id': body['id'],
+            'resourceId': f'resource-{calendar_id}',
+            'resourceUri': f'{self.endpoint}calendars/{calendar_id}/events',
+            'token': body.get('token', ''),
+            'address': body['address'],
+            'expiration': str(int((time.time() + ttl) * 1000)),
+            'messages': 0,
+        }
+        self.channels[channel['id']] = channel
+        self._notify(channel, 'sync')
+        return 200, {key: value for key, value in channel.items() if key not in ('address', 'messages')}
+
+    def _stop(self, raw):
+        body = json.loads(raw or b'{}')
+        channel = self.channels.get(body.get('id'))
+        if channel is None or channel['resourceId'] != body.get('resourceId'):
+            return 404, {'error': {'code': 404, 'message': 'Channel not found'}}
+        del self.channels[channel['id']]
+        return 204, None
+
+    def _throttled(self):
+        """Sliding one-second window of accepted calls"""
+        if not self.rate_limit:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.rejected += 1
+                return True
+            self._recent.append(now)
+            return False
+
+    def _changed(self, event_id):
+        self.versions[event_id] = next(self.sequence)
+        for channel in list(self.channels.values()):
+            self._notify(channel, 'exists')
+
+    def _list(self, query):
+        """events.list: everything live, or every change after a syncToken"""
+        if 'syncToken' in query:
+            if not query['syncToken'].isdigit():
+                return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid, a full sync is required.'}}
+            after = int(query['syncToken'])
+            ids = [event_id for event_id, version in self.versions.items() if version > after]
+            items = [self.events.get(event_id, {'id': event_id, 'status': 'cancelled'}) for event_id in ids]
+        else:
+            items = list(self.events.values())
+        offset = int(query.get('pageToken') or 0)
+        size = int(query.get('maxResults') or 250)
+        page = {'kind': 'calendar#events', 'items': items[offset:offset + size]}
+        if offset + size < len(items):
+            page['nextPageToken'] = str(offset + size)
+        else:
+            page['nextSyncToken'] = str(max(self.versions.values(), default=0))
+        return 200, page
+
+    def api_call(self, method, path, raw, query=None):
+        """(status, payload) for one Calendar API call"""
+        self.calls += 1
+        if self._throttled():
+            return 403, RATE_LIMITED
+        if method == 'POST' and path == '/calendar/v3/channels/stop':
+            return self._stop(raw)
+        prefix, _, event_id = path.partition('/events')
+        event_id = event_id.strip('/')
+        if method == 'POST' and event_id == 'watch':
+            return self._watch(prefix.rsplit('/', 1)[-1], raw)
+        if not prefix.startswith('/calendar/v3/calendars/') or (method in ('GET', 'POST')) == bool(event_id):
+            return 404, {'error': {'code': 404, 'message': 'Not found'}}
+        if method == 'GET':
+            return self._list(query or {})
+        if method == 'POST':
+            event = dict(json.loads(raw or b'{}'), id=f'evt{next(self.ids)}', status='confirmed')
+            self.events[event['id']] = event
+            self._changed(event['id'])
+            return 200, event
+        if event_id not in self.events:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        self._changed(event_id)
+        if method == 'DELETE':
+            del self.events[event_id]
+            return 204, None
+        self.events[event_id].update(json.loads(raw or b'{}'))
+        return 200, self.events[event_id]
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+"""
+Compare read throughput and tail latency of the sync (gunicorn/WSGI) and
+async (uvicorn/ASGI) deployments.
+
+The script seeds the configured database with doctors, slots and one
+patient session, starts each server in turn, drives it with a keep-alive
+asyncio HTTP client at the requested concurrency and prints requests per
+second with p50/p95/p99 latencies.
+
+Usage (from the project root):
+    python benchmarks/read_throughput.py --concurrency 200 --requests 5000
+    python benchmarks/read_throughput.py --endpoint doctors --workers 4
+
+The sync run hits the DRF views (/api/...); the async run hits the async
+ORM variants (/api/async/...). Point DB_ENGINE at PostgreSQL for numbers
+that mean anything; SQLite serializes all access.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hms_project.settings')
+
+ENDPOINTS = {
+    'slots': '/api/appointments/available-slots/?doctor_id={doctor_id}',
+    'appointments': '/api/appointments/',
+    'doctors': '/api/auth/doctors/',
+    'status': '/api/auth/status/',
+}
+
+
+def seed(doctors, slots_per_doctor):
+    """Create benchmark users and slots; return (session cookie, first doctor id)"""
+    import django
+    django.setup()
+
+    from datetime import date, time as dtime, timedelta
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.core.management import call_command
+    from appointments.models import AvailabilitySlot
+    from users.models import User, DoctorProfile
+
+    call_command('migrate', verbosity=0)
+
+    patient, _ = User.objects.get_or_create(
+        email='bench-patient@example.com',
+        defaults={'username': 'bench-patient', 'role': 'patient'}
+    )
+    first_doctor = None
+    start_day = date.today() + timedelta(days=1)
+    for index in range(doctors):
+        doctor, created = User.objects.get_or_create(
+            email=f'bench-doctor-{index}@example.com',
+            defaults={'username': f'bench-doctor-{index}', 'role': 'doctor'}
+        )
+        first_doctor = first_doctor or doctor
+        if created:
+            DoctorProfile.objects.create(user=doctor, specialization='Benchmark')
+            AvailabilitySlot.objects.bulk_create([
+                AvailabilitySlot(
+                    doctor=doctor,
+                    date=start_day + timedelta(days=n // 8),
+                    start_time=dtime(9 + n % 8),
+                    end_time=dtime(10 + n % 8),
+                )
+                for n in range(slots_per_doctor)
+            ])
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(patient.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = patient.get_session_auth_hash()
+    session.create()
+    return session.session_key, first_doctor.id
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    status = int(status_line.split()[1])
+    length = None
+    chunked = False
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+        elif name == 'connection' and 'close' in value.lower():
+            keep_alive = False
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _worker(host, port, path, cookie, remaining, latencies, errors):
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+        f'Cookie: sessionid={cookie}\r\nConnection: keep-alive\r\n\r\n'
+    ).encode()
+    reader = writer = None
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+            if status != 200:
+                errors.append(status)
+            if not keep_alive:
+                # gunicorn's sync workers close after every response
+                writer.close()
+                reader = writer = None
+        except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - started)
+    if writer is not None:
+        writer.close()
+
+
+async def drive(host, port, path, cookie, concurrency, total):
+    latencies, errors = [], []
+    remaining = [total]
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _worker(host, port, path, cookie, remaining, latencies, errors)
+        for _ in range(concurrency)
+    ])
+    return time.perf_counter() - started, latencies, errors
+
+
+def _percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _wait_until_listening(host, port, timeout=30):
+    import socket
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on {host}:{port} did not start')
+
+
+def run_server(command, host, port, path, cookie, args):
+    env = dict(os.environ, ALLOWED_HOSTS='*', DEBUG='False')
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_until_listening(host, port)
+        # Warm up connections, imports and the ORM
+        asyncio.run(drive(host, port, path, cookie, min(args.concurrency, 10), 50))
+        return asyncio.run(drive(host, port, path, cookie, args.concurrency, args.requests))
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def report(name, elapsed, latencies, errors):
+    ms = [latency * 1000 for latency in latencies]
+    print(
+        f'{name:<8} {len(latencies) / elapsed:>9.1f} req/s  '
+        f'p50 {_percentile(ms, 50):>7.1f} ms  p95 {_percentile(ms, 95):>7.1f} ms  '
+        f'p99 {_percentile(ms, 99):>7.1f} ms  mean {statistics.fmean(ms) if ms else float("nan"):>7.1f} ms  '
+        f'errors {len(errors)}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='slots')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=2, help='Server worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--slots', type=int, default=40, help='Slots per doctor')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    cookie, doctor_id = seed(args.doctors, args.slots)
+    sync_path = ENDPOINTS[args.endpoint].format(doctor_id=doctor_id)
+    async_path = sync_path.replace('/api/', '/api/async/', 1)
+    bind = f'{args.host}:{args.port}'
+
+    print(f'{args.requests} requests to {args.endpoint} at concurrency {args.concurrency}, {args.workers} workers')
+    runs = [
+        ('gunicorn', [
+            sys.executable, '-m', 'gunicorn', 'hms_project.wsgi:application',
+            '--bind', bind, '--workers', str(args.workers), '--threads', str(args.threads),
+        ], sync_path),
+        ('uvicorn', [
+            sys.executable, '-m', 'uvicorn', 'hms_project.asgi:application',
+            '--host', args.host, '--port', str(args.port), '--workers', str(args.workers),
+            '--log-level', 'warning',
+        ], async_path),
+    ]
+    for name, command, path in runs:
+        report(name, *run_server(command, args.host, args.port, path, cookie, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+from django.contrib import admin
+from django.db.models import F
+from django.utils import timezone
+from .models import CalendarEventSync, CalendarWatchChannel
+
+
+@admin.register(CalendarEventSync)
+class CalendarEventSyncAdmin(admin.ModelAdmin):
+    list_display = ('appointment', 'side', 'user', 'status', 'attempts', 'next_attempt_at', 'synced_at')
+    list_filter = ('status', 'side')
+    list_select_related = ('user', 'appointment__patient', 'appointment__doctor', 'appointment__slot')
+    search_fields = ('user__username', 'user__email', 'event_id')
+    readonly_fields = ('appointment', 'user', 'side', 'event_id', 'version', 'synced_at', 'created_at', 'updated_at')
+    actions = ['retry_now']
+    
+    @admin.action(description='Retry selected events now')
+    def retry_now(self, request, queryset):
+        count = queryset.update(
+            status='pending', version=F('version') + 1, attempts=0,
+            next_attempt_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'{count} calendar events queued for another attempt.')
+
+
+
+@admin.register(CalendarWatchChannel)
+class CalendarWatchChannelAdmin(admin.ModelAdmin):
+    list_display = ('user', 'channel_id', 'expiration', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'user__email', 'channel_id')
+    exclude = ('token',)
+    readonly_fields = ('user', 'channel_id', 'resource_id', 'expiration', 'created_at')
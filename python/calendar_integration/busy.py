@@ -0,0 +1,255 @@
+"""
+Import of busy time from doctors' own Google Calendars.
+
+Each run asks Google only for what changed since the previous one:
+events.list is called with the nextSyncToken kept in BusySyncState, and
+the answer holds just the events created, changed or deleted since. The
+first run, and any run after Google has expired the token (410 Gone),
+lists the upcoming events in full instead.
+
+Busy events (not free/transparent, not cancelled, not created by this app)
+are stored as BusyInterval rows. Slots are then re-checked only on the days
+the changed events touch, plus any slot edited since the last run, and
+flagged ``is_blocked`` while an interval overlaps them. Blocked slots drop
+out of ``AvailabilitySlot.objects.available()`` and cannot be booked. Slots
+created or moved between imports are checked against the stored intervals
+when they are saved (``appointments.signals.slot_saving``).
+
+With ``notified=True`` only doctors whose calendars sent a push notification
+(calendar_integration.watch) are imported.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from datetime import time as dtime
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from googleapiclient.errors import HttpError
+
+from appointments.events import slot_event
+from appointments.models import AvailabilitySlot
+from appointments.signals import publish_on_commit
+from users.models import User
+from .models import BusyInterval, BusySyncState
+from .services import APPOINTMENT_PROPERTY, GoogleCalendarService, calendar_service_for, execute
+
+PAGE_SIZE = 250
+# Partial responses: only what deciding busy time needs
+LIST_FIELDS = 'items(id,status,start,end,transparency,extendedProperties),nextPageToken,nextSyncToken'
+SLOT_FIELDS = ('id', 'doctor_id', 'date', 'start_time', 'end_time', 'is_booked', 'is_blocked')
+
+
+class SyncTokenExpired(Exception):
+    """Google no longer accepts the stored sync token; a full import is needed"""
+
+
+def _when(value):
+    """Aware datetime of an event start/end (all-day events start at local midnight)"""
+    if 'dateTime' in value:
+        return parse_datetime(value['dateTime'])
+    return timezone.make_aware(datetime.combine(parse_date(value['date']), dtime.min))
+
+
+def busy_interval(event):
+    """(start, end) for an event that makes the doctor busy, otherwise None"""
+    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+        return None
+    if APPOINTMENT_PROPERTY in event.get('extendedProperties', {}).get('private', {}):
+        # Our own appointment events; their slots are booked already
+        return None
+    if 'start' not in event or 'end' not in event:
+        return None
+    return _when(event['start']), _when(event['end'])
+
+
+def slot_bounds(slot):
+    start = timezone.make_aware(datetime.combine(slot.date, slot.start_time))
+    end = timezone.make_aware(datetime.combine(slot.date, slot.end_time))
+    return start, end
+
+
+def fetch_changes(service, sync_token):
+    """(events, next sync token): changes since ``sync_token``, or all upcoming events without one"""
+    params = {'calendarId': 'primary', 'singleEvents': True, 'maxResults': PAGE_SIZE, 'fields': LIST_FIELDS}
+    if sync_token:
+        params['syncToken'] = sync_token
+    else:
+        # Sync tokens rule out most filters, but a full import may start at today
+        params['timeMin'] = timezone.make_aware(datetime.combine(timezone.localdate(), dtime.min)).isoformat()
+    events = []
+    page_token = None
+    while True:
+        try:
+            response = execute(service.events().list(pageToken=page_token, **params))
+        except HttpError as e:
+            if e.resp.status == 410:
+                raise SyncTokenExpired()
+            raise
+        events.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events, response.get('nextSyncToken', '')
+
+
+def recompute_blocks(doctor_id, slots):
+    """Set ``is_blocked`` on ``slots`` from the stored intervals; returns (blocked, unblocked)"""
+    if not slots:
+        return 0, 0
+    low = timezone.make_aware(datetime.combine(min(slot.date for slot in slots), dtime.min))
+    high = timezone.make_aware(datetime.combine(max(slot.date for slot in slots) + timedelta(days=1), dtime.min))
+    intervals = list(
+        BusyInterval.objects.filter(user_id=doctor_id, start__lt=high, end__gt=low).values_list('start', 'end')
+    )
+
+    now = timezone.now()
+    changed = []
+    for slot in slots:
+        start, end = slot_bounds(slot)
+        blocked = any(busy_start < end and busy_end > start for busy_start, busy_end in intervals)
+        if blocked != slot.is_blocked:
+            slot.is_blocked = blocked
+            slot.updated_at = now
+            changed.append(slot)
+    # bulk_update skips the slot signals; updated_at keeps delta sync in step
+    AvailabilitySlot.objects.bulk_update(changed, ['is_blocked', 'updated_at'])
+    for slot in changed:
+        publish_on_commit(doctor_id, slot_event('slot.blocked' if slot.is_blocked else 'slot.unblocked', slot))
+    blocked = sum(slot.is_blocked for slot in changed)
+    return blocked, len(changed) - blocked
+
+
+def _days(ranges):
+    """Q matching slot dates covered by any of the (start, end) ranges"""
+    query = Q()
+    for start, end in ranges:
+        # An event ending at midnight does not touch the next day
+        last = timezone.localtime(end - timedelta(microseconds=1)).date()
+        query |= Q(date__range=(timezone.localtime(start).date(), last))
+    return query
+
+
+class BusyImportReport:
+    def __init__(self):
+        self.doctors = 0
+        self.full = 0
+        self.events = 0
+        self.blocked = 0
+        self.unblocked = 0
+        self.skipped = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+
+class BusyImporter:
+    def __init__(self, workers=4, full=False, doctor_ids=None, notified=False, settle=0):
+        self.workers = workers
+        self.full = full
+        self.doctor_ids = doctor_ids
+        self.notified = notified
+        self.settle = settle
+        self.service = GoogleCalendarService()
+        self.report = BusyImportReport()
+
+    def doctors(self):
+        doctors = User.objects.filter(role='doctor', is_active=True, google_calendar_token__isnull=False)
+        if self.doctor_ids:
+            doctors = doctors.filter(pk__in=self.doctor_ids)
+        if self.notified:
+            # Wait for a burst of notifications to settle
+            doctors = doctors.filter(busy_sync__notified_at__lte=timezone.now() - timedelta(seconds=self.settle))
+        return doctors.select_related('busy_sync').order_by('id')
+
+    def run(self):
+        started = time.monotonic()
+        self.forget_disconnected()
+        doctors = list(self.doctors())
+        # HTTP on the pool, database writes here
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for doctor, state, since, result in executor.map(self._fetch, doctors):
+                if isinstance(result, Exception):
+                    print(f"Busy time import failed for doctor {doctor.pk}: {result}")
+                    self.report.failed += 1
+                elif result is None:
+                    self.report.skipped += 1
+                else:
+                    self.apply(doctor, state, since, *result)
+        self.report.elapsed = time.monotonic() - started
+        return self.report
+
+    def _fetch(self, doctor):
+        since = timezone.now()
+        state = getattr(doctor, 'busy_sync', None)
+        token = '' if self.full or state is None else state.sync_token
+        creds = self.service.usable_credentials(doctor)
+        if creds is None:
+            # Expired; refresh_calendar_tokens will renew it
+            return doctor, state, since, None
+        try:
+            service = calendar_service_for(creds, doctor.pk)
+            try:
+                events, next_token = fetch_changes(service, token)
+            except SyncTokenExpired:
+                token = ''
+                events, next_token = fetch_changes(service, token)
+        except Exception as e:
+            return doctor, state, since, e
+        return doctor, state, since, (events, next_token, not token)
+
+    @transaction.atomic
+    def apply(self, doctor, state, since, events, next_token, full):
+        """Store the changed intervals and re-check the slots they may affect"""
+        self.report.doctors += 1
+        self.report.full += full
+        self.report.events += len(events)
+        now = timezone.now()
+
+        intervals = BusyInterval.objects.filter(user=doctor)
+        if not full:
+            intervals = intervals.filter(event_id__in=[event['id'] for event in events])
+        touched = list(intervals.values_list('start', 'end'))
+        intervals.delete()
+
+        rows = []
+        for event in events:
+            interval = busy_interval(event)
+            if interval is None or interval[1] <= now:
+                continue
+            rows.append(BusyInterval(user=doctor, event_id=event['id'], start=interval[0], end=interval[1]))
+            touched.append(interval)
+        BusyInterval.objects.bulk_create(rows, batch_size=500)
+
+        slots = AvailabilitySlot.objects.filter(doctor=doctor, date__gte=timezone.localdate())
+        if not full:
+            # Days the changes touch, plus slots added or moved since the last run
+            recheck = _days(touched)
+            if state is not None and state.last_synced_at:
+                recheck |= Q(updated_at__gt=state.last_synced_at)
+            slots = slots.filter(recheck) if recheck else slots.none()
+        blocked, unblocked = recompute_blocks(doctor.pk, list(slots.only(*SLOT_FIELDS)))
+        self.report.blocked += blocked
+        self.report.unblocked += unblocked
+
+        fields = {'sync_token': next_token, 'last_synced_at': since}
+        if full:
+            fields['last_full_sync_at'] = now
+        BusySyncState.objects.update_or_create(user=doctor, defaults=fields)
+        # Notifications newer than the fetch stay pending, due one settle period after the latest
+        BusySyncState.objects.filter(user=doctor, notified_at__isnull=False).update(notified_at=Case(
+            When(last_notified_at__lte=since, then=Value(None)), default=F('last_notified_at')
+        ))
+
+    def forget_disconnected(self):
+        """Drop the busy time of doctors who disconnected their calendar"""
+        states = BusySyncState.objects.filter(user__google_calendar_token__isnull=True)
+        if self.doctor_ids:
+            states = states.filter(user_id__in=self.doctor_ids)
+        for state in states:
+            with transaction.atomic():
+                BusyInterval.objects.filter(user_id=state.user_id).delete()
+                slots = AvailabilitySlot.objects.filter(doctor_id=state.user_id, is_blocked=True).only(*SLOT_FIELDS)
+                _, unblocked = recompute_blocks(state.user_id, list(slots))
+                self.report.unblocked += unblocked
+                state.delete()
@@ -0,0 +1,180 @@
+"""
+ICS subscription feeds of a user's appointments.
+
+Users who never connect Google Calendar can still see their appointments
+in any calendar client by subscribing to ``/api/calendar/feed/<token>.ics``.
+No call to Google is made per booking; the client polls the feed.
+
+Each user has one CalendarFeed with a secret token and a ``version`` that the
+appointment signal handlers bump whenever one of the user's appointments is
+created, changed or deleted. The ETag is made of that version and the first
+day the feed covers, so a poll answers 304 without reading appointments
+until something changed. A changed feed is streamed from the database and
+kept in the cache under the same key, so later polls that cannot send
+If-None-Match are served from the cache.
+"""
+import secrets
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from appointments.exports import BUFFER_SIZE, DEFAULT_CHUNK_SIZE
+from appointments.models import Appointment
+from .models import CalendarFeed
+
+FEED_COLUMNS = (
+    'id', 'status', 'notes', 'updated_at', 'slot__date', 'slot__start_time', 'slot__end_time',
+    'doctor__username', 'doctor__first_name', 'doctor__last_name',
+    'patient__username', 'patient__first_name', 'patient__last_name',
+)
+
+STATUSES = {'confirmed': 'CONFIRMED', 'completed': 'CONFIRMED'}
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def feed_for(user):
+    """The user's feed, created on first use"""
+    feed, _ = CalendarFeed.objects.get_or_create(user=user, defaults={'token': new_token()})
+    return feed
+
+
+def rotate_token(feed):
+    """Replace a leaked feed URL; the old token stops working at once"""
+    feed.token = new_token()
+    feed.version += 1
+    feed.save(update_fields=['token', 'version', 'updated_at'])
+    return feed
+
+
+def bump_feed_versions(*user_ids):
+    """Mark these users' feeds changed (one UPDATE; users without a feed are skipped)"""
+    CalendarFeed.objects.filter(user_id__in=user_ids).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def window_start():
+    """First day a feed covers; older appointments drop out a day at a time"""
+    return timezone.localdate() - timedelta(days=getattr(settings, 'CALENDAR_FEED_PAST_DAYS', 30))
+
+
+def feed_etag(feed, start):
+    return f'"{feed.pk}-{feed.version}-{start:%Y%m%d}"'
+
+
+def cache_key(feed, start):
+    return f'calendar-feed:{feed.pk}:{feed.version}:{start:%Y%m%d}'
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _fold(line):
+    """Split a content line into 75-octet pieces (RFC 5545 3.1)"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + '\r\n'
+    pieces = []
+    limit = 75
+    while data:
+        cut = min(limit, len(data))
+        # Never split a UTF-8 sequence
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+        # Continuation lines start with a space
+        limit = 74
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _name(username, first_name, last_name):
+    return f"{first_name} {last_name}".strip() or username
+
+
+def _event(row, is_doctor, stamp):
+    (appointment_id, status, notes, updated_at, date, start_time, end_time,
+     doctor_username, doctor_first, doctor_last, patient_username, patient_first, patient_last) = row
+    start = timezone.make_aware(datetime.combine(date, start_time))
+    end = timezone.make_aware(datetime.combine(date, end_time))
+    if is_doctor:
+        patient = _name(patient_username, patient_first, patient_last)
+        title = f"Appointment with {patient}"
+        description = f"Patient: {patient}\n"
+    else:
+        doctor = _name(doctor_username, doctor_first, doctor_last)
+        title = f"Appointment with Dr. {doctor}"
+        description = f"Doctor: Dr. {doctor}\n"
+    if notes:
+        description += f"Notes: {notes}\n"
+    description += f"Appointment ID: {appointment_id}"
+    lines = (
+        'BEGIN:VEVENT',
+        f"UID:appointment-{appointment_id}-{'doctor' if is_doctor else 'patient'}@hms",
+        f'DTSTAMP:{stamp}',
+        f'LAST-MODIFIED:{_utc(updated_at)}',
+        f'DTSTART:{_utc(start)}',
+        f'DTEND:{_utc(end)}',
+        f'SUMMARY:{_escape(title)}',
+        f'DESCRIPTION:{_escape(description)}',
+        f'STATUS:{STATUSES.get(status, "CONFIRMED")}',
+        'END:VEVENT',
+    )
+    return ''.join(_fold(line) for line in lines)
+
+
+def feed_lines(user, start):
+    """VCALENDAR text of the user's appointments from ``start`` on, piece by piece"""
+    is_doctor = user.is_doctor
+    appointments = Appointment.objects.filter(slot_date__gte=start).exclude(status='cancelled')
+    if is_doctor:
+        appointments = appointments.filter(doctor=user)
+    else:
+        appointments = appointments.filter(patient=user)
+    rows = appointments.order_by('slot_date', 'id').values_list(*FEED_COLUMNS).iterator(chunk_size=DEFAULT_CHUNK_SIZE)
+
+    stamp = _utc(timezone.now())
+    yield ''.join(_fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//HMS//Appointments//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:HMS appointments',
+        # Polling hints; Google Calendar ignores them and polls on its own schedule
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H',
+        'X-PUBLISHED-TTL:PT1H',
+    ))
+    for row in rows:
+        yield _event(row, is_doctor, stamp)
+    yield 'END:VCALENDAR\r\n'
+
+
+def stream_feed(user, start, key):
+    """Encoded feed in BUFFER_SIZE blocks; the whole body is cached under ``key`` once sent"""
+    body = []
+    buffer = []
+    size = 0
+    for piece in feed_lines(user, start):
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            block = b''.join(buffer)
+            body.append(block)
+            yield block
+            buffer = []
+            size = 0
+    block = b''.join(buffer)
+    body.append(block)
+    yield block
+    cache.set(key, b''.join(body), getattr(settings, 'CALENDAR_FEED_CACHE_TIMEOUT', 24 * 3600))
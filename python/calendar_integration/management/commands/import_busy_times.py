@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calendar_integration.busy import BusyImporter
+
+
+class Command(BaseCommand):
+    help = "Block availability slots that clash with events in doctors' own Google Calendars"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', help='Only this doctor id (repeatable)')
+        parser.add_argument('--workers', type=int, default=4, help='Calendars fetched concurrently')
+        parser.add_argument('--full', action='store_true', help='Ignore stored sync tokens and re-read upcoming events')
+        parser.add_argument('--notified', action='store_true', help='Only calendars that sent a change notification')
+        parser.add_argument('--settle', type=int, default=10, help='Seconds to let a burst of notifications settle')
+        parser.add_argument('--loop', action='store_true', help='Keep running, once every --interval seconds')
+        parser.add_argument('--interval', type=int, default=300)
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            report = BusyImporter(
+                workers=options['workers'], full=full, doctor_ids=options['doctor'],
+                notified=options['notified'], settle=options['settle'],
+            ).run()
+            self.stdout.write(
+                f'Imported {report.events} changed events for {report.doctors} doctors '
+                f'({report.full} full): {report.blocked} slots blocked, {report.unblocked} unblocked, '
+                f'{report.skipped} skipped, {report.failed} failed in {report.elapsed:.2f}s'
+            )
+            if not options['loop']:
+                break
+            # Only the first pass of a --full loop re-reads everything
+            full = False
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
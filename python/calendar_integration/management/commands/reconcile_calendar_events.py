@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calendar_integration.reconciler import Reconciler
+from calendar_integration.resync import MAX_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Create, update or delete Google Calendar events for changed appointments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE,
+                            help=f'Calls per batch request (at most {MAX_BATCH_SIZE})')
+        parser.add_argument('--rate', type=float, default=10, help='Maximum API calls per second (0 for no pacing)')
+        parser.add_argument('--loop', action='store_true', help='Keep running, once every --interval seconds')
+        parser.add_argument('--interval', type=int, default=30)
+
+    def handle(self, *args, **options):
+        while True:
+            report = Reconciler(batch_size=options['batch_size'], rate=options['rate']).run()
+            if report.claimed or not options['loop']:
+                self.stdout.write(
+                    f'Reconciled {report.claimed} calendar events: {report.created} created, '
+                    f'{report.patched} updated, {report.deleted} deleted, {report.unchanged} unchanged, '
+                    f'{report.retrying} to retry, {report.failed} failed in {report.elapsed:.2f}s'
+                )
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
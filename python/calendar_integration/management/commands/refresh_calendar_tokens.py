@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+
+from calendar_integration.services import GoogleCalendarService
+from users.models import User
+
+_local = threading.local()
+
+
+def _request():
+    # One keep-alive session to the token endpoint per worker thread
+    if not hasattr(_local, 'request'):
+        _local.request = Request(session=requests.Session())
+    return _local.request
+
+
+class Command(BaseCommand):
+    help = 'Refresh Google Calendar access tokens that are about to expire, so bookings never wait on OAuth'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--margin', type=int, default=15, help='Refresh tokens expiring within this many minutes')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent refresh requests')
+        parser.add_argument('--loop', action='store_true', help='Keep running, once every --interval seconds')
+        parser.add_argument('--interval', type=int, default=300)
+
+    def handle(self, *args, **options):
+        service = GoogleCalendarService()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                self.refresh_due(service, executor, options)
+                if not options['loop']:
+                    break
+                try:
+                    time.sleep(options['interval'])
+                except KeyboardInterrupt:
+                    break
+
+    def refresh_due(self, service, executor, options):
+        started = time.monotonic()
+        cutoff = timezone.now() + timedelta(minutes=options['margin'])
+        due = User.objects.filter(
+            Q(google_calendar_token_expiry__lt=cutoff) |
+            # Tokens stored before expiry was tracked
+            Q(google_calendar_token_expiry__isnull=True, google_calendar_token__isnull=False),
+            google_calendar_refresh_token__isnull=False,
+        ).exclude(google_calendar_refresh_token='').only(
+            'id', 'google_calendar_token', 'google_calendar_refresh_token', 'google_calendar_token_expiry'
+        ).order_by('id')
+
+        refreshed = revoked = failed = 0
+        last_id = 0
+        while True:
+            users = list(due.filter(id__gt=last_id)[:options['batch_size']])
+            if not users:
+                break
+            last_id = users[-1].id
+
+            # HTTP on the pool, database writes here
+            for user, creds, error in executor.map(lambda user: self._refresh(service, user), users):
+                if creds is not None:
+                    service.save_credentials(user, creds)
+                    refreshed += 1
+                elif isinstance(error, RefreshError) and 'invalid_grant' in str(error):
+                    # The user revoked access; stop trying until they reconnect
+                    service.clear_credentials(user)
+                    revoked += 1
+                else:
+                    print(f"Calendar token refresh failed for user {user.pk}: {error}")
+                    failed += 1
+
+        self.stdout.write(
+            f'Refreshed {refreshed} calendar tokens, {revoked} revoked, {failed} failed '
+            f'in {time.monotonic() - started:.2f}s'
+        )
+
+    @staticmethod
+    def _refresh(service, user):
+        creds = service.get_user_credentials(user)
+        if creds is None or not creds.refresh_token:
+            return user, None, 'no refresh token'
+        try:
+            creds.refresh(_request())
+        except Exception as e:
+            return user, None, e
+        return user, creds, None
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from calendar_integration.resync import MAX_BATCH_SIZE, CalendarResync
+
+
+class Command(BaseCommand):
+    help = 'Create the Google Calendar events missing from upcoming appointments, in batched requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE,
+                            help=f'Calls per batch request (at most {MAX_BATCH_SIZE})')
+        parser.add_argument('--rate', type=float, default=10, help='Maximum API calls per second (0 for no pacing)')
+        parser.add_argument('--max-retries', type=int, default=5, help='Backoff rounds for rate-limited calls')
+        parser.add_argument('--min-age', type=int, default=300,
+                            help='Skip appointments booked less than this many seconds ago')
+        parser.add_argument('--dry-run', action='store_true', help='Only count missing events')
+
+    def handle(self, *args, **options):
+        report = CalendarResync(
+            batch_size=options['batch_size'],
+            rate=options['rate'],
+            max_retries=options['max_retries'],
+            min_age=timedelta(seconds=options['min_age']),
+            dry_run=options['dry_run'],
+        ).run()
+
+        if options['dry_run']:
+            self.stdout.write(f'{report.pending} calendar events missing, {report.skipped} with expired tokens')
+            return
+        self.stdout.write(
+            f'Created {report.created} of {report.pending} calendar events in {report.batches} batches '
+            f'({report.throttled} rate-limited retries, {report.failed} failed, '
+            f'{report.skipped} skipped for expired tokens) in {report.elapsed:.2f}s'
+        )
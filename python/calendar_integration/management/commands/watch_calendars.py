@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from calendar_integration.watch import ChannelRenewer
+
+
+class Command(BaseCommand):
+    help = "Register or renew Google push-notification channels for doctors' calendars"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', help='Only this doctor id (repeatable)')
+        parser.add_argument('--margin', type=int, default=12, help='Renew channels expiring within this many hours')
+        parser.add_argument('--ttl', type=int, help='Requested channel lifetime in seconds (default CALENDAR_WATCH_TTL)')
+        parser.add_argument('--loop', action='store_true', help='Keep running, once every --interval seconds')
+        parser.add_argument('--interval', type=int, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            report = ChannelRenewer(
+                margin=timedelta(hours=options['margin']), ttl=options['ttl'], doctor_ids=options['doctor']
+            ).run()
+            self.stdout.write(
+                f'Created {report.created} watch channels, stopped {report.stopped}, '
+                f'forgot {report.forgotten}, {report.skipped} skipped, {report.failed} failed '
+                f'in {report.elapsed:.2f}s'
+            )
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('calendar_integration', '0002_busysyncstate_busyinterval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='busysyncstate',
+            name='last_notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='busysyncstate',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CalendarWatchChannel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel_id', models.CharField(max_length=64, unique=True)),
+                ('resource_id', models.CharField(blank=True, max_length=255)),
+                ('token', models.CharField(max_length=64)),
+                ('expiration', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_channels', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'expiration'], name='calendar_in_user_id_f03f22_idx')],
+            },
+        ),
+    ]
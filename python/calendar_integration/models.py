@@ -0,0 +1,120 @@
+from datetime import datetime
+
+from django.db import models
+from django.utils import timezone
+from users.models import User
+from appointments.models import Appointment
+
+
+class CalendarEventSync(models.Model):
+    """Sync state of one side (doctor or patient) of an appointment's Google event.
+
+    Rows are marked pending by the appointment signal handlers whenever the
+    event has to change, and worked off by ``calendar_integration.reconciler``.
+    ``version`` is bumped on every change so a reconcile that raced with a
+    newer change leaves the row pending.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('synced', 'Synced'),
+        ('failed', 'Failed'),
+    ]
+    SIDE_CHOICES = [
+        ('doctor', 'Doctor'),
+        ('patient', 'Patient'),
+    ]
+
+    # Nulled when the appointment is deleted; the row then stands for deleting the event
+    appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='calendar_syncs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_syncs')
+    side = models.CharField(max_length=10, choices=SIDE_CHOICES)
+    event_id = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    version = models.PositiveIntegerField(default=1)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['appointment', 'side']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.side} event of appointment {self.appointment_id}: {self.status}"
+
+
+class BusySyncState(models.Model):
+    """Incremental import position of a doctor's Google Calendar (calendar_integration.busy)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='busy_sync')
+    # nextSyncToken of the last completed import; empty until the first full import
+    sync_token = models.TextField(blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    # First and latest push notification not yet followed by an import
+    notified_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_notified_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Busy time import for {self.user.username}"
+
+
+class BusyInterval(models.Model):
+    """A busy event from a doctor's own calendar, blocking the slots it overlaps"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='busy_intervals')
+    event_id = models.CharField(max_length=255)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'event_id']
+        indexes = [
+            models.Index(fields=['user', 'start']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} busy {self.start} to {self.end}"
+
+    @classmethod
+    def overlaps(cls, slot):
+        """Whether a stored interval of the slot's doctor overlaps the slot"""
+        start = timezone.make_aware(datetime.combine(slot.date, slot.start_time))
+        end = timezone.make_aware(datetime.combine(slot.date, slot.end_time))
+        return cls.objects.filter(user_id=slot.doctor_id, start__lt=end, end__gt=start).exists()
+
+
+class CalendarWatchChannel(models.Model):
+    """A Google push-notification channel watching a doctor's primary calendar (calendar_integration.watch)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watch_channels')
+    channel_id = models.CharField(max_length=64, unique=True)
+    # Set by Google when the channel is created
+    resource_id = models.CharField(max_length=255, blank=True)
+    # Sent back in X-Goog-Channel-Token with every notification
+    token = models.CharField(max_length=64)
+    expiration = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expiration']),
+        ]
+
+    def __str__(self):
+        return f"Watch channel {self.channel_id} for {self.user.username}"
+
+
+class CalendarFeed(models.Model):
+    """Secret-token ICS subscription of a user's appointments (calendar_integration.feeds)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True)
+    # Bumped whenever one of the user's appointments changes; part of the ETag
+    version = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Calendar feed for {self.user.username}"
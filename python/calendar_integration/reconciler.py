@@ -0,0 +1,290 @@
+"""
+Background reconciliation of Google Calendar events with appointments.
+
+Changing an appointment never calls Google inline. The appointment signal
+handlers call ``schedule_sync``, which marks the appointment's
+``CalendarEventSync`` rows pending in the same transaction as the change.
+``Reconciler`` then claims due rows and works out the one call each needs
+from the current state of its appointment:
+
+* appointment deleted or cancelled: delete the event, if there is one
+* no event yet: create it
+* otherwise: patch it to the current time, title and notes
+
+The calls go to Google in batch requests. Failed calls that may succeed
+later (rate limits, 5xx, 401s awaiting a token refresh, network errors)
+are retried with exponential backoff, up to CALENDAR_SYNC_MAX_ATTEMPTS.
+Anything else marks the row failed. Claims are leases: a row whose worker
+died becomes due again once its lease runs out.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from appointments.models import Appointment
+from users.models import User
+from .models import CalendarEventSync
+from .resync import MAX_BATCH_SIZE, Pacer
+from .services import GoogleCalendarService, execute_batch, is_rate_limited
+
+SIDES = ('doctor', 'patient')
+LEASE = timedelta(minutes=5)
+
+
+def max_attempts():
+    return getattr(settings, 'CALENDAR_SYNC_MAX_ATTEMPTS', 8)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for the n-th failed attempt"""
+    base = getattr(settings, 'CALENDAR_SYNC_RETRY_BASE', 30)
+    cap = getattr(settings, 'CALENDAR_SYNC_RETRY_MAX', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap) * random.uniform(0.5, 1.5))
+
+
+def schedule_sync(appointment, deleted=False):
+    """Mark both sides of an appointment's calendar events for reconciliation
+
+    Sides without an event only get a row when the event may need creating:
+    the appointment is live and that user has connected Google Calendar.
+    For a deleted appointment, pass ``deleted=True`` from pre_delete; its
+    rows are detached from the appointment by the delete itself.
+    """
+    now = timezone.now()
+    missing = []
+    for side in SIDES:
+        marked = CalendarEventSync.objects.filter(appointment_id=appointment.pk, side=side).update(
+            status='pending', version=F('version') + 1, attempts=0,
+            next_attempt_at=now, last_error='', updated_at=now,
+        )
+        if not marked:
+            missing.append(side)
+    if not missing:
+        return
+
+    user_ids = {side: getattr(appointment, f'{side}_id') for side in missing}
+    wanted = [side for side in missing if getattr(appointment, f'{side}_calendar_event_id')]
+    if not deleted and appointment.status != 'cancelled' and len(wanted) < len(missing):
+        connected = set(User.objects.filter(
+            pk__in=user_ids.values(), google_calendar_token__isnull=False
+        ).values_list('pk', flat=True))
+        wanted += [side for side in missing if side not in wanted and user_ids[side] in connected]
+
+    rows = [
+        CalendarEventSync(
+            appointment_id=None if deleted else appointment.pk,
+            user_id=user_ids[side],
+            side=side,
+            event_id=getattr(appointment, f'{side}_calendar_event_id'),
+            next_attempt_at=now,
+        )
+        for side in wanted
+    ]
+    if deleted:
+        if rows:
+            # After commit: the delete may be cascading from one of the users
+            transaction.on_commit(lambda: _create_detached(rows))
+        return
+    for row in rows:
+        try:
+            with transaction.atomic():
+                row.save()
+        except IntegrityError:
+            # A concurrent change created the row first
+            CalendarEventSync.objects.filter(appointment_id=appointment.pk, side=row.side).update(
+                status='pending', version=F('version') + 1, next_attempt_at=now
+            )
+
+
+def _create_detached(rows):
+    existing = set(User.objects.filter(pk__in=[row.user_id for row in rows]).values_list('pk', flat=True))
+    CalendarEventSync.objects.bulk_create([row for row in rows if row.user_id in existing])
+
+
+class ReconcileReport:
+    def __init__(self):
+        self.claimed = 0
+        self.created = 0
+        self.patched = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.retrying = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+
+class Reconciler:
+    def __init__(self, batch_size=MAX_BATCH_SIZE, rate=10):
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        if rate:
+            self.batch_size = min(self.batch_size, max(1, int(rate)))
+        self.pacer = Pacer(rate)
+        self.service = GoogleCalendarService()
+        self.report = ReconcileReport()
+
+    def run(self, now=None):
+        """Reconcile every row due at ``now``; returns the report"""
+        started = time.monotonic()
+        now = now or timezone.now()
+        while True:
+            rows = self.claim(now)
+            if not rows:
+                break
+            self.report.claimed += len(rows)
+            self.process(rows)
+        self.report.elapsed = time.monotonic() - started
+        return self.report
+
+    def claim(self, now):
+        due = CalendarEventSync.objects.filter(status='pending', next_attempt_at__lte=now)
+        ids = list(due.order_by('next_attempt_at').values_list('pk', flat=True)[:self.batch_size])
+        if not ids:
+            return []
+        # Microsecond lease expiry doubles as this run's claim token
+        lease = timezone.now() + LEASE
+        due.filter(pk__in=ids).update(next_attempt_at=lease)
+        return list(
+            CalendarEventSync.objects.filter(pk__in=ids, next_attempt_at=lease)
+            .select_related('user', 'appointment__slot', 'appointment__doctor', 'appointment__patient')
+        )
+
+    def process(self, rows):
+        calls = []
+        operations = {}
+        for row in rows:
+            operation, request = self._plan(row)
+            if request is None:
+                continue
+            operations[row.pk] = operation
+            calls.append((row.pk, request))
+
+        if not calls:
+            return
+        self.pacer.wait()
+        results = execute_batch(calls)
+        self.pacer.sent(len(calls))
+
+        for row in rows:
+            if row.pk not in operations:
+                continue
+            response, error = results.get(row.pk, (None, None))
+            self._record(row, operations[row.pk], response, error)
+
+    def _plan(self, row):
+        """(operation, request) for a row; rows needing no call are settled here"""
+        appointment = row.appointment
+        if appointment is None or appointment.status == 'cancelled':
+            operation = 'delete'
+        elif row.event_id:
+            operation = 'patch'
+        elif getattr(appointment, f'{row.side}_calendar_event_id'):
+            # Created since the row was marked (booking or resync); adopt it
+            row.event_id = getattr(appointment, f'{row.side}_calendar_event_id')
+            operation = 'patch'
+        else:
+            operation = 'create'
+
+        if operation == 'delete' and not row.event_id:
+            self._done(row, None)
+            self.report.unchanged += 1
+            return operation, None
+
+        if not row.user.google_calendar_token:
+            # Disconnected; reconnecting does not bring back access to old events
+            self._fail(row, 'Google Calendar is not connected')
+            return operation, None
+        creds = self.service.usable_credentials(row.user)
+        if creds is None:
+            # Expired; wait for refresh_calendar_tokens
+            self._retry(row, 'Access token has expired')
+            return operation, None
+
+        is_doctor = row.side == 'doctor'
+        if operation == 'delete':
+            request = self.service.delete_event_request(row.user, row.event_id, creds=creds)
+        elif operation == 'patch':
+            request = self.service.patch_event_request(row.user, appointment, row.event_id, is_doctor, creds=creds)
+        else:
+            request = self.service.insert_event_request(row.user, appointment, is_doctor, creds=creds)
+        return operation, request
+
+    def _record(self, row, operation, response, error):
+        if error is None:
+            if operation == 'create':
+                self._done(row, response['id'])
+                self.report.created += 1
+            elif operation == 'patch':
+                self._done(row, row.event_id)
+                self.report.patched += 1
+            else:
+                self._done(row, None)
+                self.report.deleted += 1
+            return
+
+        status = error.resp.status if isinstance(error, HttpError) else None
+        if status in (404, 410):
+            if operation == 'delete':
+                # Already gone from the calendar
+                self._done(row, None)
+                self.report.deleted += 1
+            else:
+                # The user deleted the event in Google; create a new one
+                self._done(row, None, resync=True)
+                self.report.retrying += 1
+        elif status is None or status == 401 or status >= 500 or is_rate_limited(error):
+            self._retry(row, str(error))
+        else:
+            self._fail(row, str(error))
+
+    def _done(self, row, event_id, resync=False):
+        now = timezone.now()
+        if row.appointment_id is None and CalendarEventSync.objects.filter(pk=row.pk, version=row.version).delete()[0]:
+            # The appointment is gone and so is its event; nothing left to track
+            return
+        CalendarEventSync.objects.filter(pk=row.pk).update(
+            event_id=event_id,
+            # A change that arrived while the call was in flight keeps the row pending
+            status=Value('pending') if resync else Case(
+                When(version=row.version, then=Value('synced')), default=Value('pending')
+            ),
+            attempts=0, last_error='', synced_at=now, next_attempt_at=now, updated_at=now,
+        )
+        if row.appointment_id is not None:
+            field = f'{row.side}_calendar_event_id'
+            if getattr(row.appointment, field) != event_id:
+                Appointment.objects.filter(pk=row.appointment_id).update(**{field: event_id, 'updated_at': now})
+
+    def _retry(self, row, error):
+        attempts = row.attempts + 1
+        if attempts >= max_attempts():
+            self._fail(row, error)
+            return
+        now = timezone.now()
+        # A change that arrived while the call was in flight is due now, with its own attempts
+        CalendarEventSync.objects.filter(pk=row.pk).update(
+            attempts=Case(
+                When(version=row.version, then=Value(attempts)), default=F('attempts'), output_field=PositiveIntegerField()
+            ),
+            last_error=error[:2000],
+            next_attempt_at=Case(When(version=row.version, then=Value(now + retry_delay(attempts))), default=Value(now)),
+            updated_at=now,
+        )
+        self.report.retrying += 1
+
+    def _fail(self, row, error):
+        print(f"Calendar sync failed for {row}: {error}")
+        now = timezone.now()
+        CalendarEventSync.objects.filter(pk=row.pk).update(
+            status=Case(When(version=row.version, then=Value('failed')), default=Value('pending')),
+            attempts=Case(
+                When(version=row.version, then=Value(row.attempts + 1)), default=F('attempts'), output_field=PositiveIntegerField()
+            ),
+            last_error=error[:2000], next_attempt_at=now, updated_at=now,
+        )
+        self.report.failed += 1
@@ -0,0 +1,177 @@
+"""
+Bulk push of appointments that never reached Google Calendar.
+
+Bookings made while Google was unreachable, or while a user's token had
+expired, are left without event ids. ``CalendarResync`` finds upcoming
+confirmed appointments missing an event in a connected calendar, sends
+the inserts in batch requests of up to 50 calls (Google's limit for the
+Calendar API) and spaces the batches out so the calls stay under a
+per-second rate. Calls Google refuses with a rate-limit error are retried
+with exponential backoff; other failures are reported and left for the
+next run.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from appointments.models import Appointment
+from .services import GoogleCalendarService, execute_batch, is_rate_limited
+
+MAX_BATCH_SIZE = 50
+SIDES = ('doctor', 'patient')
+
+
+def unsynced_appointments(min_age=timedelta(minutes=5), now=None):
+    """Upcoming confirmed appointments missing an event in a connected calendar
+
+    Appointments younger than ``min_age`` are left alone: their booking
+    request may still be creating the events inline. So are appointments
+    the reconciler is already working on.
+    """
+    now = now or timezone.now()
+    return Appointment.objects.exclude(calendar_syncs__status='pending').filter(
+        Q(doctor_calendar_event_id__isnull=True, doctor__google_calendar_token__isnull=False) |
+        Q(patient_calendar_event_id__isnull=True, patient__google_calendar_token__isnull=False),
+        status='confirmed',
+        slot_date__gte=timezone.localdate(now),
+        created_at__lt=now - min_age,
+    ).select_related('doctor', 'patient', 'slot')
+
+
+class Pacer:
+    """Spaces out API calls to at most ``rate`` per second
+
+    The interval is counted from when a batch completes: Google stamps the
+    calls of a batch as it works through them, not when the request left.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        delay = self.next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def sent(self, calls):
+        if self.rate:
+            self.next_at = time.monotonic() + calls / self.rate
+
+
+class ResyncReport:
+    def __init__(self):
+        self.pending = 0
+        self.created = 0
+        self.skipped = 0
+        self.failed = 0
+        self.throttled = 0
+        self.batches = 0
+        self.elapsed = 0.0
+
+
+class CalendarResync:
+    def __init__(self, batch_size=MAX_BATCH_SIZE, rate=10, max_retries=5,
+                 min_age=timedelta(minutes=5), dry_run=False):
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        if rate:
+            # A batch's calls reach Google together; keep each within one second's quota
+            self.batch_size = min(self.batch_size, max(1, int(rate)))
+        self.pacer = Pacer(rate)
+        self.max_retries = max_retries
+        self.min_age = min_age
+        self.dry_run = dry_run
+        self.service = GoogleCalendarService()
+        self.report = ResyncReport()
+        self._credentials = {}
+
+    def run(self):
+        started = time.monotonic()
+        queryset = unsynced_appointments(self.min_age).order_by('id')
+        last_id = 0
+        while True:
+            appointments = list(queryset.filter(id__gt=last_id)[:self.batch_size])
+            if not appointments:
+                break
+            last_id = appointments[-1].id
+            calls = self._calls(appointments)
+            self.report.pending += len(calls)
+            if not self.dry_run:
+                self._push(calls)
+        self.report.elapsed = time.monotonic() - started
+        return self.report
+
+    def _creds(self, user):
+        # Once per user and run; None when the token has expired
+        if user.pk not in self._credentials:
+            self._credentials[user.pk] = self.service.usable_credentials(user)
+        return self._credentials[user.pk]
+
+    def _calls(self, appointments):
+        """(key, appointment, side, request) for every missing event"""
+        calls = []
+        for appointment in appointments:
+            for side in SIDES:
+                user = getattr(appointment, side)
+                if getattr(appointment, f'{side}_calendar_event_id') or not user.google_calendar_token:
+                    continue
+                creds = self._creds(user)
+                if creds is None:
+                    self.report.skipped += 1
+                    continue
+                request = self.service.insert_event_request(
+                    user, appointment, is_doctor=side == 'doctor', creds=creds
+                )
+                calls.append((f'{appointment.pk}:{side}', appointment, side, request))
+        return calls
+
+    def _push(self, calls):
+        attempt = 0
+        while calls:
+            chunk, calls = calls[:self.batch_size], calls[self.batch_size:]
+            self.pacer.wait()
+            results = execute_batch([(key, request) for key, _, _, request in chunk])
+            self.pacer.sent(len(chunk))
+            self.report.batches += 1
+
+            throttled = []
+            retry_after = 0
+            for call in chunk:
+                key, appointment, side, _ = call
+                event, error = results.get(key, (None, None))
+                if event:
+                    self._save(appointment, side, event['id'])
+                elif is_rate_limited(error):
+                    throttled.append(call)
+                    value = error.resp.get('retry-after', '')
+                    if value.isdigit():
+                        retry_after = max(retry_after, int(value))
+                else:
+                    print(f"Calendar resync failed for appointment {appointment.pk} ({side}): {error}")
+                    self.report.failed += 1
+
+            if not throttled:
+                attempt = 0
+                continue
+            attempt += 1
+            self.report.throttled += len(throttled)
+            if attempt > self.max_retries:
+                print(f"Calendar resync gave up on {len(throttled)} rate-limited calls")
+                self.report.failed += len(throttled)
+                attempt = 0
+                continue
+            # Exponential backoff with jitter, or what Google asked for
+            time.sleep(max(retry_after, min(2 ** attempt, 64)) + random.random())
+            calls = throttled + calls
+
+    def _save(self, appointment, side, event_id):
+        field = f'{side}_calendar_event_id'
+        # Conditional, so a concurrent booking or run keeps the id it stored
+        Appointment.objects.filter(pk=appointment.pk, **{f'{field}__isnull': True}).update(
+            **{field: event_id, 'updated_at': timezone.now()}
+        )
+        setattr(appointment, field, event_id)
+        self.report.created += 1
@@ -1,14 +1,214 @@
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from hms_project.outbound import circuit
+from users.middleware import invalidate_cached_user
 from users.models import User
 from appointments.models import Appointment
+import httplib2
 import json
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 
+_discovery_lock = threading.Lock()
+_discovery_document = None
+_local = threading.local()
+
+
+def calendar_discovery_document():
+    """Calendar v3 discovery document bundled with googleapiclient, parsed once per process"""
+    global _discovery_document
+    if _discovery_document is None:
+        with _discovery_lock:
+            if _discovery_document is None:
+                _discovery_document = json.loads(discovery_cache.get_static_doc('calendar', 'v3'))
+    return _discovery_document
+
+
+def _failed(error):
+    # Google answering 4xx (missing event, quota) is not Google being down
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500 or error.resp.status == 429
+    return True
+
+
+def calendar_circuit():
+    """Circuit breaker shared by every Calendar API call in this process"""
+    return circuit(
+        'google_calendar', timeout=getattr(settings, 'GOOGLE_CALENDAR_TIMEOUT', 10), failed_error=_failed
+    )
+
+
+def execute(request):
+    """Execute an API request through the circuit breaker"""
+    return calendar_circuit().call(request.execute)
+
+
+def _transport():
+    """One keep-alive HTTP transport per thread (httplib2 is not thread-safe)"""
+    if not hasattr(_local, 'http'):
+        _local.http = httplib2.Http(timeout=calendar_circuit().timeout)
+        _local.services = OrderedDict()
+    return _local.http
+
+
+def calendar_service_for(creds, cache_key):
+    """Calendar API client for ``creds``, reused by this thread for ``cache_key``
+
+    Clients are built from the cached discovery document and share the
+    thread's transport, so after the first event for a user there is no
+    discovery parsing and no new TCP/TLS connection. A client is rebuilt
+    when the user's refresh token changes (reconnect).
+    """
+    http = _transport()
+    services = _local.services
+    fingerprint = creds.refresh_token or creds.token
+    entry = services.get(cache_key)
+    if entry is not None and entry[0] == fingerprint:
+        services.move_to_end(cache_key)
+        # Pick up the latest stored access token
+        entry[2].credentials = creds
+        return entry[1]
+    
+    client_options = None
+    endpoint = getattr(settings, 'GOOGLE_CALENDAR_API_ENDPOINT', '')
+    if endpoint:
+        # Local fakes and benchmarks
+        client_options = {'api_endpoint': endpoint}
+    # Never refresh inside a request: a 401 surfaces as HttpError instead
+    authorized = AuthorizedHttp(creds, http=http, refresh_status_codes=())
+    service = build_from_document(
+        calendar_discovery_document(),
+        http=authorized,
+        client_options=client_options,
+    )
+    services[cache_key] = (fingerprint, service, authorized)
+    while len(services) > getattr(settings, 'GOOGLE_CALENDAR_CLIENT_CACHE_SIZE', 256):
+        services.popitem(last=False)
+    return service
+
+
+def calendar_batch_uri():
+    """Batch endpoint matching the API endpoint in use"""
+    document = calendar_discovery_document()
+    endpoint = getattr(settings, 'GOOGLE_CALENDAR_API_ENDPOINT', '')
+    root = document['rootUrl']
+    if endpoint and endpoint.rstrip('/').endswith(document['servicePath'].rstrip('/')):
+        root = endpoint.rstrip('/')[:-len(document['servicePath'].rstrip('/'))]
+    return root + document['batchPath']
+
+
+class CalendarBatch(BatchHttpRequest):
+    """Batch that reports 401s to the callback instead of refreshing tokens inline"""
+
+    def _refresh_and_apply_credentials(self, request, http):
+        pass
+
+
+def execute_batch(calls):
+    """Send ``(key, HttpRequest)`` pairs to Google as one HTTP request
+
+    Each call carries its own user's Authorization header, so one batch can
+    write to several calendars. Returns ``{key: (response, error)}``; a
+    transport failure is reported against every call.
+    """
+    results = {}
+    if not calls:
+        return results
+    if len(calls) == 1:
+        key, request = calls[0]
+        try:
+            results[key] = (execute(request), None)
+        except Exception as e:
+            results[key] = (None, e)
+        return results
+    
+    keys = {str(key): key for key, _ in calls}
+    
+    def collect(request_id, response, error):
+        results[keys[request_id]] = (response, error)
+    
+    batch = CalendarBatch(callback=collect, batch_uri=calendar_batch_uri())
+    for request_id, (_, request) in zip(keys, calls):
+        batch.add(request, request_id=request_id)
+    try:
+        # The bare transport: the batch envelope itself needs no user's token
+        calendar_circuit().call(batch.execute, http=_transport())
+    except Exception as e:
+        return {key: (None, e) for key, _ in calls}
+    return results
+
+
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def is_rate_limited(error):
+    """True for the 429 and 403 responses Google uses for quota throttling"""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    if error.resp.status == 403 and isinstance(error.error_details, list):
+        return any(
+            isinstance(detail, dict) and detail.get('reason') in RATE_LIMIT_REASONS
+            for detail in error.error_details
+        )
+    return False
+
+
+# Private extended property marking the events this app creates
+APPOINTMENT_PROPERTY = 'hmsAppointmentId'
+
+
+def display_name(user):
+    return user.get_full_name() or user.username
+
+
+def event_body(appointment, is_doctor=True):
+    """Calendar event resource for the doctor's or the patient's side of an appointment"""
+    slot = appointment.slot
+    start_datetime = datetime.combine(slot.date, slot.start_time)
+    end_datetime = datetime.combine(slot.date, slot.end_time)
+    
+    if is_doctor:
+        title = f"Appointment with {display_name(appointment.patient)}"
+        description = f"Patient: {display_name(appointment.patient)}\n"
+    else:
+        title = f"Appointment with Dr. {display_name(appointment.doctor)}"
+        description = f"Doctor: Dr. {display_name(appointment.doctor)}\n"
+    
+    if appointment.notes:
+        description += f"Notes: {appointment.notes}\n"
+    
+    description += f"Appointment ID: {appointment.id}"
+    
+    return {
+        'summary': title,
+        'description': description,
+        'start': {
+            # RFC3339
+            'dateTime': start_datetime.isoformat() + 'Z',
+            'timeZone': 'UTC',
+        },
+        'end': {
+            'dateTime': end_datetime.isoformat() + 'Z',
+            'timeZone': 'UTC',
+        },
+        'extendedProperties': {
+            'private': {APPOINTMENT_PROPERTY: str(appointment.id)},
+        },
+    }
+
+
 class GoogleCalendarService:
     """Service for Google Calendar integration"""
     
@@ -18,6 +218,7 @@ class GoogleCalendarService:
         self.client_id = settings.GOOGLE_CLIENT_ID
         self.client_secret = settings.GOOGLE_CLIENT_SECRET
         self.redirect_uri = settings.GOOGLE_REDIRECT_URI
+        self.token_uri = getattr(settings, 'GOOGLE_OAUTH_TOKEN_URI', 'https://oauth2.googleapis.com/token')
     
     def get_authorization_url(self):
         """Get Google OAuth authorization URL"""
@@ -27,7 +228,7 @@ class GoogleCalendarService:
                     "client_id": self.client_id,
                     "client_secret": self.client_secret,
                     "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "token_uri": self.token_uri,
                     "redirect_uris": [self.redirect_uri]
                 }
             },
@@ -49,7 +250,7 @@ class GoogleCalendarService:
                     "client_id": self.client_id,
                     "client_secret": self.client_secret,
                     "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "token_uri": self.token_uri,
                     "redirect_uris": [self.redirect_uri]
                 }
             },
@@ -66,62 +267,98 @@ class GoogleCalendarService:
         
         try:
             token_data = json.loads(user.google_calendar_token)
+            expiry = user.google_calendar_token_expiry or parse_datetime(token_data.get('expiry') or '')
+            if expiry is not None and timezone.is_aware(expiry):
+                # google-auth compares against naive UTC
+                expiry = timezone.make_naive(expiry, timezone.utc)
             creds = Credentials(
                 token=token_data.get('token'),
                 refresh_token=user.google_calendar_refresh_token or token_data.get('refresh_token'),
-                token_uri="https://oauth2.googleapis.com/token",
+                token_uri=self.token_uri,
                 client_id=self.client_id,
-                client_secret=self.client_secret
+                client_secret=self.client_secret,
+                expiry=expiry
             )
             return creds
         except Exception as e:
             print(f"Error loading credentials: {e}")
             return None
     
-    def create_appointment_event(self, user, appointment, is_doctor=True):
-        """Create a calendar event for an appointment"""
+    def save_credentials(self, user, creds):
+        """Persist a new or refreshed token together with its expiry in one UPDATE"""
+        fields = {
+            'google_calendar_token': json.dumps({
+                'token': creds.token,
+                'refresh_token': creds.refresh_token,
+                'expiry': creds.expiry.isoformat() if creds.expiry else None
+            }),
+            'google_calendar_token_expiry': timezone.make_aware(creds.expiry, timezone.utc) if creds.expiry else None,
+        }
+        if creds.refresh_token:
+            fields['google_calendar_refresh_token'] = creds.refresh_token
+        User.objects.filter(pk=user.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(user, name, value)
+        # update() skips post_save, which normally drops the cached session user
+        invalidate_cached_user(user.pk)
+    
+    def clear_credentials(self, user):
+        """Forget a user's tokens, e.g. after Google revoked the grant"""
+        fields = {
+            'google_calendar_token': None,
+            'google_calendar_refresh_token': None,
+            'google_calendar_token_expiry': None,
+        }
+        User.objects.filter(pk=user.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(user, name, value)
+        invalidate_cached_user(user.pk)
+    
+    def usable_credentials(self, user):
+        """Stored credentials, or None when missing or expired
+
+        Refreshing here would block the caller; refresh_calendar_tokens renews
+        tokens and resync_calendar_events adds the skipped events later.
+        """
         creds = self.get_user_credentials(user)
+        if creds is not None and not creds.valid:
+            print(f"Calendar token for user {user.pk} has expired; leaving its events for resync")
+            return None
+        return creds
+    
+    def insert_event_request(self, user, appointment, is_doctor=True, creds=None):
+        """Unexecuted events.insert request for one side of an appointment"""
+        creds = creds or self.usable_credentials(user)
         if not creds:
             return None
-        
+        service = calendar_service_for(creds, user.pk)
+        return service.events().insert(calendarId='primary', body=event_body(appointment, is_doctor))
+
+    def patch_event_request(self, user, appointment, event_id, is_doctor=True, creds=None):
+        """Unexecuted events.patch request bringing an event in line with its appointment"""
+        creds = creds or self.usable_credentials(user)
+        if not creds:
+            return None
+        service = calendar_service_for(creds, user.pk)
+        return service.events().patch(
+            calendarId='primary', eventId=event_id, body=event_body(appointment, is_doctor)
+        )
+    
+    def delete_event_request(self, user, event_id, creds=None):
+        """Unexecuted events.delete request"""
+        creds = creds or self.usable_credentials(user)
+        if not creds:
+            return None
+        service = calendar_service_for(creds, user.pk)
+        return service.events().delete(calendarId='primary', eventId=event_id)
+    
+    def create_appointment_event(self, user, appointment, is_doctor=True):
+        """Create a calendar event for an appointment"""
         try:
-            service = build('calendar', 'v3', credentials=creds)
-            
-            # Prepare event details
-            slot = appointment.slot
-            start_datetime = datetime.combine(slot.date, slot.start_time)
-            end_datetime = datetime.combine(slot.date, slot.end_time)
-            
-            # Convert to RFC3339 format
-            start_time_rfc = start_datetime.isoformat() + 'Z'
-            end_time_rfc = end_datetime.isoformat() + 'Z'
-            
-            if is_doctor:
-                title = f"Appointment with {appointment.patient.get_full_name() or appointment.patient.username}"
-                description = f"Patient: {appointment.patient.get_full_name() or appointment.patient.username}\n"
-            else:
-                title = f"Appointment with Dr. {appointment.doctor.get_full_name() or appointment.doctor.username}"
-                description = f"Doctor: Dr. {appointment.doctor.get_full_name() or appointment.doctor.username}\n"
-            
-            if appointment.notes:
-                description += f"Notes: {appointment.notes}\n"
-            
-            description += f"Appointment ID: {appointment.id}"
-            
-            event = {
-                'summary': title,
-                'description': description,
-                'start': {
-                    'dateTime': start_time_rfc,
-                    'timeZone': 'UTC',
-                },
-                'end': {
-                    'dateTime': end_time_rfc,
-                    'timeZone': 'UTC',
-                },
-            }
-            
-            created_event = service.events().insert(calendarId='primary', body=event).execute()
+            request = self.insert_event_request(user, appointment, is_doctor)
+            if request is None:
+                return None
+            created_event = execute(request)
             return created_event
             
         except HttpError as error:
@@ -130,4 +367,27 @@ class GoogleCalendarService:
         except Exception as e:
             print(f"Error creating calendar event: {e}")
             return None
+    
+    def create_appointment_events(self, appointment):
+        """Create the doctor's and the patient's events in one batch request
 
+        Returns ``{'doctor': event or None, 'patient': event or None}``.
+        """
+        calls = []
+        for side, user in (('doctor', appointment.doctor), ('patient', appointment.patient)):
+            if not user.google_calendar_token:
+                continue
+            try:
+                request = self.insert_event_request(user, appointment, is_doctor=side == 'doctor')
+            except Exception as e:
+                print(f"Error creating calendar event: {e}")
+                continue
+            if request is not None:
+                calls.append((side, request))
+        
+        events = {'doctor': None, 'patient': None}
+        for side, (event, error) in execute_batch(calls).items():
+            if error is not None:
+                print(f"An error occurred: {error}")
+            events[side] = event
+        return events
@@ -6,5 +6,8 @@ urlpatterns = [
     path('callback/', views.oauth_callback, name='calendar_callback'),
     path('status/', views.connection_status, name='calendar_status'),
     path('disconnect/', views.disconnect, name='calendar_disconnect'),
+    path('notifications/', views.notifications, name='calendar_notifications'),
+    path('feed/', views.feed, name='calendar_feed'),
+    path('feed/<str:token>.ics', views.feed_ics, name='calendar_feed_ics'),
 ]
 
@@ -1,10 +1,16 @@
 from rest_framework import status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from .feeds import cache_key, feed_etag, feed_for, rotate_token, stream_feed, window_start
+from .models import CalendarFeed
 from .services import GoogleCalendarService
+from .watch import record_notification
 from users.models import User
-import json
 
 
 @api_view(['GET'])
@@ -42,16 +48,8 @@ def oauth_callback(request):
         calendar_service = GoogleCalendarService()
         credentials = calendar_service.get_credentials_from_code(code)
         
-        # Store tokens in user model
-        user = request.user
-        user.google_calendar_token = json.dumps({
-            'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'expiry': credentials.expiry.isoformat() if credentials.expiry else None
-        })
-        if credentials.refresh_token:
-            user.google_calendar_refresh_token = credentials.refresh_token
-        user.save()
+        # Store tokens and their expiry in user model
+        calendar_service.save_credentials(request.user, credentials)
         
         # Clear state from session
         del request.session['oauth_state']
@@ -83,12 +81,70 @@ def connection_status(request):
 @permission_classes([permissions.IsAuthenticated])
 def disconnect(request):
     """Disconnect Google Calendar"""
-    user = request.user
-    user.google_calendar_token = None
-    user.google_calendar_refresh_token = None
-    user.save()
+    GoogleCalendarService().clear_credentials(request.user)
     
     return Response({
         'message': 'Google Calendar disconnected successfully'
     })
 
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def notifications(request):
+    """Webhook for Google Calendar push notifications (calendar_integration.watch)
+    
+    Google authenticates with the channel token it was given; the import
+    itself runs in import_busy_times --notified.
+    """
+    recorded = record_notification(
+        request.headers.get('X-Goog-Channel-ID'),
+        request.headers.get('X-Goog-Channel-Token'),
+        request.headers.get('X-Goog-Resource-ID'),
+        request.headers.get('X-Goog-Resource-State'),
+    )
+    if not recorded:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    return Response(status=status.HTTP_200_OK)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def feed(request):
+    """Subscription URL of the user's ICS feed; POST replaces the secret token"""
+    calendar_feed = feed_for(request.user)
+    if request.method == 'POST':
+        rotate_token(calendar_feed)
+    
+    return Response({
+        'feed_url': request.build_absolute_uri(f'/api/calendar/feed/{calendar_feed.token}.ics'),
+        'message': 'Subscribe to this URL from any calendar app; anyone who has it can read your appointments'
+    })
+
+
+@require_safe
+def feed_ics(request, token):
+    """ICS feed of the token owner's appointments, for calendar clients (no login)"""
+    calendar_feed = CalendarFeed.objects.filter(token=token).select_related('user').first()
+    if calendar_feed is None or not calendar_feed.user.is_active:
+        raise Http404
+    
+    start = window_start()
+    etag = feed_etag(calendar_feed, start)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        key = cache_key(calendar_feed, start)
+        body = cache.get(key)
+        if body is not None:
+            response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+        else:
+            response = StreamingHttpResponse(
+                stream_feed(calendar_feed.user, start, key), content_type='text/calendar; charset=utf-8'
+            )
+    
+    response['ETag'] = etag
+    # Let clients keep the body but check back every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
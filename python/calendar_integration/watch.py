@@ -0,0 +1,165 @@
+"""
+Push notifications for changes in doctors' Google Calendars.
+
+Instead of polling every calendar, ``ChannelRenewer`` registers a watch
+channel (events.watch) per connected doctor, pointed at the
+``calendar_notifications`` webhook. Google then POSTs a bodiless
+notification whenever anything in that calendar changes.
+
+The webhook only records the notification on the doctor's
+BusySyncState (``record_notification``): the time of the first pending
+one and of the latest. ``import_busy_times --notified`` picks up doctors
+whose first pending notification is at least ``--settle`` seconds old, so
+a burst of edits costs one incremental import, and a steady stream of them
+still gets imported every ``--settle`` seconds. Notifications that arrive
+while an import is in flight keep the doctor pending for the next pass.
+
+Channels cannot be extended. They are replaced before they expire: a new
+channel is created first and the old one is stopped once it exists.
+"""
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from users.models import User
+from .models import BusySyncState, CalendarWatchChannel
+from .services import GoogleCalendarService, calendar_service_for, execute
+
+
+def webhook_address():
+    return getattr(settings, 'CALENDAR_WEBHOOK_URL', '')
+
+
+def record_notification(channel_id, token, resource_id, resource_state):
+    """Note a change notification; False when it does not belong to a known channel"""
+    channel = CalendarWatchChannel.objects.filter(channel_id=channel_id or '').first()
+    if channel is None or not constant_time_compare(channel.token, token or ''):
+        return False
+    if channel.resource_id and channel.resource_id != resource_id:
+        return False
+    if resource_state == 'sync':
+        # Handshake sent when the channel is created; nothing changed
+        return True
+    now = timezone.now()
+    marked = BusySyncState.objects.filter(user_id=channel.user_id).update(
+        notified_at=Coalesce(F('notified_at'), Value(now)), last_notified_at=now
+    )
+    if not marked:
+        # Not imported yet; the first import will be a full one
+        BusySyncState.objects.get_or_create(
+            user_id=channel.user_id, defaults={'notified_at': now, 'last_notified_at': now}
+        )
+    return True
+
+
+def _expiration(value):
+    """Channel expiration from Google's milliseconds since the epoch"""
+    return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc)
+
+
+class WatchReport:
+    def __init__(self):
+        self.created = 0
+        self.stopped = 0
+        self.forgotten = 0
+        self.skipped = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+
+class ChannelRenewer:
+    def __init__(self, margin=timedelta(hours=12), ttl=None, doctor_ids=None):
+        self.margin = margin
+        self.ttl = ttl or getattr(settings, 'CALENDAR_WATCH_TTL', 7 * 24 * 3600)
+        self.doctor_ids = doctor_ids
+        self.service = GoogleCalendarService()
+        self.report = WatchReport()
+
+    def doctors(self, now):
+        """Connected doctors without a channel that outlives the margin"""
+        covered = CalendarWatchChannel.objects.filter(expiration__gt=now + self.margin).values('user_id')
+        doctors = User.objects.filter(
+            role='doctor', is_active=True, google_calendar_token__isnull=False
+        ).exclude(pk__in=covered)
+        if self.doctor_ids:
+            doctors = doctors.filter(pk__in=self.doctor_ids)
+        return doctors.order_by('id')
+
+    def run(self):
+        started = time.monotonic()
+        address = webhook_address()
+        if not address:
+            print("CALENDAR_WEBHOOK_URL is not set; not watching any calendars")
+            return self.report
+        now = timezone.now()
+        self.forget(now)
+        for doctor in self.doctors(now):
+            creds = self.service.usable_credentials(doctor)
+            if creds is None:
+                self.report.skipped += 1
+                continue
+            service = calendar_service_for(creds, doctor.pk)
+            if self.create(doctor, service, address):
+                self.stop_old(doctor, service)
+        self.report.elapsed = time.monotonic() - started
+        return self.report
+
+    def forget(self, now):
+        """Drop expired channels and those of disconnected doctors
+
+        Without a token they cannot be stopped; Google ends them at expiry and
+        the webhook ignores them meanwhile.
+        """
+        stale = CalendarWatchChannel.objects.filter(
+            Q(expiration__lte=now) | Q(user__google_calendar_token__isnull=True)
+        )
+        if self.doctor_ids:
+            stale = stale.filter(user_id__in=self.doctor_ids)
+        self.report.forgotten += stale.delete()[0]
+
+    def create(self, doctor, service, address):
+        # Saved before the call: Google's sync handshake may arrive before it returns
+        channel = CalendarWatchChannel.objects.create(
+            user=doctor,
+            channel_id=uuid.uuid4().hex,
+            token=secrets.token_urlsafe(32),
+            expiration=timezone.now() + timedelta(seconds=self.ttl),
+        )
+        try:
+            response = execute(service.events().watch(calendarId='primary', body={
+                'id': channel.channel_id,
+                'type': 'web_hook',
+                'address': address,
+                'token': channel.token,
+                'params': {'ttl': str(self.ttl)},
+            }))
+        except Exception as e:
+            print(f"Calendar watch failed for doctor {doctor.pk}: {e}")
+            channel.delete()
+            self.report.failed += 1
+            return False
+        channel.resource_id = response.get('resourceId', '')
+        if response.get('expiration'):
+            channel.expiration = _expiration(response['expiration'])
+        channel.save(update_fields=['resource_id', 'expiration'])
+        self.report.created += 1
+        return True
+
+    def stop_old(self, doctor, service):
+        """Stop the doctor's channels other than the newest one"""
+        channels = list(CalendarWatchChannel.objects.filter(user=doctor).order_by('-expiration', '-pk'))
+        for channel in channels[1:]:
+            try:
+                execute(service.channels().stop(body={'id': channel.channel_id, 'resourceId': channel.resource_id}))
+            except Exception as e:
+                # Unknown to Google already, or it will expire on its own
+                print(f"Stopping calendar channel {channel.channel_id} failed: {e}")
+            channel.delete()
+            self.report.stopped += 1
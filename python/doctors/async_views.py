@@ -0,0 +1,40 @@
+"""Async variants of the read-only doctor views, for the ASGI application"""
+from django.http import JsonResponse
+
+from appointments.models import Appointment
+from appointments.serializers import AppointmentSerializer
+from users.async_auth import aget_user, authentication_required
+
+
+async def doctor_bookings(request):
+    """Async variant of views.doctor_bookings"""
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return authentication_required()
+    
+    if not user.is_doctor:
+        return JsonResponse({
+            'error': 'Permission denied',
+            'message': 'Only doctors can view bookings',
+            'your_role': user.role
+        }, status=403)
+    
+    appointments = Appointment.objects.filter(doctor=user).select_related(
+        'patient', 'doctor', 'slot', 'slot__doctor'
+    ).order_by('-slot__date', '-slot__start_time')
+    
+    status_filter = request.GET.get('status')
+    if status_filter:
+        appointments = appointments.filter(status=status_filter)
+    
+    date_filter = request.GET.get('date')
+    if date_filter:
+        appointments = appointments.filter(slot__date=date_filter)
+    
+    appointments = [appointment async for appointment in appointments]
+    
+    return JsonResponse({
+        'doctor_id': user.id,
+        'bookings': AppointmentSerializer(appointments, many=True).data,
+        'total_bookings': len(appointments)
+    })
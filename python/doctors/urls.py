@@ -12,6 +12,10 @@ urlpatterns = [
     
     # Bookings endpoints
     path('bookings/', views.doctor_bookings, name='doctor_bookings'),
+    path('bookings/export/', views.doctor_bookings_export, name='doctor_bookings_export'),
     path('bookings/<int:pk>/', views.doctor_booking_detail, name='doctor_booking_detail'),
+    
+    # Reporting
+    path('stats/', views.doctor_stats, name='doctor_stats'),
 ]
 
@@ -1,10 +1,15 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from datetime import timedelta
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.shortcuts import get_object_or_404
-from appointments.models import AvailabilitySlot, Appointment
-from appointments.serializers import AvailabilitySlotSerializer, AppointmentSerializer
+from django.http import StreamingHttpResponse
+from appointments.models import AvailabilitySlot, Appointment, DoctorDailyStats
+from appointments.serializers import AvailabilitySlotSerializer, AppointmentSerializer, DoctorDailyStatsSerializer
+from appointments.exports import EXPORT_FORMATS, bookings_queryset, stream_bookings
 from appointments.views import availability_list_create, availability_detail, appointment_list, appointment_detail
 from users.models import User, DoctorProfile
 from users.serializers import DoctorProfileSerializer, UserSerializer
@@ -29,43 +34,47 @@ def doctor_dashboard(request):
         }, status=status.HTTP_403_FORBIDDEN)
     
     user = request.user
+    today = timezone.now().date()
+    
+    # Profile and counters in a single query
+    summary = User.objects.filter(pk=user.pk).select_related('doctor_profile').annotate(
+        today_count=Count(
+            'doctor_appointments',
+            filter=Q(doctor_appointments__status='confirmed', doctor_appointments__slot__date=today)
+        ),
+        upcoming_count=Count(
+            'doctor_appointments',
+            filter=Q(doctor_appointments__status='confirmed', doctor_appointments__slot__date__gte=today)
+        ),
+    ).get()
     
-    # Get doctor profile
+    # Next free future slot: one lookup on the free-slot partial index
+    next_slot = AvailabilitySlot.objects.filter(
+        doctor=user,
+        is_booked=False,
+        is_blocked=False,
+        date__gte=today
+    ).order_by('date', 'start_time').values('date', 'start_time', 'end_time').first()
+    
+    # Don't create a profile on a read; fall back to empty values instead
     try:
-        profile = user.doctor_profile
+        profile = summary.doctor_profile
         profile_data = DoctorProfileSerializer(profile).data
         specialization = profile.specialization
     except DoctorProfile.DoesNotExist:
-        profile = DoctorProfile.objects.create(user=user)
-        profile_data = DoctorProfileSerializer(profile).data
+        profile_data = None
         specialization = ''
     
-    # Get today's appointments
-    today = timezone.now().date()
-    today_appointments = Appointment.objects.filter(
-        doctor=user,
-        slot__date=today,
-        status='confirmed'
-    )
-    
-    # Get upcoming appointments (future)
+    # Get upcoming appointments (future) with patient and slot joined in
     upcoming_appointments = Appointment.objects.filter(
         doctor=user,
         slot__date__gte=today,
         status='confirmed'
-    ).order_by('slot__date', 'slot__start_time')[:10]
-    
-    # Get availability status
-    available_slots = AvailabilitySlot.objects.filter(
-        doctor=user,
-        is_booked=False,
-        date__gte=today
-    )
+    ).select_related('patient', 'slot').order_by('slot__date', 'slot__start_time')[:10]
     
-    # Find next available slot
-    next_available = available_slots.filter(
-        date__gte=today
-    ).order_by('date', 'start_time').first()
+    next_available = None
+    if next_slot:
+        next_available = f"{next_slot['date']} {next_slot['start_time']}-{next_slot['end_time']}"
     
     return Response({
         'doctor_id': user.id,
@@ -74,7 +83,7 @@ def doctor_dashboard(request):
         'email': user.email,
         'specialization': specialization,
         'profile': profile_data,
-        'today_appointments': today_appointments.count(),
+        'today_appointments': summary.today_count,
         'upcoming_appointments': [
             {
                 'id': apt.id,
@@ -89,12 +98,8 @@ def doctor_dashboard(request):
             for apt in upcoming_appointments
         ],
         'availability_status': 'available' if next_available else 'no_slots',
-        'next_available_slot': f"{next_available.date} {next_available.start_time}-{next_available.end_time}" if next_available else None,
-        'total_upcoming_appointments': Appointment.objects.filter(
-            doctor=user,
-            slot__date__gte=today,
-            status='confirmed'
-        ).count()
+        'next_available_slot': next_available,
+        'total_upcoming_appointments': summary.upcoming_count
     })
 
 
@@ -117,7 +122,9 @@ def doctor_bookings(request):
         }, status=status.HTTP_403_FORBIDDEN)
     
     # Get all appointments for this doctor
-    appointments = Appointment.objects.filter(doctor=request.user).order_by('-slot__date', '-slot__start_time')
+    appointments = Appointment.objects.filter(doctor=request.user).select_related(
+        'patient', 'doctor', 'slot', 'slot__doctor'
+    ).order_by('-slot__date', '-slot__start_time')
     
     # Filter by status if provided
     status_filter = request.query_params.get('status')
@@ -138,6 +145,60 @@ def doctor_bookings(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def doctor_bookings_export(request):
+    """Stream bookings as CSV or NDJSON (doctors: own bookings, staff: any doctor)"""
+    if not request.user.is_doctor and not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied',
+            'message': 'Only doctors and staff can export bookings',
+            'your_role': request.user.role
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    # Not called "format": DRF reserves that query parameter for renderers
+    export_format = request.query_params.get('export_format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return Response({
+            'error': 'Unsupported export format',
+            'supported_formats': sorted(EXPORT_FORMATS)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    start_date = parse_date(start) if start else None
+    end_date = parse_date(end) if end else None
+    if (start and start_date is None) or (end and end_date is None):
+        return Response({'error': 'start and end must be dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if request.user.is_staff:
+        doctor_id = request.query_params.get('doctor_id')
+        if doctor_id:
+            try:
+                doctor_id = int(doctor_id)
+            except ValueError:
+                return Response({'error': 'doctor_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        doctor_id = request.user.id
+    
+    queryset = bookings_queryset(
+        doctor_id=doctor_id,
+        status=request.query_params.get('status'),
+        start=start_date,
+        end=end_date
+    )
+    compress = request.query_params.get('gzip', 'false').lower() in ('1', 'true')
+    content_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"bookings.{extension}" + ('.gz' if compress else '')
+    
+    response = StreamingHttpResponse(
+        stream_bookings(queryset, export_format=export_format, compress=compress),
+        content_type='application/gzip' if compress else content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @api_view(['PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def doctor_booking_detail(request, pk):
@@ -165,7 +226,8 @@ def doctor_booking_detail(request, pk):
         if serializer.is_valid():
             # If status is being changed to cancelled
             if 'status' in request.data and request.data['status'] == 'cancelled':
-                appointment.cancel()
+                if not appointment.cancel():
+                    return Response({'error': 'Appointment is already cancelled'}, status=status.HTTP_400_BAD_REQUEST)
             else:
                 serializer.save()
             return Response(serializer.data)
@@ -173,9 +235,59 @@ def doctor_booking_detail(request, pk):
     
     elif request.method == 'DELETE':
         # Cancel the appointment
-        appointment.cancel()
+        if not appointment.cancel():
+            return Response({'error': 'Appointment is already cancelled'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({
             'message': 'Appointment cancelled successfully',
             'appointment_id': appointment.id
         }, status=status.HTTP_200_OK)
 
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def doctor_stats(request):
+    """Daily booking and utilization stats, read from the DoctorDailyStats rollup"""
+    if not request.user.is_doctor and not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied',
+            'message': 'Only doctors and staff can view booking stats',
+            'your_role': request.user.role
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    today = timezone.now().date()
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    start = parse_date(start) if start else today - timedelta(days=30)
+    end = parse_date(end) if end else today
+    if start is None or end is None:
+        return Response({'error': 'start and end must be dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    stats = DoctorDailyStats.objects.filter(date__gte=start, date__lte=end)
+    
+    # Doctors only see their own rows; staff may pick a doctor or see everyone
+    if request.user.is_staff:
+        doctor_id = request.query_params.get('doctor_id')
+        if doctor_id:
+            try:
+                stats = stats.filter(doctor_id=int(doctor_id))
+            except ValueError:
+                return Response({'error': 'doctor_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        stats = stats.filter(doctor=request.user)
+    
+    totals = stats.aggregate(
+        total_slots=Sum('total_slots'),
+        booked_slots=Sum('booked_slots'),
+        bookings=Sum('bookings'),
+        cancellations=Sum('cancellations')
+    )
+    totals = {name: value or 0 for name, value in totals.items()}
+    totals['utilization'] = round(totals['booked_slots'] / totals['total_slots'], 4) if totals['total_slots'] else 0.0
+    
+    return Response({
+        'start': str(start),
+        'end': str(end),
+        'totals': totals,
+        'days': DoctorDailyStatsSerializer(stats.order_by('date', 'doctor_id'), many=True).data
+    })
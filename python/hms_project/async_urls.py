@@ -0,0 +1,18 @@
+"""
+Async read endpoints, mounted under /api/async/.
+
+These mirror the DRF endpoints of the same name and are meant to be served
+by the ASGI application.
+"""
+from django.urls import path
+from appointments import async_views as appointment_views
+from doctors import async_views as doctor_views
+from users import async_views as user_views
+
+urlpatterns = [
+    path('auth/status/', user_views.auth_status, name='async_auth_status'),
+    path('auth/doctors/', user_views.list_doctors, name='async_list_doctors'),
+    path('appointments/', appointment_views.appointment_list, name='async_appointment_list'),
+    path('appointments/available-slots/', appointment_views.available_slots, name='async_available_slots'),
+    path('doctors/bookings/', doctor_views.doctor_bookings, name='async_doctor_bookings'),
+]
@@ -0,0 +1,196 @@
+"""
+Client for the email service (EMAIL_SERVICE_URL).
+
+Request handlers call ``send``. By default it posts the message before
+the response goes out: on serverless hosts (Vercel) the process is frozen
+or killed once the response is returned, so nothing may be left behind.
+
+With EMAIL_ASYNC, for long-running servers (gunicorn), ``send`` calls
+``enqueue`` instead: the message goes onto an in-process queue and a
+background thread posts queued messages in batches of up to
+EMAIL_BATCH_SIZE, so no request waits on the email service. Batches that
+are refused with 429/503 or hit a connection error are retried with
+backoff; when the local queue (EMAIL_QUEUE_SIZE) is full, new messages are
+dropped and logged rather than blocking the request.
+
+``send_email`` and ``send_batch`` post synchronously, for management
+commands that want to report what was accepted.
+
+Every POST goes through the ``email`` circuit breaker (hms_project.outbound):
+while the service is failing, posts fail at once and the dispatcher waits
+for the circuit to half-open instead of retrying into a dead endpoint.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+
+from .outbound import CircuitOpen, circuit
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def _failed(response):
+    return response.status_code in RETRY_STATUSES or response.status_code >= 500
+
+
+def email_circuit():
+    return circuit('email', timeout=getattr(settings, 'EMAIL_SERVICE_TIMEOUT', 5), failed_result=_failed)
+
+
+def _timeout():
+    return email_circuit().timeout
+
+
+def _batch_size():
+    return getattr(settings, 'EMAIL_BATCH_SIZE', 100)
+
+
+def _accepted(response, count):
+    # Lambda reports what it sent, the long-running service what it queued
+    body = response.json()
+    return body.get('sent', body.get('queued', count))
+
+
+def send_email(message):
+    """Send one message, e.g. {'action': 'SIGNUP_WELCOME', 'to_email': ..., ...}"""
+    return email_circuit().call(requests.post, settings.EMAIL_SERVICE_URL, json=message, timeout=_timeout())
+
+
+def _post_chunk(chunk):
+    try:
+        response = email_circuit().call(
+            requests.post,
+            settings.EMAIL_SERVICE_URL,
+            json={'messages': chunk},
+            # Bigger batches take longer to deliver
+            timeout=_timeout() + len(chunk),
+        )
+        response.raise_for_status()
+        return _accepted(response, len(chunk))
+    except Exception as e:
+        print(f"Email service error: {e}")
+        return 0
+
+
+def send_batch(messages, concurrency=1):
+    """Send messages in as few requests as possible.
+
+    Returns the number of messages the service accepted. Errors are logged
+    per request, not raised: email is never allowed to fail the caller.
+    With ``concurrency`` > 1 that many batch requests are in flight at once.
+    """
+    chunks = [messages[start:start + _batch_size()] for start in range(0, len(messages), _batch_size())]
+    if concurrency > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return sum(executor.map(_post_chunk, chunks))
+    return sum(_post_chunk(chunk) for chunk in chunks)
+
+
+class EmailDispatcher:
+    """Background thread posting queued messages in batches"""
+
+    def __init__(self):
+        self.queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Also restarts the thread in forked worker processes
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=getattr(settings, 'EMAIL_QUEUE_SIZE', 1000))
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='email-dispatcher', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, message):
+        """Queue a message for delivery; never blocks. Returns False if it was dropped"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            print(f"Email queue full; dropped {message.get('action')} email to {message.get('to_email')}")
+            return False
+
+    def flush(self, timeout=5):
+        """Wait up to ``timeout`` seconds for queued messages to be posted"""
+        if self.queue is None or self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self):
+        session = requests.Session()
+        linger = getattr(settings, 'EMAIL_BATCH_LINGER', 0.05)
+        while True:
+            batch = [self.queue.get()]
+            # Give a burst a moment to fill the batch
+            deadline = time.monotonic() + linger
+            while len(batch) < _batch_size():
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._post(session, batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _post(self, session, batch):
+        payload = {'messages': batch} if len(batch) > 1 else batch[0]
+        attempts = getattr(settings, 'EMAIL_SERVICE_RETRIES', 3)
+        for attempt in range(attempts + 1):
+            delay = 2 ** attempt
+            try:
+                response = email_circuit().call(
+                    session.post, settings.EMAIL_SERVICE_URL, json=payload, timeout=_timeout() + len(batch)
+                )
+                if response.status_code not in RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        print(f"Email service error: {response.status_code} {response.text[:200]}")
+                    return
+                delay = float(response.headers.get('Retry-After') or delay)
+                error = f'status {response.status_code}'
+            except CircuitOpen as e:
+                # Sleep until the probe is due instead of hammering a known outage
+                delay = max(delay, e.retry_in)
+                error = e
+            except requests.RequestException as e:
+                error = e
+            if attempt < attempts:
+                time.sleep(delay)
+        print(f"Email service error: giving up on {len(batch)} emails after {attempts + 1} attempts ({error})")
+
+
+dispatcher = EmailDispatcher()
+enqueue = dispatcher.enqueue
+
+
+def send(message):
+    """Send a message from a request handler: queued with EMAIL_ASYNC, posted right away otherwise"""
+    if getattr(settings, 'EMAIL_ASYNC', False):
+        return enqueue(message)
+    return send_email(message)
+
+
+@atexit.register
+def _flush_on_exit():
+    dispatcher.flush(getattr(settings, 'EMAIL_FLUSH_TIMEOUT', 5))
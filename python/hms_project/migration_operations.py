@@ -0,0 +1,80 @@
+"""
+Migration operations that keep tables writable while indexes are built.
+
+The stock AddIndex / AddConstraint / AlterField build indexes with a plain
+CREATE INDEX, which blocks every write to the table until the build is done.
+On PostgreSQL these variants build them with CREATE INDEX CONCURRENTLY
+instead, so a migration using them must set ``atomic = False``. On other
+backends they behave exactly like the stock operations.
+
+A concurrent build that fails (e.g. a duplicate for a unique index) leaves an
+INVALID index behind; drop it and run the migration again. See
+DATABASE_INFO.md for the rollout of the indexes that use these.
+"""
+from django.db import migrations, models
+
+
+def _concurrently(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex without blocking writes on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _concurrently(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _concurrently(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddUniqueConstraintConcurrently(migrations.AddConstraint):
+    """AddConstraint for a partial UniqueConstraint, which PostgreSQL keeps as a unique index"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _concurrently(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            sql = str(self.constraint.create_sql(model, schema_editor))
+            schema_editor.execute(sql.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1), params=None)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _concurrently(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute(schema_editor._delete_index_sql(model, self.constraint.name, concurrently=True))
+
+
+class OneToOneToForeignKey(migrations.AlterField):
+    """Turn a OneToOneField into a ForeignKey without blocking writes on PostgreSQL
+
+    Builds the ForeignKey's index concurrently, then drops the one-to-one's
+    unique constraint (a catalog change). Unique constraints declared on the
+    model, e.g. a partial one added just before, are kept.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _concurrently(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        field = model._meta.get_field(self.name)
+        index = models.Index(
+            fields=[self.name], name=schema_editor._create_index_name(model._meta.db_table, [field.column])
+        )
+        schema_editor.add_index(model, index, concurrently=True)
+        declared = {constraint.name for constraint in model._meta.constraints}
+        for name in schema_editor._constraint_names(model, [field.column], unique=True, primary_key=False):
+            if name not in declared:
+                schema_editor.execute(schema_editor._delete_unique_sql(model, name))
@@ -0,0 +1,187 @@
+"""
+Circuit breakers around calls to other services (Google Calendar, the email service).
+
+Outbound calls go through ``circuit(name).call(fn, ...)``. Each dependency
+has its own timeout, for callers to pass to their HTTP client, and keeps
+the outcome of its calls over the last OUTBOUND_WINDOW seconds. Once at
+least OUTBOUND_MIN_CALLS calls were made and OUTBOUND_FAILURE_RATE of them
+failed, the circuit opens: calls fail at once with CircuitOpen instead of
+holding a worker for a full timeout. After OUTBOUND_OPEN_SECONDS a single
+probe call is let through (half-open); its success closes the circuit, its
+failure opens it again.
+
+What counts as a failure is up to the dependency: ``failed_error`` judges
+exceptions (all of them by default) and ``failed_result`` return values
+(e.g. a 503 response). A 404 from a healthy service is not an outage.
+
+State and metrics are per process; ``metrics()`` feeds /api/health/outbound/.
+"""
+import collections
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """The dependency is failing; the call was not attempted"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit is open; next attempt in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def is_timeout(error):
+    return isinstance(error, (TimeoutError, requests.Timeout))
+
+
+class CircuitBreaker:
+    def __init__(self, name, timeout, failed_error=None, failed_result=None):
+        self.name = name
+        self.timeout = timeout
+        self.failure_rate = getattr(settings, 'OUTBOUND_FAILURE_RATE', 0.5)
+        self.min_calls = getattr(settings, 'OUTBOUND_MIN_CALLS', 10)
+        self.window = getattr(settings, 'OUTBOUND_WINDOW', 30)
+        self.open_seconds = getattr(settings, 'OUTBOUND_OPEN_SECONDS', 30)
+        self.failed_error = failed_error or (lambda error: True)
+        self.failed_result = failed_result or (lambda result: False)
+        self._lock = threading.Lock()
+        # (monotonic time, failed) of the calls made while closed
+        self._outcomes = collections.deque()
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        # Metrics since the process started
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.opened = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def _state_at(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state_at(time.monotonic())
+
+    def _acquire(self):
+        """Whether the call is the half-open probe; raises CircuitOpen when it may not run"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state_at(now)
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            retry_in = max(0.0, self._opened_at + self.open_seconds - now)
+        raise CircuitOpen(self.name, retry_in)
+
+    def _record(self, failed, started, probe, timed_out=False):
+        now = time.monotonic()
+        elapsed = now - started
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            self.timeouts += timed_out
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+            if probe:
+                self._probing = False
+                if failed:
+                    self._open(now, 'probe call failed')
+                else:
+                    self._close()
+                return
+            if self._state != CLOSED:
+                # Started before the circuit opened
+                return
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            while self._outcomes and self._outcomes[0][0] <= now - self.window:
+                self._failures -= self._outcomes.popleft()[1]
+            if len(self._outcomes) >= self.min_calls and self._failures >= self.failure_rate * len(self._outcomes):
+                self._open(now, f'{self._failures} of {len(self._outcomes)} calls failed')
+
+    def _open(self, now, reason):
+        print(f"Circuit {self.name} opened: {reason}")
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._failures = 0
+        self.opened += 1
+
+    def _close(self):
+        print(f"Circuit {self.name} closed")
+        self._state = CLOSED
+
+    def call(self, fn, *args, **kwargs):
+        """``fn(*args, **kwargs)`` unless the circuit is open"""
+        probe = self._acquire()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record(self.failed_error(e), started, probe, timed_out=is_timeout(e))
+            raise
+        except BaseException:
+            # Interrupted; the outcome says nothing about the dependency
+            if probe:
+                with self._lock:
+                    self._probing = False
+            raise
+        self._record(self.failed_result(result), started, probe)
+        return result
+
+    def metrics(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._state_at(now)
+            return {
+                'name': self.name,
+                'state': state,
+                'timeout': self.timeout,
+                'calls': self.calls,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'opened': self.opened,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': self._failures,
+                'avg_ms': round(self.total_time / self.calls * 1000, 1) if self.calls else None,
+                'max_ms': round(self.max_time * 1000, 1),
+                'retry_in': round(max(0.0, self._opened_at + self.open_seconds - now), 1) if state == OPEN else None,
+            }
+
+
+_circuits = {}
+_circuits_lock = threading.Lock()
+
+
+def circuit(name, timeout=10, failed_error=None, failed_result=None):
+    """The process-wide breaker for ``name``; the other arguments apply when it is first created"""
+    breaker = _circuits.get(name)
+    if breaker is None:
+        with _circuits_lock:
+            breaker = _circuits.get(name)
+            if breaker is None:
+                breaker = _circuits[name] = CircuitBreaker(name, timeout, failed_error, failed_result)
+    return breaker
+
+
+def metrics():
+    return [breaker.metrics() for breaker in list(_circuits.values())]
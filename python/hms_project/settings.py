@@ -46,7 +46,8 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
+    'users.middleware.SlidingSessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -99,6 +100,26 @@ else:
     }
 
 
+# Cache
+# Local memory by default; set CACHE_REDIS_URL when running more than one process
+# so token revocations, sessions and cached users are shared between workers
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -118,6 +139,28 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# Stored hashes are upgraded to PASSWORD_HASH_ITERATIONS on the next login
+PASSWORD_HASHERS = [
+    'users.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=600000, cast=int)
+# Concurrent credential checks per process, and how many more may wait
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=16, cast=int)
+
+# Login throttling: failed attempts allowed per window before answering 429
+LOGIN_ATTEMPT_WINDOW = config('LOGIN_ATTEMPT_WINDOW', default=900, cast=int)
+LOGIN_MAX_ATTEMPTS_PER_IP = config('LOGIN_MAX_ATTEMPTS_PER_IP', default=50, cast=int)
+LOGIN_MAX_ATTEMPTS_PER_USER = config('LOGIN_MAX_ATTEMPTS_PER_USER', default=5, cast=int)
+# Only enable behind a proxy that sets X-Forwarded-For itself
+LOGIN_TRUST_X_FORWARDED_FOR = config('LOGIN_TRUST_X_FORWARDED_FOR', default=False, cast=bool)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -147,6 +190,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -161,6 +205,10 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Signed API tokens (Authorization: Bearer ...), in seconds
+API_ACCESS_TOKEN_LIFETIME = config('API_ACCESS_TOKEN_LIFETIME', default=15 * 60, cast=int)
+API_REFRESH_TOKEN_LIFETIME = config('API_REFRESH_TOKEN_LIFETIME', default=14 * 24 * 60 * 60, cast=int)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -175,11 +223,70 @@ CORS_ALLOW_CREDENTIALS = True
 GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID', default='')
 GOOGLE_CLIENT_SECRET = config('GOOGLE_CLIENT_SECRET', default='')
 GOOGLE_REDIRECT_URI = config('GOOGLE_REDIRECT_URI', default='http://localhost:8000/api/calendar/callback/')
+GOOGLE_OAUTH_TOKEN_URI = config('GOOGLE_OAUTH_TOKEN_URI', default='https://oauth2.googleapis.com/token')
+# Override the Calendar API base URL (e.g. http://127.0.0.1:8088/calendar/v3/ for a local fake)
+GOOGLE_CALENDAR_API_ENDPOINT = config('GOOGLE_CALENDAR_API_ENDPOINT', default='')
+GOOGLE_CALENDAR_TIMEOUT = config('GOOGLE_CALENDAR_TIMEOUT', default=10, cast=int)
+# Calendar API clients kept per worker thread
+GOOGLE_CALENDAR_CLIENT_CACHE_SIZE = config('GOOGLE_CALENDAR_CLIENT_CACHE_SIZE', default=256, cast=int)
+# Background event updates (calendar_integration.reconciler): attempts per change
+# and the backoff between them, in seconds
+CALENDAR_SYNC_MAX_ATTEMPTS = config('CALENDAR_SYNC_MAX_ATTEMPTS', default=8, cast=int)
+CALENDAR_SYNC_RETRY_BASE = config('CALENDAR_SYNC_RETRY_BASE', default=30, cast=int)
+CALENDAR_SYNC_RETRY_MAX = config('CALENDAR_SYNC_RETRY_MAX', default=3600, cast=int)
+# Push notifications (calendar_integration.watch): public HTTPS URL of the
+# calendar_notifications webhook, and how long each watch channel lives (seconds)
+CALENDAR_WEBHOOK_URL = config('CALENDAR_WEBHOOK_URL', default='')
+CALENDAR_WATCH_TTL = config('CALENDAR_WATCH_TTL', default=7 * 24 * 3600, cast=int)
+# ICS subscription feeds (calendar_integration.feeds): days of past appointments
+# included, and how long a generated feed is kept in the cache (seconds)
+CALENDAR_FEED_PAST_DAYS = config('CALENDAR_FEED_PAST_DAYS', default=30, cast=int)
+CALENDAR_FEED_CACHE_TIMEOUT = config('CALENDAR_FEED_CACHE_TIMEOUT', default=24 * 3600, cast=int)
 
 # Serverless Email Service settings
 EMAIL_SERVICE_URL = config('EMAIL_SERVICE_URL', default='http://localhost:3000/email')
+EMAIL_SERVICE_TIMEOUT = config('EMAIL_SERVICE_TIMEOUT', default=5, cast=int)
+# Messages per request when sending in bulk (imports, reminders, digests)
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=100, cast=int)
+# Queue emails in-process and post them from a background thread. Only for
+# long-running servers (gunicorn); on serverless hosts queued emails are lost
+EMAIL_ASYNC = config('EMAIL_ASYNC', default=False, cast=bool)
+EMAIL_QUEUE_SIZE = config('EMAIL_QUEUE_SIZE', default=1000, cast=int)
+EMAIL_BATCH_LINGER = config('EMAIL_BATCH_LINGER', default=0.05, cast=float)
+EMAIL_SERVICE_RETRIES = config('EMAIL_SERVICE_RETRIES', default=3, cast=int)
+# Batch requests in flight at once for bulk jobs (digests)
+EMAIL_BATCH_CONCURRENCY = config('EMAIL_BATCH_CONCURRENCY', default=4, cast=int)
+
+# Circuit breakers around Google Calendar and email calls (hms_project.outbound).
+# Timeouts are GOOGLE_CALENDAR_TIMEOUT and EMAIL_SERVICE_TIMEOUT. A circuit opens
+# when OUTBOUND_FAILURE_RATE of at least OUTBOUND_MIN_CALLS calls in the last
+# OUTBOUND_WINDOW seconds failed, and probes again after OUTBOUND_OPEN_SECONDS
+OUTBOUND_FAILURE_RATE = config('OUTBOUND_FAILURE_RATE', default=0.5, cast=float)
+OUTBOUND_MIN_CALLS = config('OUTBOUND_MIN_CALLS', default=10, cast=int)
+OUTBOUND_WINDOW = config('OUTBOUND_WINDOW', default=30, cast=int)
+OUTBOUND_OPEN_SECONDS = config('OUTBOUND_OPEN_SECONDS', default=30, cast=int)
 
 # Session settings
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True
-
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+# SlidingSessionMiddleware extends the expiry at most this often (seconds)
+# instead of saving the session on every request
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = config('SESSION_REFRESH_INTERVAL', default=300, cast=int)
+# How long CachedAuthenticationMiddleware keeps a session's user (seconds)
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=300, cast=int)
+
+
+# Delta sync (/api/appointments/sync/)
+# Rows younger than the settle window are held back until concurrent writes commit
+SYNC_SETTLE_SECONDS = config('SYNC_SETTLE_SECONDS', default=2, cast=int)
+# Deletion tombstones are kept this long; older cursors must do a full resync
+SYNC_TOMBSTONE_RETENTION_DAYS = config('SYNC_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Live availability events (/api/appointments/stream/<doctor_id>/, ASGI only)
+# Empty keeps the pub/sub hub in-process; set a redis:// URL to fan out across workers
+REALTIME_BACKEND_URL = config('REALTIME_BACKEND_URL', default='')
+REALTIME_QUEUE_SIZE = config('REALTIME_QUEUE_SIZE', default=100, cast=int)
+SSE_HEARTBEAT_SECONDS = config('SSE_HEARTBEAT_SECONDS', default=15, cast=int)
+SSE_MAX_STREAM_SECONDS = config('SSE_MAX_STREAM_SECONDS', default=300, cast=int)
@@ -3,7 +3,7 @@ URL configuration for hms_project project.
 """
 from django.contrib import admin
 from django.urls import path, include
-from .views import api_root
+from .views import api_root, outbound_status
 
 urlpatterns = [
     path('', api_root, name='api_root'),
@@ -12,5 +12,7 @@ urlpatterns = [
     path('api/appointments/', include('appointments.urls')),
     path('api/doctors/', include('doctors.urls')),
     path('api/calendar/', include('calendar_integration.urls')),
+    path('api/async/', include('hms_project.async_urls')),
+    path('api/health/outbound/', outbound_status, name='outbound_status'),
 ]
 
@@ -1,5 +1,9 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from . import outbound
 
 
 @csrf_exempt
@@ -13,6 +17,7 @@ def api_root(request):
                 'signup': '/api/auth/signup/',
                 'login': '/api/auth/login/',
                 'logout': '/api/auth/logout/',
+                'token_refresh': '/api/auth/token/refresh/',
                 'auth_status': '/api/auth/status/',
                 'current_user': '/api/auth/me/',
                 'dashboard': '/api/auth/dashboard/',
@@ -23,19 +28,36 @@ def api_root(request):
                 'availability': '/api/doctors/availability/',
                 'availability_detail': '/api/doctors/availability/<id>/',
                 'bookings': '/api/doctors/bookings/',
+                'bookings_export': '/api/doctors/bookings/export/',
                 'booking_detail': '/api/doctors/bookings/<id>/',
+                'stats': '/api/doctors/stats/',
             },
             'appointments': {
                 'availability': '/api/appointments/availability/',
                 'available_slots': '/api/appointments/available-slots/',
                 'book_appointment': '/api/appointments/book/',
                 'list_appointments': '/api/appointments/',
+                'sync': '/api/appointments/sync/',
+                'availability_stream': '/api/appointments/stream/<doctor_id>/',
             },
             'calendar': {
                 'authorize': '/api/calendar/authorize/',
                 'callback': '/api/calendar/callback/',
                 'status': '/api/calendar/status/',
                 'disconnect': '/api/calendar/disconnect/',
+                'notifications': '/api/calendar/notifications/',
+                'feed': '/api/calendar/feed/',
+                'feed_ics': '/api/calendar/feed/<token>.ics',
+            },
+            'async': {
+                'auth_status': '/api/async/auth/status/',
+                'list_doctors': '/api/async/auth/doctors/',
+                'list_appointments': '/api/async/appointments/',
+                'available_slots': '/api/async/appointments/available-slots/',
+                'doctor_bookings': '/api/async/doctors/bookings/',
+            },
+            'health': {
+                'outbound': '/api/health/outbound/',
             },
             'admin': '/admin/',
         },
@@ -45,3 +67,10 @@ def api_root(request):
         }
     })
 
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def outbound_status(request):
+    """Circuit breaker state and call metrics of this worker process (staff only)"""
+    return Response({'circuits': outbound.metrics()})
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Measure cold start and per-message latency of the email handler against a
+local stub SMTP server.
+
+The stub speaks just enough SMTP (EHLO, AUTH, MAIL, RCPT, DATA, NOOP, RSET,
+QUIT) and waits --latency milliseconds before every reply to stand in for
+the network round trip to a real provider. TLS is not simulated, so the
+savings of connection reuse shown here are a lower bound.
+
+Usage:
+    python benchmark.py --messages 200 --latency 5
+"""
+import argparse
+import json
+import os
+import socketserver
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('latin-1').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                time.sleep(self.server.latency)
+                self.wfile.write(b'250-stub\r\n250-AUTH PLAIN LOGIN\r\n250 SIZE 10485760\r\n')
+            elif command.startswith('AUTH'):
+                self.reply('235 Authentication successful')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.messages += 1
+                self.reply('250 OK queued')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:
+                # MAIL, RCPT, NOOP, RSET
+                self.reply('250 OK')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+
+
+def message(index, action='BOOKING_CONFIRMATION'):
+    return {
+        'action': action,
+        'to_email': f'patient{index}@example.com',
+        'to_name': f'Patient {index}',
+        'doctor_name': 'Smith',
+        'appointment_date': '2024-01-15',
+        'appointment_time': '10:00:00',
+        'appointment_id': str(index),
+    }
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize(name, latencies):
+    ms = [value * 1000 for value in latencies]
+    print(
+        f'{name:<24} mean {statistics.fmean(ms):7.2f} ms  p50 {percentile(ms, 50):7.2f} ms  '
+        f'p99 {percentile(ms, 99):7.2f} ms'
+    )
+
+
+def cold_start(env):
+    """Import the handler and send one message in a fresh interpreter"""
+    code = (
+        'import json, time; t0 = time.perf_counter(); import handler; t1 = time.perf_counter(); '
+        f'handler.send_email({{"body": {json.dumps(message(0))!r}}}, None); t2 = time.perf_counter(); '
+        'print(json.dumps([t1 - t0, t2 - t1]))'
+    )
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=HERE, env=env)
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=5, help='Stub reply delay in milliseconds')
+    parser.add_argument('--cold-runs', type=int, default=5)
+    args = parser.parse_args()
+
+    server = StubSMTPServer(args.latency / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(
+        os.environ,
+        SMTP_HOST='127.0.0.1', SMTP_PORT=str(server.server_address[1]),
+        SMTP_USER='bench', SMTP_PASSWORD='bench', FROM_EMAIL='hms@example.com',
+        SMTP_STARTTLS='false',
+    )
+    os.environ.update(env)
+    sys.path.insert(0, HERE)
+    import handler
+    import email_templates
+
+    print(f'{args.messages} messages, stub latency {args.latency} ms per reply')
+
+    imports, firsts = zip(*[cold_start(env) for _ in range(args.cold_runs)])
+    summarize('cold import', imports)
+    summarize('cold first message', firsts)
+
+    started = time.perf_counter()
+    for index in range(args.messages):
+        email_templates.render('BOOKING_CONFIRMATION', message(index), f'Patient {index}')
+    render = (time.perf_counter() - started) / args.messages
+    print(f'{"template render":<24} mean {render * 1e6:7.2f} us')
+
+    for name, pool_size in (('warm, no reuse', 0), ('warm, pooled', 1)):
+        handler.smtp_pool = handler.SMTPPool(handler.SMTP_CONFIG, size=pool_size)
+        latencies = []
+        for index in range(args.messages):
+            started = time.perf_counter()
+            response = handler.send_email({'body': message(index)}, None)
+            latencies.append(time.perf_counter() - started)
+            assert response['statusCode'] == 200, response
+        handler.smtp_pool.close_all()
+        summarize(name, latencies)
+        print(f'{"":<24} {handler.smtp_pool.stats}')
+
+    handler.smtp_pool = handler.SMTPPool(handler.SMTP_CONFIG)
+    started = time.perf_counter()
+    response = handler.send_email({'body': {'messages': [message(i) for i in range(args.messages)]}}, None)
+    elapsed = time.perf_counter() - started
+    body = json.loads(response['body'])
+    print(
+        f'{"one batch":<24} {elapsed * 1000:7.1f} ms total, {elapsed / args.messages * 1000:.2f} ms/message '
+        f'({body["sent"]} sent)'
+    )
+    print(f'stub saw {server.connections} connections and {server.messages} messages')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+Email templates, compiled once at import.
+
+Each action maps to an EmailTemplate holding string.Template objects for
+the subject, HTML and text bodies. Rendering only substitutes values; in
+warm Lambda containers and in the long-running service nothing here is
+rebuilt per message. Values are HTML-escaped for the HTML part.
+"""
+import html
+import textwrap
+from string import Template
+
+
+class EmailTemplate:
+    def __init__(self, subject, html_body, text_body, defaults=None, prepare=None):
+        self.subject = Template(subject)
+        self.html = Template(textwrap.dedent(html_body).strip() + '\n')
+        self.text = Template(textwrap.dedent(text_body).strip() + '\n')
+        self.defaults = defaults or {}
+        # Optional hook deriving extra values (e.g. list markup) from the body
+        self.prepare = prepare
+    
+    def render(self, body, to_name):
+        values = dict(self.defaults)
+        values.update({key: value for key, value in body.items() if value is not None and not isinstance(value, (list, dict))})
+        values['to_name'] = to_name
+        html_values = {key: html.escape(str(value)) for key, value in values.items()}
+        if self.prepare is not None:
+            text_extra, html_extra = self.prepare(body)
+            values.update(text_extra)
+            html_values.update(html_extra)
+        return (
+            self.subject.safe_substitute(values),
+            self.html.safe_substitute(html_values),
+            self.text.safe_substitute(values),
+        )
+
+
+def _digest_rows(body):
+    """Text and HTML lines for a doctor's day of appointments"""
+    appointments = body.get('appointments') or []
+    text_lines = []
+    html_lines = []
+    for item in appointments:
+        time = item.get('time', '')
+        patient = item.get('patient_name', '')
+        status = item.get('status', '')
+        text_lines.append(f"- {time}  {patient} ({status})")
+        html_lines.append(
+            f"<li><strong>{html.escape(str(time))}</strong> {html.escape(str(patient))} "
+            f"({html.escape(str(status))})</li>"
+        )
+    if not appointments:
+        text_lines.append('No appointments.')
+        html_lines.append('<li>No appointments.</li>')
+    count = str(len(appointments))
+    return (
+        {'appointment_lines': '\n'.join(text_lines), 'appointment_count': count},
+        {'appointment_lines': '\n'.join(html_lines), 'appointment_count': count},
+    )
+
+
+APPOINTMENT_DEFAULTS = {
+    'doctor_name': 'Doctor',
+    'appointment_date': '',
+    'appointment_time': '',
+    'appointment_id': '',
+}
+
+TEMPLATES = {
+    'SIGNUP_WELCOME': EmailTemplate(
+        subject="Welcome to Hospital Management System!",
+        html_body="""
+        <html>
+          <body>
+            <h2>Welcome to HMS, $to_name!</h2>
+            <p>Thank you for signing up as a $role.</p>
+            <p>You can now access your dashboard and start using our services.</p>
+            <p>Best regards,<br>HMS Team</p>
+          </body>
+        </html>
+        """,
+        text_body="""
+        Welcome to HMS, $to_name!
+        
+        Thank you for signing up as a $role.
+        You can now access your dashboard and start using our services.
+        
+        Best regards,
+        HMS Team
+        """,
+        defaults={'role': 'user'},
+    ),
+    'BOOKING_CONFIRMATION': EmailTemplate(
+        subject="Appointment Confirmation - $appointment_date",
+        html_body="""
+        <html>
+          <body>
+            <h2>Appointment Confirmed!</h2>
+            <p>Dear $to_name,</p>
+            <p>Your appointment has been confirmed with the following details:</p>
+            <ul>
+              <li><strong>Doctor:</strong> Dr. $doctor_name</li>
+              <li><strong>Date:</strong> $appointment_date</li>
+              <li><strong>Time:</strong> $appointment_time</li>
+              <li><strong>Appointment ID:</strong> $appointment_id</li>
+            </ul>
+            <p>Please arrive on time for your appointment.</p>
+            <p>Best regards,<br>HMS Team</p>
+          </body>
+        </html>
+        """,
+        text_body="""
+        Appointment Confirmed!
+        
+        Dear $to_name,
+        
+        Your appointment has been confirmed with the following details:
+        
+        Doctor: Dr. $doctor_name
+        Date: $appointment_date
+        Time: $appointment_time
+        Appointment ID: $appointment_id
+        
+        Please arrive on time for your appointment.
+        
+        Best regards,
+        HMS Team
+        """,
+        defaults=APPOINTMENT_DEFAULTS,
+    ),
+    'APPOINTMENT_REMINDER': EmailTemplate(
+        subject="Reminder: Appointment on $appointment_date at $appointment_time",
+        html_body="""
+        <html>
+          <body>
+            <h2>Upcoming Appointment</h2>
+            <p>Dear $to_name,</p>
+            <p>This is a reminder of your upcoming appointment:</p>
+            <ul>
+              <li><strong>Doctor:</strong> Dr. $doctor_name</li>
+              <li><strong>Date:</strong> $appointment_date</li>
+              <li><strong>Time:</strong> $appointment_time</li>
+              <li><strong>Appointment ID:</strong> $appointment_id</li>
+            </ul>
+            <p>If you can no longer attend, please cancel so the slot can go to another patient.</p>
+            <p>Best regards,<br>HMS Team</p>
+          </body>
+        </html>
+        """,
+        text_body="""
+        Upcoming Appointment
+        
+        Dear $to_name,
+        
+        This is a reminder of your upcoming appointment:
+        
+        Doctor: Dr. $doctor_name
+        Date: $appointment_date
+        Time: $appointment_time
+        Appointment ID: $appointment_id
+        
+        If you can no longer attend, please cancel so the slot can go to another patient.
+        
+        Best regards,
+        HMS Team
+        """,
+        defaults=APPOINTMENT_DEFAULTS,
+    ),
+    'BOOKING_CANCELLATION': EmailTemplate(
+        subject="Appointment Cancelled - $appointment_date",
+        html_body="""
+        <html>
+          <body>
+            <h2>Appointment Cancelled</h2>
+            <p>Dear $to_name,</p>
+            <p>The following appointment has been cancelled:</p>
+            <ul>
+              <li><strong>Doctor:</strong> Dr. $doctor_name</li>
+              <li><strong>Date:</strong> $appointment_date</li>
+              <li><strong>Time:</strong> $appointment_time</li>
+              <li><strong>Appointment ID:</strong> $appointment_id</li>
+            </ul>
+            <p>You can book a new slot from your dashboard at any time.</p>
+            <p>Best regards,<br>HMS Team</p>
+          </body>
+        </html>
+        """,
+        text_body="""
+        Appointment Cancelled
+        
+        Dear $to_name,
+        
+        The following appointment has been cancelled:
+        
+        Doctor: Dr. $doctor_name
+        Date: $appointment_date
+        Time: $appointment_time
+        Appointment ID: $appointment_id
+        
+        You can book a new slot from your dashboard at any time.
+        
+        Best regards,
+        HMS Team
+        """,
+        defaults=APPOINTMENT_DEFAULTS,
+    ),
+    'DOCTOR_DAILY_DIGEST': EmailTemplate(
+        subject="Your appointments for $digest_date",
+        html_body="""
+        <html>
+          <body>
+            <h2>Appointments for $digest_date</h2>
+            <p>Dear Dr. $to_name,</p>
+            <p>You have $appointment_count appointment(s):</p>
+            <ul>
+        $appointment_lines
+            </ul>
+            <p>Best regards,<br>HMS Team</p>
+          </body>
+        </html>
+        """,
+        text_body="""
+        Appointments for $digest_date
+        
+        Dear Dr. $to_name,
+        
+        You have $appointment_count appointment(s):
+        
+        $appointment_lines
+        
+        Best regards,
+        HMS Team
+        """,
+        defaults={'digest_date': ''},
+        prepare=_digest_rows,
+    ),
+}
+
+DEFAULT_TEMPLATE = EmailTemplate(
+    subject="Notification from HMS",
+    html_body="<p>Hello $to_name,</p><p>You have a notification from HMS.</p>",
+    text_body="Hello $to_name,\n\nYou have a notification from HMS.",
+)
+
+
+def render(action, body, to_name):
+    """Return (subject, html, text) for an action"""
+    return TEMPLATES.get(action, DEFAULT_TEMPLATE).render(body, to_name)
@@ -1,14 +1,119 @@
 import json
 import os
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+import email_templates
+
+# Largest number of messages accepted in one batch request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '500'))
+
+
+def get_smtp_config():
+    """SMTP settings from the environment, or None when credentials are missing"""
+    smtp_user = os.environ.get('SMTP_USER')
+    smtp_password = os.environ.get('SMTP_PASSWORD')
+    if not smtp_user or not smtp_password:
+        return None
+    return {
+        'host': os.environ.get('SMTP_HOST', 'smtp.gmail.com'),
+        'port': int(os.environ.get('SMTP_PORT', '587')),
+        'user': smtp_user,
+        'password': smtp_password,
+        'from_email': os.environ.get('FROM_EMAIL', smtp_user),
+        # Plain connections are only for local relays and test servers
+        'starttls': os.environ.get('SMTP_STARTTLS', 'true').lower() not in ('0', 'false', 'no'),
+    }
+
+
+def open_smtp(config):
+    """Connect, upgrade to TLS and log in"""
+    server = smtplib.SMTP(config['host'], config['port'], timeout=float(os.environ.get('SMTP_TIMEOUT', '30')))
+    try:
+        if config['starttls']:
+            server.starttls()
+        server.login(config['user'], config['password'])
+    except Exception:
+        _close(server)
+        raise
+    return server
+
+
+class SMTPPool:
+    """Authenticated SMTP connections kept open between invocations
+    
+    A warm Lambda container (or a worker of the long-running service) reuses
+    its connection instead of paying for connect + TLS + login per request.
+    Idle connections are checked with NOOP before reuse and replaced when
+    the server has dropped them.
+    """
+    
+    def __init__(self, config, size=1, max_idle=60):
+        self.config = config
+        self.size = size
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'reused': 0, 'stale': 0}
+    
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, released_at = self._idle.pop()
+            if time.monotonic() - released_at <= self.max_idle and self._healthy(server):
+                self.stats['reused'] += 1
+                return server
+            self.stats['stale'] += 1
+            _close(server)
+        self.stats['opened'] += 1
+        return open_smtp(self.config)
+    
+    def release(self, server):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((server, time.monotonic()))
+                return
+        _close(server)
+    
+    def discard(self, server):
+        _close(server)
+    
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _close(server)
+    
+    @staticmethod
+    def _healthy(server):
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+
+# Read once per container; warm invocations reuse both
+SMTP_CONFIG = get_smtp_config()
+smtp_pool = SMTPPool(
+    SMTP_CONFIG,
+    size=int(os.environ.get('SMTP_POOL_SIZE', '1')),
+    max_idle=float(os.environ.get('SMTP_MAX_IDLE_SECONDS', '60')),
+) if SMTP_CONFIG else None
+
 
 def send_email(event, context):
     """
     AWS Lambda handler for sending emails
-    Supports SIGNUP_WELCOME and BOOKING_CONFIRMATION actions
+    Supports SIGNUP_WELCOME, BOOKING_CONFIRMATION, BOOKING_CANCELLATION,
+    APPOINTMENT_REMINDER and DOCTOR_DAILY_DIGEST actions
+    
+    The body is either one message, or {"messages": [...]} to send a batch
+    over a single SMTP connection.
     """
     try:
         # Parse request body
@@ -17,164 +122,190 @@ def send_email(event, context):
         else:
             body = event.get('body', {})
         
+        if 'messages' in body:
+            return send_batch(body['messages'])
+        
         action = body.get('action')
         to_email = body.get('to_email')
-        to_name = body.get('to_name', 'User')
         
         if not action or not to_email:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Missing required fields: action and to_email'
-                })
-            }
-        
-        # Get SMTP configuration from environment
-        smtp_host = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-        smtp_user = os.environ.get('SMTP_USER')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
-        from_email = os.environ.get('FROM_EMAIL', smtp_user)
-        
-        if not smtp_user or not smtp_password:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'SMTP configuration not set'
-                })
-            }
-        
-        # Prepare email content based on action
-        subject, html_content, text_content = get_email_content(action, body, to_name)
-        
-        # Create email message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = from_email
-        msg['To'] = to_email
-        
-        # Add text and HTML parts
-        text_part = MIMEText(text_content, 'plain')
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(text_part)
-        msg.attach(html_part)
+            return _response(400, {
+                'error': 'Missing required fields: action and to_email'
+            })
         
-        # Send email via SMTP
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.send_message(msg)
+        if smtp_pool is None:
+            return _response(500, {
+                'error': 'SMTP configuration not set'
+            })
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'message': 'Email sent successfully',
-                'to': to_email,
-                'action': action
+        result = deliver([(0, body, build_message(body, SMTP_CONFIG['from_email']))])[0]
+        if result['status'] != 'sent':
+            return _response(500, {
+                'error': result['error']
             })
-        }
+        
+        return _response(200, {
+            'message': 'Email sent successfully',
+            'to': to_email,
+            'action': action
+        })
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': str(e)
-            })
-        }
+        return _response(500, {
+            'error': str(e)
+        })
 
 
-def get_email_content(action, body, to_name):
-    """Generate email content based on action type"""
+def send_batch(messages):
+    """Send a list of messages over one authenticated SMTP connection
     
-    if action == 'SIGNUP_WELCOME':
-        role = body.get('role', 'user')
-        subject = f"Welcome to Hospital Management System!"
-        
-        html_content = f"""
-        <html>
-          <body>
-            <h2>Welcome to HMS, {to_name}!</h2>
-            <p>Thank you for signing up as a {role}.</p>
-            <p>You can now access your dashboard and start using our services.</p>
-            <p>Best regards,<br>HMS Team</p>
-          </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Welcome to HMS, {to_name}!
-        
-        Thank you for signing up as a {role}.
-        You can now access your dashboard and start using our services.
-        
-        Best regards,
-        HMS Team
-        """
-        
-    elif action == 'BOOKING_CONFIRMATION':
-        doctor_name = body.get('doctor_name', 'Doctor')
-        appointment_date = body.get('appointment_date', '')
-        appointment_time = body.get('appointment_time', '')
-        appointment_id = body.get('appointment_id', '')
-        
-        subject = f"Appointment Confirmation - {appointment_date}"
-        
-        html_content = f"""
-        <html>
-          <body>
-            <h2>Appointment Confirmed!</h2>
-            <p>Dear {to_name},</p>
-            <p>Your appointment has been confirmed with the following details:</p>
-            <ul>
-              <li><strong>Doctor:</strong> Dr. {doctor_name}</li>
-              <li><strong>Date:</strong> {appointment_date}</li>
-              <li><strong>Time:</strong> {appointment_time}</li>
-              <li><strong>Appointment ID:</strong> {appointment_id}</li>
-            </ul>
-            <p>Please arrive on time for your appointment.</p>
-            <p>Best regards,<br>HMS Team</p>
-          </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Appointment Confirmed!
-        
-        Dear {to_name},
-        
-        Your appointment has been confirmed with the following details:
-        
-        Doctor: Dr. {doctor_name}
-        Date: {appointment_date}
-        Time: {appointment_time}
-        Appointment ID: {appointment_id}
-        
-        Please arrive on time for your appointment.
-        
-        Best regards,
-        HMS Team
-        """
-        
+    Every message gets its own result. Returns 200 when all were sent, 207
+    when only some were, and 502 when none were.
+    """
+    if not isinstance(messages, list) or not messages:
+        return _response(400, {
+            'error': 'messages must be a non-empty list'
+        })
+    if len(messages) > MAX_BATCH_SIZE:
+        return _response(400, {
+            'error': f'At most {MAX_BATCH_SIZE} messages per batch'
+        })
+    
+    if smtp_pool is None:
+        return _response(500, {
+            'error': 'SMTP configuration not set'
+        })
+    
+    results = []
+    pending = []
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict) or not message.get('action') or not message.get('to_email'):
+            results.append(_result(index, message, 'failed', 'Missing required fields: action and to_email'))
+            continue
+        try:
+            pending.append((index, message, build_message(message, SMTP_CONFIG['from_email'])))
+        except Exception as e:
+            results.append(_result(index, message, 'failed', str(e)))
+    
+    results.extend(deliver(pending))
+    results.sort(key=lambda result: result['index'])
+    sent = sum(1 for result in results if result['status'] == 'sent')
+    failed = len(results) - sent
+    if failed == 0:
+        status_code = 200
+    elif sent:
+        status_code = 207
     else:
-        subject = "Notification from HMS"
-        html_content = f"<p>Hello {to_name},</p><p>You have a notification from HMS.</p>"
-        text_content = f"Hello {to_name},\n\nYou have a notification from HMS."
+        status_code = 502
+    
+    return _response(status_code, {
+        'message': f'Sent {sent} of {len(results)} emails',
+        'sent': sent,
+        'failed': failed,
+        'results': results
+    })
+
+
+def deliver(pending):
+    """Send (index, message, MIME message) tuples over one pooled connection
     
-    return subject, html_content, text_content
+    When no connection can be opened (server down, bad credentials) the rest
+    of the batch fails with that error: one attempt per batch, not one
+    connect and login per message.
+    """
+    results = []
+    server = None
+    pending = list(pending)
+    try:
+        for position, (index, message, msg) in enumerate(pending):
+            retried = False
+            while True:
+                if server is None:
+                    try:
+                        server = smtp_pool.acquire()
+                    except Exception as e:
+                        return results + _failed(pending[position:], e)
+                try:
+                    server.send_message(msg)
+                    results.append(_result(index, message, 'sent'))
+                except smtplib.SMTPServerDisconnected as e:
+                    smtp_pool.discard(server)
+                    server = None
+                    if not retried:
+                        # Retry this message once on a fresh connection
+                        retried = True
+                        continue
+                    results.append(_result(index, message, 'failed', str(e)))
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    # Rejected message; the connection is still usable
+                    results.append(_result(index, message, 'failed', str(e)))
+                except Exception as e:
+                    # The connection is in an unknown state; give up on the batch rather than log in again
+                    smtp_pool.discard(server)
+                    server = None
+                    return results + _failed(pending[position:], e)
+                break
+    finally:
+        if server is not None:
+            smtp_pool.release(server)
+    return results
+
+
+def build_message(body, from_email):
+    """Create the MIME message for one request body"""
+    to_name = body.get('to_name', 'User')
+    
+    # Prepare email content based on action
+    subject, html_content, text_content = get_email_content(body['action'], body, to_name)
+    
+    # Create email message
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = from_email
+    msg['To'] = body['to_email']
+    
+    # Add text and HTML parts
+    msg.attach(MIMEText(text_content, 'plain'))
+    msg.attach(MIMEText(html_content, 'html'))
+    return msg
+
+
+def _failed(pending, error):
+    return [_result(index, message, 'failed', str(error)) for index, message, _ in pending]
 
+
+def _result(index, message, status, error=None):
+    result = {
+        'index': index,
+        'to': message.get('to_email') if isinstance(message, dict) else None,
+        'action': message.get('action') if isinstance(message, dict) else None,
+        'status': status
+    }
+    if error:
+        result['error'] = error
+    return result
+
+
+def _close(server):
+    if server is None:
+        return
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+def _response(status_code, body):
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(body)
+    }
+
+
+def get_email_content(action, body, to_name):
+    """Generate email content based on action type (templates are compiled at import)"""
+    return email_templates.render(action, body, to_name)
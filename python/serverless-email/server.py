@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""
+Long-running email service for on-prem deployments.
+
+Serves the same POST /email API as the Lambda handler (one message, or
+{"messages": [...]}) but answers 202 as soon as the messages are queued.
+A pool of workers drains the queue in the background, each sending over
+its own pooled SMTP connection, so a burst costs one handshake per worker
+rather than one per message.
+
+* 429 with Retry-After when the queue is full (EMAIL_QUEUE_SIZE)
+* GET /health reports queue depth and delivery counters
+* SIGTERM/SIGINT stop accepting requests and drain the queue for up to
+  DRAIN_TIMEOUT seconds before exiting
+
+Usage:
+    python server.py --port 3000 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import handler
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 30
+
+
+class EmailService:
+    def __init__(self, workers=4, queue_size=10000, send_batch=20, drain_timeout=30):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.send_batch = send_batch
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'rejected': 0}
+        # smtplib blocks, so SMTP work runs on threads; one pooled connection each
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='smtp')
+        if handler.smtp_pool is not None:
+            handler.smtp_pool.size = workers
+        self._tasks = []
+        self.connections = set()
+    
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    def enqueue(self, messages):
+        """Queue all messages or none; returns False when there is no room"""
+        if self.queue.maxsize - self.queue.qsize() < len(messages):
+            self.stats['rejected'] += len(messages)
+            return False
+        for message in messages:
+            self.queue.put_nowait(message)
+        self.stats['queued'] += len(messages)
+        return True
+    
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            # Whatever else is already waiting goes over the same connection
+            while len(batch) < self.send_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(self.executor, self._deliver, batch)
+                for result in results:
+                    if result['status'] == 'sent':
+                        self.stats['sent'] += 1
+                    else:
+                        self.stats['failed'] += 1
+                        print(f"Email to {result['to']} failed: {result.get('error')}")
+            except Exception as e:
+                self.stats['failed'] += len(batch)
+                print(f"Email worker error: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    @staticmethod
+    def _deliver(batch):
+        pending = []
+        results = []
+        for index, message in enumerate(batch):
+            try:
+                pending.append((index, message, handler.build_message(message, handler.SMTP_CONFIG['from_email'])))
+            except Exception as e:
+                results.append(handler._result(index, message, 'failed', str(e)))
+        return results + handler.deliver(pending)
+    
+    async def drain(self):
+        self.draining = True
+        try:
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Drain timed out with {self.queue.qsize()} emails still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        if handler.smtp_pool is not None:
+            handler.smtp_pool.close_all()
+    
+    def handle(self, method, path, body):
+        """Return (status, payload) for one request"""
+        if path == '/health' and method == 'GET':
+            return 200, {
+                'status': 'draining' if self.draining else 'ok',
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'workers': self.workers,
+                **self.stats
+            }
+        if path != '/email':
+            return 404, {'error': 'Not found'}
+        if method == 'OPTIONS':
+            return 204, None
+        if method != 'POST':
+            return 405, {'error': 'Method not allowed'}
+        if self.draining:
+            return 503, {'error': 'Service is shutting down'}
+        if handler.smtp_pool is None:
+            return 500, {'error': 'SMTP configuration not set'}
+        
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'Body must be JSON'}
+        if not isinstance(data, dict):
+            return 400, {'error': 'Body must be a JSON object'}
+        
+        messages = data['messages'] if 'messages' in data else [data]
+        if not isinstance(messages, list) or not messages:
+            return 400, {'error': 'messages must be a non-empty list'}
+        if len(messages) > handler.MAX_BATCH_SIZE:
+            return 400, {'error': f'At most {handler.MAX_BATCH_SIZE} messages per batch'}
+        invalid = [
+            index for index, message in enumerate(messages)
+            if not isinstance(message, dict) or not message.get('action') or not message.get('to_email')
+        ]
+        if invalid:
+            return 400, {'error': 'Missing required fields: action and to_email', 'invalid': invalid}
+        
+        if not self.enqueue(messages):
+            return 429, {'error': 'Email queue is full', 'queue_depth': self.queue.qsize()}
+        return 202, {'message': f'Queued {len(messages)} emails', 'queued': len(messages)}
+
+
+REASONS = {
+    200: 'OK', 202: 'Accepted', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large', 429: 'Too Many Requests',
+    500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+async def serve_connection(service, reader, writer):
+    """Minimal HTTP/1.1 with keep-alive"""
+    service.connections.add(writer)
+    try:
+        while True:
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            
+            length = int(headers.get('content-length') or 0)
+            if length > MAX_BODY_BYTES:
+                status, payload = 413, {'error': 'Request body too large'}
+                keep_alive = False
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, payload = service.handle(method.upper(), target.split('?')[0], body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            
+            content = json.dumps(payload).encode() if payload is not None else b''
+            response_headers = [
+                f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+                'Content-Type: application/json',
+                f'Content-Length: {len(content)}',
+                'Access-Control-Allow-Origin: *',
+                'Access-Control-Allow-Headers: Content-Type',
+                'Access-Control-Allow-Methods: POST, OPTIONS',
+                f'Connection: {"keep-alive" if keep_alive else "close"}',
+            ]
+            if status == 429:
+                response_headers.append('Retry-After: 1')
+            writer.write(('\r\n'.join(response_headers) + '\r\n\r\n').encode('latin-1') + content)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        service.connections.discard(writer)
+        writer.close()
+
+
+async def main(args):
+    service = EmailService(
+        workers=args.workers,
+        queue_size=args.queue_size,
+        send_batch=args.send_batch,
+        drain_timeout=args.drain_timeout,
+    )
+    service.start()
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_connection(service, reader, writer),
+        args.host, args.port
+    )
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    
+    print(f"Email service listening on http://{args.host}:{args.port}/email with {args.workers} workers")
+    await stop.wait()
+    
+    # Refuse new work, finish what is queued, then close
+    started = time.monotonic()
+    server.close()
+    await service.drain()
+    # Idle keep-alive clients see EOF and their handlers return
+    for writer in list(service.connections):
+        writer.close()
+    await asyncio.sleep(0.1)
+    await server.wait_closed()
+    print(f"Drained in {time.monotonic() - started:.1f}s: {service.stats}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the email service as a long-lived HTTP server')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '3000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('EMAIL_WORKERS', '4')))
+    parser.add_argument('--queue-size', type=int, default=int(os.environ.get('EMAIL_QUEUE_SIZE', '10000')))
+    parser.add_argument('--send-batch', type=int, default=int(os.environ.get('EMAIL_SEND_BATCH', '20')),
+                        help='Most messages a worker sends per connection checkout')
+    parser.add_argument('--drain-timeout', type=float, default=float(os.environ.get('DRAIN_TIMEOUT', '30')))
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -1,8 +1,19 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .bulk_import import IMPORT_FORMATS, UserImporter, detect_format, read_rows, text_stream
 from .models import User, DoctorProfile, PatientProfile
 
 
+class UserImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV with a header row, or JSON Lines (.jsonl)')
+    send_welcome = forms.BooleanField(required=False, initial=True, label='Send welcome emails')
+    dry_run = forms.BooleanField(required=False, label='Validate only')
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'role', 'is_active', 'date_joined')
@@ -14,6 +25,51 @@ class UserAdmin(BaseUserAdmin):
     add_fieldsets = BaseUserAdmin.add_fieldsets + (
         ('Role Information', {'fields': ('role', 'email', 'phone_number')}),
     )
+    change_list_template = 'admin/users/user/change_list.html'
+    
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='users_user_import'),
+        ]
+        return urls + super().get_urls()
+    
+    def import_view(self, request):
+        """Bulk import users from an uploaded CSV/JSONL file"""
+        if not self.has_add_permission(request):
+            return redirect('admin:users_user_changelist')
+        
+        form = UserImportForm(request.POST or None, request.FILES or None)
+        report = None
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            # Hash in this process: a pool would fork the web worker per upload.
+            # Large files belong to manage.py import_users, which uses one.
+            importer = UserImporter(
+                workers=1,
+                send_welcome=form.cleaned_data['send_welcome'],
+                dry_run=form.cleaned_data['dry_run'],
+            )
+            report = importer.run(read_rows(text_stream(upload), detect_format(upload.name)))
+            level = messages.WARNING if report.errors else messages.SUCCESS
+            self.message_user(
+                request,
+                f'{report.rows} rows in {report.elapsed:.2f}s ({report.rows_per_second:.0f} rows/s): '
+                f'{report.created} created, {len(report.errors)} rejected, '
+                f'{report.emails_sent} welcome emails sent',
+                level
+            )
+            if not report.errors:
+                return redirect('admin:users_user_changelist')
+        
+        context = dict(
+            self.admin_site.each_context(request),
+            title='Import users',
+            opts=self.model._meta,
+            form=form,
+            report=report,
+            formats=IMPORT_FORMATS,
+        )
+        return TemplateResponse(request, 'admin/users/user/import_users.html', context)
 
 
 @admin.register(DoctorProfile)
@@ -24,4 +80,3 @@ class DoctorProfileAdmin(admin.ModelAdmin):
 @admin.register(PatientProfile)
 class PatientProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'date_of_birth', 'emergency_contact')
-
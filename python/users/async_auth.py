@@ -0,0 +1,30 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+
+from .authentication import bearer_token
+from .middleware import get_cached_user
+from .tokens import InvalidToken, verify_access_token
+
+
+def _get_user(request):
+    token = bearer_token(request)
+    if token is not None:
+        try:
+            return verify_access_token(token)[0]
+        except InvalidToken:
+            return AnonymousUser()
+    return get_cached_user(request)
+
+
+async def aget_user(request):
+    """Resolve the requesting user from an async view without blocking the event loop"""
+    return await sync_to_async(_get_user)(request)
+
+
+def authentication_required():
+    return JsonResponse({
+        'error': 'Authentication required',
+        'message': 'Please login first',
+        'login_url': '/api/auth/login/'
+    }, status=401)
@@ -0,0 +1,61 @@
+"""Async variants of the read-only user views, for the ASGI application"""
+from django.http import JsonResponse
+
+from .async_auth import aget_user
+from .models import User, DoctorProfile
+from .serializers import UserSerializer
+
+
+async def auth_status(request):
+    """Async variant of views.auth_status"""
+    user = await aget_user(request)
+    if user.is_authenticated:
+        return JsonResponse({
+            'authenticated': True,
+            'user': UserSerializer(user).data,
+            'message': 'You are logged in'
+        })
+    return JsonResponse({
+        'authenticated': False,
+        'message': 'You are not logged in. Please login at /api/auth/login/',
+        'login_url': '/api/auth/login/',
+        'signup_url': '/api/auth/signup/'
+    })
+
+
+async def list_doctors(request):
+    """Async variant of views.list_doctors"""
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse({
+            'error': 'Authentication required',
+            'message': 'Please login first to view doctors',
+            'login_url': '/api/auth/login/',
+            'signup_url': '/api/auth/signup/'
+        }, status=401)
+    
+    if not user.is_patient:
+        return JsonResponse({
+            'error': 'Permission denied',
+            'message': 'Only patients can view the list of doctors',
+            'your_role': user.role
+        }, status=403)
+    
+    doctors_data = []
+    async for doctor in User.objects.filter(role='doctor', is_active=True).select_related('doctor_profile'):
+        try:
+            profile = doctor.doctor_profile
+            specialization, bio = profile.specialization, profile.bio
+        except DoctorProfile.DoesNotExist:
+            specialization, bio = '', ''
+        doctors_data.append({
+            'id': doctor.id,
+            'username': doctor.username,
+            'email': doctor.email,
+            'first_name': doctor.first_name,
+            'last_name': doctor.last_name,
+            'specialization': specialization,
+            'bio': bio
+        })
+    
+    return JsonResponse(doctors_data, safe=False)
@@ -0,0 +1,30 @@
+from rest_framework import authentication, exceptions
+
+from .tokens import InvalidToken, verify_access_token
+
+KEYWORD = 'Bearer'
+
+
+def bearer_token(request):
+    """The raw token from an ``Authorization: Bearer`` header, if any"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    parts = header.split()
+    if len(parts) == 2 and parts[0] == KEYWORD:
+        return parts[1]
+    return None
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """DRF authentication for stateless signed access tokens (see users.tokens)"""
+
+    def authenticate(self, request):
+        token = bearer_token(request)
+        if token is None:
+            return None
+        try:
+            return verify_access_token(token)
+        except InvalidToken as e:
+            raise exceptions.AuthenticationFailed(str(e))
+
+    def authenticate_header(self, request):
+        return KEYWORD
@@ -0,0 +1,243 @@
+"""
+Bulk user import for onboarding a hospital.
+
+Rows come from CSV (with a header row) or JSON Lines, one user per row:
+email, username, role and optionally password, first_name, last_name,
+phone_number plus the profile fields of the role (specialization, bio,
+license_number for doctors; date_of_birth, address, emergency_contact,
+emergency_phone for patients). Rows without a password get an unusable one
+and cannot log in until a password is set.
+
+Rows are processed in batches: each batch is validated with one query for
+clashing emails/usernames, its passwords are hashed across a process pool,
+and users and profiles are inserted with bulk_create in one transaction.
+Welcome emails for every created user are sent at the end as one batch.
+"""
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import BaseUserManager
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from hms_project import email_client
+from .models import User, DoctorProfile, PatientProfile
+from .serializers import UserImportSerializer
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 500
+
+USER_FIELDS = ('first_name', 'last_name', 'phone_number')
+DOCTOR_FIELDS = ('specialization', 'bio', 'license_number')
+PATIENT_FIELDS = ('address', 'emergency_contact', 'emergency_phone')
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, import_format):
+    """Yield (line number, row dict) from a text stream"""
+    if import_format == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_no, row if isinstance(row, dict) else None
+    else:
+        # Line 1 is the header
+        for line_no, row in enumerate(csv.DictReader(stream), start=2):
+            # Empty cells mean "not given", not "blank"
+            yield line_no, {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+
+
+def text_stream(uploaded_file):
+    """Wrap a binary upload (admin) as text"""
+    return io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.emails_sent = 0
+        self.errors = []
+        self.elapsed = 0.0
+    
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+    
+    def error(self, line_no, errors):
+        self.errors.append((line_no, {
+            field: [str(message) for message in messages] for field, messages in errors.items()
+        }))
+
+
+def _init_worker():
+    # Spawned workers (macOS/Windows) start without configured settings
+    import django
+    django.setup()
+
+
+class UserImporter:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, workers=None, send_welcome=True, dry_run=False):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.send_welcome = send_welcome
+        self.dry_run = dry_run
+        self._seen_emails = set()
+        self._seen_usernames = set()
+        self._welcome = []
+    
+    def run(self, rows):
+        report = ImportReport()
+        started = time.monotonic()
+        pool = None
+        if self.workers > 1 and not self.dry_run:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        try:
+            batch = []
+            for item in rows:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, pool, report)
+                    batch = []
+            if batch:
+                self._import_batch(batch, pool, report)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        
+        report.errors.sort(key=lambda error: error[0])
+        if self._welcome and self.send_welcome and not self.dry_run:
+            report.emails_sent = email_client.send_batch(self._welcome)
+        report.elapsed = time.monotonic() - started
+        return report
+    
+    def _validate(self, batch, report):
+        valid = []
+        for line_no, row in batch:
+            report.rows += 1
+            if row is None:
+                report.error(line_no, {'row': ['Not a JSON object']})
+                continue
+            serializer = UserImportSerializer(data=row)
+            if not serializer.is_valid():
+                report.error(line_no, serializer.errors)
+                continue
+            data = serializer.validated_data
+            data['email'] = BaseUserManager.normalize_email(data['email'])
+            if data['email'] in self._seen_emails:
+                report.error(line_no, {'email': ['Duplicate email in import file']})
+                continue
+            if data['username'] in self._seen_usernames:
+                report.error(line_no, {'username': ['Duplicate username in import file']})
+                continue
+            self._seen_emails.add(data['email'])
+            self._seen_usernames.add(data['username'])
+            valid.append((line_no, data))
+        
+        if not valid:
+            return valid
+        
+        # One query for every clash with existing accounts in this batch
+        taken = User.objects.filter(
+            Q(email__in=[data['email'] for _, data in valid]) |
+            Q(username__in=[data['username'] for _, data in valid])
+        ).values_list('email', 'username')
+        taken_emails = set()
+        taken_usernames = set()
+        for email, username in taken:
+            taken_emails.add(email)
+            taken_usernames.add(username)
+        
+        accepted = []
+        for line_no, data in valid:
+            if data['email'] in taken_emails:
+                report.error(line_no, {'email': ['A user with this email already exists']})
+            elif data['username'] in taken_usernames:
+                report.error(line_no, {'username': ['A user with this username already exists']})
+            else:
+                accepted.append((line_no, data))
+        return accepted
+    
+    def _hash_passwords(self, rows, pool):
+        passwords = [data.get('password') or None for _, data in rows]
+        to_hash = [password for password in passwords if password]
+        if pool is not None and to_hash:
+            chunksize = max(1, len(to_hash) // (self.workers * 4))
+            hashed = iter(pool.map(make_password, to_hash, chunksize=chunksize))
+        else:
+            hashed = iter(map(make_password, to_hash))
+        # make_password(None) is an unusable password and costs nothing
+        return [next(hashed) if password else make_password(None) for password in passwords]
+    
+    def _import_batch(self, batch, pool, report):
+        rows = self._validate(batch, report)
+        if not rows or self.dry_run:
+            return
+        
+        hashes = self._hash_passwords(rows, pool)
+        users = [
+            User(
+                email=data['email'],
+                username=data['username'],
+                role=data['role'],
+                password=password_hash,
+                **{field: data.get(field, '') for field in USER_FIELDS}
+            )
+            for (_, data), password_hash in zip(rows, hashes)
+        ]
+        
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                if any(user.pk is None for user in users):
+                    # Backends that cannot return ids from a bulk insert
+                    ids = dict(User.objects.filter(email__in=[user.email for user in users]).values_list('email', 'id'))
+                    for user in users:
+                        user.pk = ids[user.email]
+                
+                doctor_profiles = []
+                patient_profiles = []
+                for (_, data), user in zip(rows, users):
+                    if user.role == 'doctor':
+                        doctor_profiles.append(DoctorProfile(
+                            user=user, **{field: data.get(field, '') for field in DOCTOR_FIELDS}
+                        ))
+                    else:
+                        patient_profiles.append(PatientProfile(
+                            user=user,
+                            date_of_birth=data.get('date_of_birth'),
+                            **{field: data.get(field, '') for field in PATIENT_FIELDS}
+                        ))
+                DoctorProfile.objects.bulk_create(doctor_profiles)
+                PatientProfile.objects.bulk_create(patient_profiles)
+        except IntegrityError as e:
+            # Someone created a clashing account mid-import; report the whole batch
+            for line_no, _ in rows:
+                report.error(line_no, {'row': [f'Batch rolled back: {e}']})
+            return
+        
+        report.created += len(users)
+        self._welcome.extend(
+            {
+                'action': 'SIGNUP_WELCOME',
+                'to_email': user.email,
+                'to_name': user.get_full_name() or user.username,
+                'role': user.role
+            }
+            for user in users
+        )
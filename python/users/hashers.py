@@ -0,0 +1,73 @@
+"""
+Password hashing cost and concurrency.
+
+PBKDF2 cost is set with PASSWORD_HASH_ITERATIONS. Django rehashes a stored
+password on the next successful login whenever its iteration count differs,
+so raising or lowering the cost needs no migration.
+
+Credential checks run on a small dedicated thread pool. At most
+PASSWORD_HASH_WORKERS hashes run at once and at most PASSWORD_HASH_QUEUE
+more may wait, so a burst of logins cannot take every request worker (or
+every CPU) away from the rest of the API; beyond that callers get
+HashingBusy straight away.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.db import close_old_connections
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from settings"""
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+class HashingBusy(Exception):
+    """Too many credential checks are already running or queued"""
+
+
+class HashingPool:
+    def __init__(self, workers, queue):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + queue)
+
+    def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on the pool and wait for its result"""
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy('Password hashing is saturated')
+        try:
+            return self.executor.submit(self._call, fn, args, kwargs).result()
+        finally:
+            self.slots.release()
+
+    @staticmethod
+    def _call(fn, args, kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # Pool threads live outside the request cycle
+            close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(
+                workers=getattr(settings, 'PASSWORD_HASH_WORKERS', 2),
+                queue=getattr(settings, 'PASSWORD_HASH_QUEUE', 16),
+            )
+    return _pool
+
+
+def run_hashing(fn, *args, **kwargs):
+    return hashing_pool().run(fn, *args, **kwargs)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.bulk_import import DEFAULT_BATCH_SIZE, IMPORT_FORMATS, UserImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import doctors and patients from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header) or .jsonl file')
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS,
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, help='Password hashing processes (defaults to CPU count)')
+        parser.add_argument('--no-email', action='store_true', help='Do not send welcome emails')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only')
+
+    def handle(self, *args, **options):
+        import_format = options['import_format'] or detect_format(options['path'])
+        importer = UserImporter(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            send_welcome=not options['no_email'],
+            dry_run=options['dry_run'],
+        )
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = importer.run(read_rows(stream, import_format))
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["path"]}: {e}')
+
+        for line_no, errors in report.errors:
+            self.stderr.write(f'Line {line_no}: {errors}')
+
+        action = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {report.rows} rows in {report.elapsed:.2f}s '
+            f'({report.rows_per_second:.0f} rows/s): {report.created} created, '
+            f'{len(report.errors)} rejected, {report.emails_sent} welcome emails sent'
+        ))
@@ -0,0 +1,91 @@
+"""
+Session middleware that keeps authenticated reads off the database.
+
+* CachedAuthenticationMiddleware resolves ``request.user`` from the cache,
+  falling back to the normal backend lookup (and session hash check) on a
+  miss. Cached users are dropped whenever the user row is saved or deleted
+  (see ``users.signals``).
+* SlidingSessionMiddleware replaces SESSION_SAVE_EVERY_REQUEST: the session
+  expiry is pushed forward at most once per SESSION_REFRESH_INTERVAL
+  seconds instead of on every request.
+"""
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+REFRESHED_SESSION_KEY = '_refreshed_at'
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def get_cached_user(request):
+    """Like django.contrib.auth.get_user, but served from the cache when possible"""
+    try:
+        user_id = request.session[SESSION_KEY]
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+        return user
+
+    # Same session verification auth.get_user() does, against the cached row
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: self._get_user(request))
+
+    def _get_user(self, request):
+        if not hasattr(request, '_cached_user'):
+            request._cached_user = get_cached_user(request)
+        return request._cached_user
+
+
+class SlidingSessionMiddleware:
+    """Extend session expiry at most once per SESSION_REFRESH_INTERVAL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        if session is None or settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return response
+        if session.is_empty() or session.modified:
+            return response
+
+        now = int(time.time())
+        interval = getattr(settings, 'SESSION_REFRESH_INTERVAL', 300)
+        if now - session.get(REFRESHED_SESSION_KEY, 0) >= interval:
+            # SessionMiddleware saves the session and re-issues the cookie
+            session[REFRESHED_SESSION_KEY] = now
+        return response
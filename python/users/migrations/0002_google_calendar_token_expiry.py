@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:30
+
+import json
+from datetime import timezone
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def backfill_token_expiry(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    users = User.objects.filter(google_calendar_token__isnull=False, google_calendar_token_expiry__isnull=True)
+    for user in users.only('id', 'google_calendar_token').iterator():
+        try:
+            expiry = parse_datetime(json.loads(user.google_calendar_token).get('expiry') or '')
+        except (ValueError, AttributeError):
+            continue
+        if expiry is not None:
+            if expiry.tzinfo is None:
+                # google-auth stores naive UTC
+                expiry = expiry.replace(tzinfo=timezone.utc)
+            User.objects.filter(pk=user.pk).update(google_calendar_token_expiry=expiry)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='google_calendar_token_expiry',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_token_expiry, migrations.RunPython.noop),
+    ]
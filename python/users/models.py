@@ -18,6 +18,8 @@ class User(AbstractUser):
     # Google Calendar OAuth token storage
     google_calendar_token = models.TextField(blank=True, null=True)
     google_calendar_refresh_token = models.TextField(blank=True, null=True)
+    # Access token expiry, indexed for the background refresher
+    google_calendar_token_expiry = models.DateTimeField(blank=True, null=True, db_index=True)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'role']
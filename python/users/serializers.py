@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from .models import User, DoctorProfile, PatientProfile
 
 
@@ -52,3 +53,30 @@ class SignUpSerializer(serializers.ModelSerializer):
         
         return user
 
+
+
+class UserImportSerializer(serializers.Serializer):
+    """One row of a bulk user import (users.bulk_import)"""
+    email = serializers.EmailField(max_length=254)
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES)
+    password = serializers.CharField(required=False, allow_blank=True)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    phone_number = serializers.CharField(max_length=15, required=False, allow_blank=True)
+    
+    # Doctor profile
+    specialization = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    bio = serializers.CharField(required=False, allow_blank=True)
+    license_number = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    
+    # Patient profile
+    date_of_birth = serializers.DateField(required=False, allow_null=True)
+    address = serializers.CharField(required=False, allow_blank=True)
+    emergency_contact = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    emergency_phone = serializers.CharField(max_length=15, required=False, allow_blank=True)
+    
+    def validate_password(self, value):
+        if value:
+            validate_password(value)
+        return value
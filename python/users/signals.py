@@ -0,0 +1,21 @@
+import time
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .middleware import REFRESHED_SESSION_KEY, invalidate_cached_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached copy used by CachedAuthenticationMiddleware"""
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(user_logged_in)
+def session_started(sender, request, user, **kwargs):
+    """A new session is fresh; don't refresh it again on the next request"""
+    if hasattr(request, 'session'):
+        request.session[REFRESHED_SESSION_KEY] = int(time.time())
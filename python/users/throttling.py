@@ -0,0 +1,58 @@
+"""
+Failed-login counters kept in the cache.
+
+Failures are counted per client IP and per username in fixed windows of
+LOGIN_ATTEMPT_WINDOW seconds. Once either counter reaches its limit the
+login view answers 429 before any password is hashed. A successful login
+clears the username counter; the IP counter simply expires.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _window():
+    return getattr(settings, 'LOGIN_ATTEMPT_WINDOW', 15 * 60)
+
+
+def client_ip(request):
+    if getattr(settings, 'LOGIN_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _keys(request, username):
+    # Hash the username so arbitrary input never ends up in a cache key
+    digest = hashlib.sha256(username.strip().lower().encode()).hexdigest()
+    return {
+        f'login:fail:ip:{client_ip(request)}': getattr(settings, 'LOGIN_MAX_ATTEMPTS_PER_IP', 50),
+        f'login:fail:user:{digest}': getattr(settings, 'LOGIN_MAX_ATTEMPTS_PER_USER', 5),
+    }
+
+
+def is_locked_out(request, username):
+    keys = _keys(request, username)
+    counts = cache.get_many(list(keys))
+    return any(counts.get(key, 0) >= limit for key, limit in keys.items())
+
+
+def record_failure(request, username):
+    for key in _keys(request, username):
+        # add() starts the window; incr() never extends it
+        if not cache.add(key, 1, _window()):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.add(key, 1, _window())
+
+
+def clear_failures(request, username):
+    cache.delete_many([key for key in _keys(request, username) if key.startswith('login:fail:user:')])
+
+
+def retry_after():
+    return _window()
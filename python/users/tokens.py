@@ -0,0 +1,147 @@
+"""
+Stateless signed API tokens.
+
+Access tokens carry the user's id and the handful of fields the API reads
+on every request, signed with SECRET_KEY. Verifying one needs no database
+access: the user is rebuilt in memory with every other field deferred, so a
+view that does need e.g. the calendar token still lazily loads just that
+column, and ``save()`` only writes back loaded fields.
+
+Revocation is kept in the cache: one short-lived key per revoked token id
+(expiring with the token itself) plus a per-user epoch that invalidates
+every token issued before it. Both are fetched with a single get_many.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from .models import User
+
+ACCESS_SALT = 'users.tokens.access'
+REFRESH_SALT = 'users.tokens.refresh'
+
+# User fields embedded in access tokens and restored without a query,
+# in model field order as Model.from_db() expects
+CLAIM_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in (
+        'id', 'username', 'email', 'role', 'first_name', 'last_name',
+        'phone_number', 'is_active', 'is_staff', 'is_superuser',
+    )
+)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def access_token_lifetime():
+    return getattr(settings, 'API_ACCESS_TOKEN_LIFETIME', 15 * 60)
+
+
+def refresh_token_lifetime():
+    return getattr(settings, 'API_REFRESH_TOKEN_LIFETIME', 14 * 24 * 60 * 60)
+
+
+def _revoked_key(jti):
+    return f'token:revoked:{jti}'
+
+
+def _epoch_key(user_id):
+    return f'token:epoch:{user_id}'
+
+
+def _sign(payload, salt):
+    return signing.dumps(payload, salt=salt, compress=True)
+
+
+def issue_tokens(user):
+    """New access/refresh token pair for a user"""
+    now = int(time.time())
+    # Issue time in milliseconds, compared against the per-user revocation epoch
+    issued = int(time.time() * 1000)
+    access = {
+        'jti': uuid.uuid4().hex,
+        'iat': issued,
+        'exp': now + access_token_lifetime(),
+        'usr': [getattr(user, name) for name in CLAIM_FIELDS],
+    }
+    refresh = {
+        'jti': uuid.uuid4().hex,
+        'iat': issued,
+        'exp': now + refresh_token_lifetime(),
+        'uid': user.pk,
+    }
+    return {
+        'token_type': 'Bearer',
+        'access': _sign(access, ACCESS_SALT),
+        'refresh': _sign(refresh, REFRESH_SALT),
+        'expires_in': access_token_lifetime(),
+    }
+
+
+def _verify(token, salt, user_id_of):
+    try:
+        payload = signing.loads(token, salt=salt)
+    except signing.BadSignature:
+        raise InvalidToken('Token signature is invalid')
+
+    now = time.time()
+    if payload.get('exp', 0) < now:
+        raise InvalidToken('Token has expired')
+
+    user_id = user_id_of(payload)
+    state = cache.get_many([_revoked_key(payload['jti']), _epoch_key(user_id)])
+    if state.get(_revoked_key(payload['jti'])):
+        raise InvalidToken('Token has been revoked')
+    if payload.get('iat', 0) < state.get(_epoch_key(user_id), 0):
+        raise InvalidToken('Token has been revoked')
+    return payload
+
+
+def verify_access_token(token):
+    """Return (user, payload) for a valid access token, without touching the database"""
+    payload = _verify(token, ACCESS_SALT, lambda p: p['usr'][CLAIM_FIELDS.index('id')])
+    user = User.from_db('default', CLAIM_FIELDS, payload['usr'])
+    if not user.is_active:
+        raise InvalidToken('User account is disabled')
+    return user, payload
+
+
+def refresh_tokens(refresh_token):
+    """Rotate a refresh token into a fresh token pair"""
+    payload = _verify(refresh_token, REFRESH_SALT, lambda p: p['uid'])
+    # Reload so role/name changes and deactivation take effect on refresh
+    try:
+        user = User.objects.get(pk=payload['uid'], is_active=True)
+    except User.DoesNotExist:
+        raise InvalidToken('User not found or disabled')
+    revoke_payload(payload)
+    return user, issue_tokens(user)
+
+
+def revoke_payload(payload):
+    """Revoke one token until it would have expired anyway"""
+    ttl = int(payload['exp'] - time.time()) + 1
+    if ttl > 0:
+        cache.set(_revoked_key(payload['jti']), 1, ttl)
+
+
+def revoke_token(token):
+    """Revoke an access or refresh token; invalid tokens are ignored"""
+    for salt in (ACCESS_SALT, REFRESH_SALT):
+        try:
+            payload = signing.loads(token, salt=salt)
+        except signing.BadSignature:
+            continue
+        revoke_payload(payload)
+        return True
+    return False
+
+
+def revoke_all_tokens(user):
+    """Invalidate every token issued to a user so far"""
+    cache.set(_epoch_key(user.pk), int(time.time() * 1000) + 1, refresh_token_lifetime())
@@ -5,6 +5,7 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('token/refresh/', views.token_refresh, name='token_refresh'),
     path('status/', views.auth_status, name='auth_status'),
     path('me/', views.current_user, name='current_user'),
     path('dashboard/', views.dashboard, name='dashboard'),
@@ -1,13 +1,23 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, parser_classes
 from rest_framework.response import Response
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django.contrib.auth import authenticate, login, logout
 from django.views.decorators.csrf import csrf_exempt
+from django.db.models import Count, Q
+from django.utils import timezone
 from .serializers import UserSerializer, SignUpSerializer, DoctorProfileSerializer, PatientProfileSerializer
 from .models import User, DoctorProfile, PatientProfile
-import requests
-from django.conf import settings
+from .tokens import InvalidToken, issue_tokens, refresh_tokens, revoke_all_tokens, revoke_payload, revoke_token
+from .hashers import HashingBusy, run_hashing
+from .throttling import clear_failures, is_locked_out, record_failure, retry_after
+from appointments.models import Appointment
+from hms_project import email_client
+
+# How many upcoming visits the patient dashboard returns
+DEFAULT_UPCOMING_APPOINTMENTS = 5
+MAX_UPCOMING_APPOINTMENTS = 20
 
 
 @api_view(['GET', 'POST'])
@@ -47,7 +57,7 @@ def signup(request):
                 'to_name': user.get_full_name() or user.username,
                 'role': user.role
             }
-            requests.post(settings.EMAIL_SERVICE_URL, json=email_data, timeout=5)
+            email_client.send(email_data)
         except Exception as e:
             # Log error but don't fail signup
             print(f"Email service error: {e}")
@@ -79,6 +89,8 @@ def signup(request):
 
 
 @api_view(['GET', 'POST'])
+# No bearer authentication: an expired access token still sent by the client must not block a new login
+@authentication_classes([SessionAuthentication])
 @permission_classes([permissions.AllowAny])
 @parser_classes([JSONParser, MultiPartParser, FormParser])
 def login_view(request):
@@ -106,7 +118,27 @@ def login_view(request):
             'required_fields': ['username', 'password']
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    user = authenticate(request, username=username, password=password)
+    # Refuse abusive clients before spending any time on hashing
+    if is_locked_out(request, username):
+        return Response({
+            'error': 'Too many login attempts',
+            'message': 'Too many failed login attempts. Please wait and try again.',
+            'retry_after': retry_after()
+        }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(retry_after())})
+    
+    try:
+        user = run_hashing(authenticate, request, username=username, password=password)
+    except HashingBusy:
+        return Response({
+            'error': 'Service busy',
+            'message': 'Too many logins are being processed right now. Please try again shortly.'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+    
+    if user is None:
+        record_failure(request, username)
+    else:
+        clear_failures(request, username)
+    
     if user is not None:
         if not user.is_active:
             return Response({
@@ -114,15 +146,21 @@ def login_view(request):
                 'message': 'Your account has been disabled. Please contact support.'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        login(request, user)
-        return Response({
+        response_data = {
             'message': 'Login successful',
             'user': UserSerializer(user).data,
             'next_steps': {
                 'dashboard': 'Visit /api/auth/dashboard/ to see your dashboard',
                 'appointments': 'Visit /api/appointments/ to manage appointments'
             }
-        }, status=status.HTTP_200_OK)
+        }
+        
+        # API clients ask for signed tokens instead of a session
+        if str(request.data.get('token', '')).lower() in ('1', 'true'):
+            response_data['tokens'] = issue_tokens(user)
+        else:
+            login(request, user)
+        return Response(response_data, status=status.HTTP_200_OK)
     
     return Response({
         'error': 'Invalid credentials',
@@ -153,7 +191,15 @@ def logout_view(request):
             'login_url': '/api/auth/login/'
         }, status=status.HTTP_200_OK)
     
-    logout(request)
+    if isinstance(request.auth, dict):
+        # Token client: revoke the access token (and refresh token, if sent)
+        revoke_payload(request.auth)
+        if request.data.get('refresh'):
+            revoke_token(request.data['refresh'])
+        if str(request.data.get('all', '')).lower() in ('1', 'true'):
+            revoke_all_tokens(request.user)
+    else:
+        logout(request)
     return Response({
         'message': 'Logout successful',
         'next_steps': {
@@ -162,6 +208,35 @@ def logout_view(request):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+# The refresh token in the body is the credential; ignore a stale access token in the header
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def token_refresh(request):
+    """Exchange a refresh token for a new access/refresh token pair"""
+    refresh = request.data.get('refresh')
+    if not refresh:
+        return Response({
+            'error': 'Missing required fields',
+            'message': 'A refresh token is required',
+            'required_fields': ['refresh']
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        user, tokens = refresh_tokens(refresh)
+    except InvalidToken as e:
+        return Response({
+            'error': 'Invalid token',
+            'message': str(e),
+            'login_url': '/api/auth/login/'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response({
+        'user': UserSerializer(user).data,
+        'tokens': tokens
+    })
+
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def auth_status(request):
@@ -233,12 +308,61 @@ def dashboard(request):
     else:
         profile_data = None
     
-    return Response({
+    data = {
         'user': UserSerializer(user).data,
         'profile': profile_data,
         'role': user.role,
         'message': f'Welcome to your {user.role} dashboard!'
-    })
+    }
+    if user.is_patient:
+        data.update(patient_appointment_summary(user, request.query_params.get('upcoming_limit')))
+    
+    return Response(data)
+
+
+def patient_appointment_summary(user, limit=None):
+    """Next confirmed visits and appointment counts for a patient's dashboard"""
+    try:
+        limit = min(max(int(limit), 1), MAX_UPCOMING_APPOINTMENTS)
+    except (TypeError, ValueError):
+        limit = DEFAULT_UPCOMING_APPOINTMENTS
+    
+    today = timezone.now().date()
+    
+    # Both queries stay on the (patient, status, slot_date) index
+    counts = Appointment.objects.filter(patient=user).aggregate(
+        upcoming=Count('id', filter=Q(status='confirmed', slot_date__gte=today)),
+        completed=Count('id', filter=Q(status='completed')),
+        cancelled=Count('id', filter=Q(status='cancelled'))
+    )
+    upcoming = Appointment.objects.filter(
+        patient=user,
+        status='confirmed',
+        slot_date__gte=today
+    ).select_related('doctor', 'doctor__doctor_profile', 'slot').order_by('slot_date', 'slot__start_time')[:limit]
+    
+    upcoming_data = []
+    for apt in upcoming:
+        try:
+            specialization = apt.doctor.doctor_profile.specialization
+        except DoctorProfile.DoesNotExist:
+            specialization = ''
+        upcoming_data.append({
+            'id': apt.id,
+            'doctor_id': apt.doctor_id,
+            'doctor_name': apt.doctor.get_full_name() or apt.doctor.username,
+            'specialization': specialization,
+            'date': str(apt.slot.date),
+            'time': f"{apt.slot.start_time}-{apt.slot.end_time}",
+            'status': apt.status,
+            'notes': apt.notes
+        })
+    
+    return {
+        'next_visit': upcoming_data[0] if upcoming_data else None,
+        'upcoming_appointments': upcoming_data,
+        'appointment_counts': counts
+    }
 
 
 @api_view(['GET'])
@@ -260,7 +384,7 @@ def list_doctors(request):
             'your_role': request.user.role
         }, status=status.HTTP_403_FORBIDDEN)
     
-    doctors = User.objects.filter(role='doctor', is_active=True)
+    doctors = User.objects.filter(role='doctor', is_active=True).select_related('doctor_profile')
     doctors_data = []
     for doctor in doctors:
         try: